@@ -1 +1,37 @@
+"""潮汕麻将AI
 
+公开名称在首次访问时才导入对应模块, import本包不会加载任何子模块;
+决策引擎(tiles/utils/core等)不依赖画面识别与窗口操作所需的可选依赖。
+"""
+import importlib
+
+__version__ = '1.0.0'
+
+_EXPORTS = {
+    'ChaoshanMJPlugin': 'core',
+    'GameContext': 'core',
+    'ProbabilityEngine': 'utils',
+    'VirtualClock': 'utils',
+    'SystemClock': 'utils',
+    'Tile': 'tiles',
+    'TileType': 'tiles',
+    'TileSet': 'tiles',
+    'Hand': 'tiles',
+    'calculate_shanten': 'shanten',
+    'is_winning': 'agari',
+    'ScoringEngine': 'scoring',
+    'SelfPlaySimulator': 'simulator',
+}
+
+__all__ = sorted(_EXPORTS)
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'.{module}', __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,276 @@
+from enum import IntFlag
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES, tile_counts
+from .shanten import TERMINAL_INDICES
+
+# 和牌判定
+#
+# 手牌计数按万/筒/条/字分为四组, 每组的字节串作为键查询记忆化的分解表,
+# 表项为以下标志位的组合。各组张数模3为0的须能拆成全部面子, 模3为2的那一组
+# 须能拆成面子加一个雀头, 模3为1则不可能和牌。
+
+_MELDS = 1              # 可拆为若干面子
+_MELDS_PAIR = 2         # 可拆为若干面子加一个雀头
+_TRIPLETS = 4           # 可拆为若干刻子
+_TRIPLETS_PAIR = 8      # 可拆为若干刻子加一个雀头
+
+_GROUP_BOUNDS = ((0, 9), (9, 18), (18, 27), (27, 34))
+_GROUP_OF = tuple(index // 9 if index < 27 else 3 for index in range(34))
+_SUIT_TABLE: Dict[bytes, int] = {}
+_HONOR_TABLE: Dict[bytes, int] = {}
+
+_SIMPLE_INDICES = tuple(i for i in range(34) if i not in TERMINAL_INDICES)
+# 奇数张数映射为1, 偶数映射为0, 用于七对判定
+_PARITY = bytes(i % 2 for i in range(256))
+
+class HandPattern(IntFlag):
+    """和牌牌型标志, 一手牌可同时满足多项"""
+    SEVEN_PAIRS = 1         # 七对
+    THIRTEEN_ORPHANS = 2    # 十三幺
+    ALL_TRIPLETS = 4        # 碰碰胡
+    HALF_FLUSH = 8          # 混一色
+    FULL_FLUSH = 16         # 清一色
+
+def _can_form_melds(counts: List[int], honor: bool) -> bool:
+    """从最小的牌开始尝试刻子与顺子"""
+    for i, count in enumerate(counts):
+        if count:
+            break
+    else:
+        return True
+    if count >= 3:
+        counts[i] -= 3
+        ok = _can_form_melds(counts, honor)
+        counts[i] += 3
+        if ok:
+            return True
+    if not honor and i + 2 < len(counts) and counts[i + 1] and counts[i + 2]:
+        for j in (i, i + 1, i + 2):
+            counts[j] -= 1
+        ok = _can_form_melds(counts, honor)
+        for j in (i, i + 1, i + 2):
+            counts[j] += 1
+        return ok
+    return False
+
+def _build_flags(key: bytes, honor: bool) -> int:
+    counts = list(key)
+    flags = 0
+    if sum(counts) % 3 == 0:
+        if _can_form_melds(counts, honor):
+            flags |= _MELDS
+        if all(c in (0, 3) for c in counts):
+            flags |= _TRIPLETS
+    else:
+        for i, count in enumerate(counts):
+            if count < 2:
+                continue
+            counts[i] -= 2
+            if not flags & _MELDS_PAIR and _can_form_melds(counts, honor):
+                flags |= _MELDS_PAIR
+            if all(c in (0, 3) for c in counts):
+                flags |= _TRIPLETS_PAIR
+            counts[i] += 2
+    return flags
+
+def group_flags(key: bytes, honor: bool = False) -> int:
+    """查询(必要时构建)一组牌的分解标志"""
+    table = _HONOR_TABLE if honor else _SUIT_TABLE
+    flags = table.get(key)
+    if flags is None:
+        flags = table[key] = _build_flags(key, honor)
+    return flags
+
+def _counts_bytes(tiles: Union[Hand, np.ndarray, List[Tile]]) -> bytes:
+    counts = tile_counts(tiles)
+    if counts.dtype != np.uint8:
+        counts = counts.astype(np.uint8)
+    return counts.tobytes()
+
+def _standard(data: bytes) -> int:
+    """一般型判定: 0为不和, 否则返回_MELDS, 可拆为全刻子时再并上_TRIPLETS"""
+    result = _MELDS | _TRIPLETS
+    has_pair = False
+    for group, (start, stop) in enumerate(_GROUP_BOUNDS):
+        key = data[start:stop]
+        remainder = sum(key) % 3
+        if remainder == 1:
+            return 0
+        table = _HONOR_TABLE if group == 3 else _SUIT_TABLE
+        flags = table.get(key)
+        if flags is None:
+            flags = group_flags(key, group == 3)
+        if remainder == 2:
+            if has_pair or not flags & _MELDS_PAIR:
+                return 0
+            has_pair = True
+            if not flags & _TRIPLETS_PAIR:
+                result = _MELDS
+        else:
+            if not flags & _MELDS:
+                return 0
+            if not flags & _TRIPLETS:
+                result = _MELDS
+    return result if has_pair else 0
+
+def _seven_pairs(data: bytes) -> bool:
+    # 调用方已保证共14张; 潮汕规则下四张相同算两对
+    return 1 not in data.translate(_PARITY)
+
+def _thirteen_orphans(data: bytes) -> bool:
+    # 多数手牌含中张, 先检查中张可以尽早排除
+    return (not any(data[i] for i in _SIMPLE_INDICES)
+            and all(data[i] for i in TERMINAL_INDICES))
+
+def is_winning(tiles: Union[Hand, np.ndarray, List[Tile]],
+               melds: Sequence[Sequence[Tile]] = ()) -> bool:
+    """判断暗手(加上副露melds)是否和牌, 七对与十三幺须门前清
+
+    暗手张数须为14减去3倍副露数(杠子按3张计), 否则不算和牌。
+    """
+    return is_winning_data(_counts_bytes(tiles), len(melds))
+
+def is_winning_data(data: bytes, exposed_melds: int = 0) -> bool:
+    """以34字节计数串判断是否和牌, 供已持有计数的调用方(如模拟推演)使用"""
+    if sum(data) + 3 * exposed_melds != 14:
+        return False
+    if _standard(data):
+        return True
+    if exposed_melds:
+        return False
+    return _seven_pairs(data) or _thirteen_orphans(data)
+
+def _meld_info(melds: Sequence[Sequence[Tile]]) -> Tuple[bool, int]:
+    """副露是否全为刻子/杠子, 以及副露涉及的组的位掩码"""
+    all_triplets = True
+    groups = 0
+    for meld in melds:
+        first = meld[0]
+        if any(tile is not first for tile in meld):
+            all_triplets = False
+        groups |= 1 << (first.index // 9 if first.index < 27 else 3)
+    return all_triplets, groups
+
+def win_patterns(tiles: Union[Hand, np.ndarray, List[Tile]],
+                 melds: Sequence[Sequence[Tile]] = ()) -> Optional[HandPattern]:
+    """返回和牌的牌型标志, 不和牌时返回None
+
+    melds为副露(每项为组成该副露的牌, 如handle_opponent_action收到的tiles)。
+    普通的一般型和牌返回HandPattern(0), 其布尔值为假, 调用方须与None比较。
+    """
+    data = _counts_bytes(tiles)
+    if sum(data) + 3 * len(melds) != 14:
+        return None
+    standard = _standard(data)
+    patterns = HandPattern(0)
+    if not melds:
+        if _seven_pairs(data):
+            patterns |= HandPattern.SEVEN_PAIRS
+        elif not standard and _thirteen_orphans(data):
+            return HandPattern.THIRTEEN_ORPHANS
+    if not standard and not patterns:
+        return None
+
+    melds_triplets, groups = _meld_info(melds)
+    if standard & _TRIPLETS and melds_triplets:
+        patterns |= HandPattern.ALL_TRIPLETS
+    for group, (start, stop) in enumerate(_GROUP_BOUNDS):
+        if any(data[start:stop]):
+            groups |= 1 << group
+    suits = groups & 0b111
+    if suits and not suits & (suits - 1):
+        patterns |= HandPattern.HALF_FLUSH if groups & 0b1000 else HandPattern.FULL_FLUSH
+    return patterns
+
+def wait_patterns(tiles: Union[Hand, np.ndarray, List[Tile]],
+                  melds: Sequence[Sequence[Tile]] = ()) -> Dict[Tile, HandPattern]:
+    """听牌时批量计算每种和牌张及和牌后的牌型标志
+
+    只重新查询和牌张所在组的分解表, 其余三组的标志、七对的奇数张计数与
+    花色分布只计算一次。
+    """
+    data = bytearray(_counts_bytes(tiles))
+    if sum(data) + 1 + 3 * len(melds) != 14:
+        return {}
+    closed = not melds
+    melds_triplets, meld_groups = _meld_info(melds)
+
+    keys = [bytes(data[start:stop]) for start, stop in _GROUP_BOUNDS]
+    remainders = [sum(key) % 3 for key in keys]
+    flags = [group_flags(key, group == 3) for group, key in enumerate(keys)]
+    groups = meld_groups
+    for group, key in enumerate(keys):
+        if any(key):
+            groups |= 1 << group
+    odd_kinds = sum(count % 2 for count in data)
+    orphans_possible = closed and not any(data[i] for i in _SIMPLE_INDICES)
+
+    # 与同组已有的牌相邻(字牌须已有)的牌才可能组成面子或雀头, 孤张只可能用于十三幺
+    candidates = set()
+    for group, (start, stop) in enumerate(_GROUP_BOUNDS):
+        reach = 0 if group == 3 else 2
+        for index in range(start, stop):
+            if data[index]:
+                candidates.update(range(max(start, index - reach), min(stop, index + reach + 1)))
+    if orphans_possible:
+        candidates.update(TERMINAL_INDICES)
+
+    seven_pairs_wait = closed and odd_kinds == 1
+    result = {}
+    for index in sorted(candidates):
+        if data[index] >= 4:
+            continue
+        group = _GROUP_OF[index]
+        start, stop = _GROUP_BOUNDS[group]
+        patterns = 0
+        if seven_pairs_wait and data[index] % 2:
+            patterns = HandPattern.SEVEN_PAIRS
+
+        data[index] += 1
+        standard = _standard_with(group, group_flags(bytes(data[start:stop]), group == 3),
+                                  (remainders[group] + 1) % 3, flags, remainders)
+        orphans = not standard and not patterns and orphans_possible \
+            and index in TERMINAL_INDICES and _thirteen_orphans(data)
+        data[index] -= 1
+        if orphans:
+            result[ALL_TILES[index]] = HandPattern.THIRTEEN_ORPHANS
+            continue
+        if not standard and not patterns:
+            continue
+
+        if standard & _TRIPLETS and melds_triplets:
+            patterns |= HandPattern.ALL_TRIPLETS
+        with_tile = groups | 1 << group
+        suits = with_tile & 0b111
+        if suits and not suits & (suits - 1):
+            patterns |= HandPattern.HALF_FLUSH if with_tile & 0b1000 else HandPattern.FULL_FLUSH
+        result[ALL_TILES[index]] = HandPattern(patterns)
+    return result
+
+def _standard_with(changed: int, changed_flags: int, changed_remainder: int,
+                   flags: Sequence[int], remainders: Sequence[int]) -> int:
+    """用第changed组替换后的标志做一般型判定, 返回值同_standard"""
+    result = _MELDS | _TRIPLETS
+    has_pair = False
+    for group in range(4):
+        if group == changed:
+            group_flag, remainder = changed_flags, changed_remainder
+        else:
+            group_flag, remainder = flags[group], remainders[group]
+        if remainder == 1:
+            return 0
+        if remainder == 2:
+            if has_pair or not group_flag & _MELDS_PAIR:
+                return 0
+            has_pair = True
+            if not group_flag & _TRIPLETS_PAIR:
+                result = _MELDS
+        else:
+            if not group_flag & _MELDS:
+                return 0
+            if not group_flag & _TRIPLETS:
+                result = _MELDS
+    return result if has_pair else 0
@@ -5,12 +5,15 @@ from typing import List, Dict, Any, Optional
 import logging
 from collections import deque
 
+from .utils import SystemClock
+
 class BehaviorRandomizer:
     """行为随机化器"""
-    def __init__(self):
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else SystemClock()
         self.action_history = deque(maxlen=100)
         self.pattern_detector = PatternDetector()
-        self.last_action_time = time.time()
+        self.last_action_time = self.clock.time()
         
     def randomize_delay(self, action_type: str) -> float:
         """随机化延迟时间"""
@@ -36,7 +39,7 @@ class BehaviorRandomizer:
         self.action_history.append({
             'type': action_type,
             'delay': delay,
-            'time': time.time()
+            'time': self.clock.time()
         })
         
         return delay
@@ -131,8 +134,9 @@ class PatternDetector:
 
 class BehaviorSimulator:
     """行为模拟器"""
-    def __init__(self):
-        self.randomizer = BehaviorRandomizer()
+    def __init__(self, clock=None):
+        self.clock = clock if clock is not None else SystemClock()
+        self.randomizer = BehaviorRandomizer(clock)
         self.error_rate = 0.05  # 基础错误率
         self.learning_rate = 0.01  # 学习速率
         self.performance_history = deque(maxlen=50)
@@ -164,7 +168,7 @@ class BehaviorSimulator:
         self.performance_history.append({
             'type': event_type,
             'delay': delay,
-            'time': time.time()
+            'time': self.clock.time()
         })
         
         return delay
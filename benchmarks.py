@@ -0,0 +1,223 @@
+"""引擎热点路径的微基准测试
+
+用法:
+    python -m chaoshan_mahjong_ai.benchmarks --output bench.json
+    python -m chaoshan_mahjong_ai.benchmarks --baseline bench.json --threshold 0.2
+    python -m chaoshan_mahjong_ai.benchmarks --imports
+
+结果以JSON输出, 指定--baseline时与基准比较, 任一项变慢超过阈值即以非零状态退出。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .tiles import Tile, TileSet, Hand, ALL_TILES
+from .utils import ProbabilityEngine
+
+DEFAULT_SEED = 20240601
+
+def _random_hand(rng: random.Random, size: int) -> List[Tile]:
+    wall = TileSet.create_full_set()
+    rng.shuffle(wall)
+    return wall[:size]
+
+def _bench_tile_construction(rng: random.Random) -> Callable[[], object]:
+    specs = [(tile.type, tile.value) for tile in ALL_TILES]
+    return lambda: [Tile(tile_type, value) for tile_type, value in specs]
+
+def _bench_tile_hashing(rng: random.Random) -> Callable[[], object]:
+    tiles = TileSet.create_full_set()
+    return lambda: {tile: None for tile in tiles}
+
+def _bench_create_full_set(rng: random.Random) -> Callable[[], object]:
+    return TileSet.create_full_set
+
+def _bench_scores(size: int) -> Callable[[random.Random], Callable[[], object]]:
+    def setup(rng: random.Random) -> Callable[[], object]:
+        engine = ProbabilityEngine()
+        tiles = _random_hand(rng, size)
+        return lambda: engine.calculate_tile_scores(tiles)
+    return setup
+
+def _bench_enhance_quality(rng: random.Random) -> Callable[[], object]:
+    engine = ProbabilityEngine()
+    tiles = TileSet.create_full_set()
+    rng.shuffle(tiles)
+    return lambda: engine.enhance_quality(tiles)
+
+def _headless_plugin(rng: random.Random):
+    # 延迟导入, 使不涉及插件的基准不受可选依赖影响
+    from .core import ChaoshanMJPlugin
+    return ChaoshanMJPlugin(headless=True, rng=random.Random(rng.getrandbits(64)))
+
+def _fresh_game(plugin, seed: int):
+    """每次调用前重置局内状态与随机数, 使耗时与计时循环次数无关"""
+    plugin.new_game()
+    plugin.rng.seed(seed)
+
+def _bench_intelligent_discard(rng: random.Random) -> Callable[[], object]:
+    # 两手只差摸入的一张, 交替决策走增量评估路径; suggest_discard不改变局内状态,
+    # 每次调用前后状态相同, 不需在计时内重置
+    plugin = _headless_plugin(rng)
+    tiles = _random_hand(rng, 15)
+    hands = (Hand(tiles[:14]), Hand(tiles[:13] + tiles[14:]))
+    plugin.suggest_discard(hands[1])
+    return lambda: [plugin.suggest_discard(hand) for hand in hands]
+
+def _bench_tile_selection(rng: random.Random) -> Callable[[], object]:
+    plugin = _headless_plugin(rng)
+    seed = rng.getrandbits(64)
+    tiles = TileSet.create_full_set()
+    rng.shuffle(tiles)
+
+    def run():
+        _fresh_game(plugin, seed)
+        return plugin.tile_selection(tiles)
+    return run
+
+BENCHMARKS: Dict[str, Callable[[random.Random], Callable[[], object]]] = {
+    'tile_construction': _bench_tile_construction,
+    'tile_hashing': _bench_tile_hashing,
+    'create_full_set': _bench_create_full_set,
+    'calculate_tile_scores_5': _bench_scores(5),
+    'calculate_tile_scores_13': _bench_scores(13),
+    'calculate_tile_scores_14': _bench_scores(14),
+    'enhance_quality': _bench_enhance_quality,
+    'intelligent_discard': _bench_intelligent_discard,
+    'tile_selection': _bench_tile_selection,
+}
+
+def time_callable(func: Callable[[], object], repeat: int = 5,
+                  min_time: float = 0.05) -> Dict[str, float]:
+    """测量单次调用耗时(微秒), 取多轮中的最小值与中位数"""
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        if timer.timeit(loops) >= min_time:
+            break
+        loops *= 2
+    runs = [t / loops * 1e6 for t in timer.repeat(repeat, loops)]
+    return {'best_us': min(runs), 'median_us': statistics.median(runs),
+            'loops': loops, 'repeat': repeat}
+
+def run_benchmarks(names: Optional[Sequence[str]] = None, seed: int = DEFAULT_SEED,
+                   repeat: int = 5, min_time: float = 0.05) -> Dict:
+    """运行基准测试, 每项使用由seed派生的固定随机数"""
+    names = list(names) if names else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks: {', '.join(unknown)}")
+    results = {}
+    for name in names:
+        func = BENCHMARKS[name](random.Random(f"{seed}:{name}"))
+        results[name] = time_callable(func, repeat, min_time)
+    return {
+        'meta': {
+            'seed': seed,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+        },
+        'benchmarks': results,
+    }
+
+# 画面识别与窗口操作的可选依赖, 纯引擎的导入不应加载它们
+OPTIONAL_MODULES = ('cv2', 'PIL', 'pytesseract', 'pyautogui', 'win32gui', 'win32con', 'win32api')
+IMPORT_TARGETS = ('chaoshan_mahjong_ai', 'chaoshan_mahjong_ai.tiles',
+                  'chaoshan_mahjong_ai.utils', 'chaoshan_mahjong_ai.core')
+
+_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed_us': elapsed * 1e6,
+                  'optional': sorted(m for m in {optional!r} if m in sys.modules)}}))
+"""
+
+def measure_import(module: str, repeat: int = 5) -> Dict:
+    """在新的解释器进程中测量冷启动导入module的耗时(微秒), 并列出被加载的可选依赖"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    script = _IMPORT_SCRIPT.format(module=module, optional=OPTIONAL_MODULES)
+    runs = []
+    optional: List[str] = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        runs.append(result['elapsed_us'])
+        optional = result['optional']
+    return {'best_us': min(runs), 'median_us': statistics.median(runs),
+            'repeat': repeat, 'optional_modules': optional}
+
+def run_import_benchmarks(modules: Sequence[str] = IMPORT_TARGETS, repeat: int = 5) -> Dict:
+    """各模块的冷启动导入耗时, 结果格式与run_benchmarks相同, 可直接用compare比较"""
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.time(),
+        },
+        'benchmarks': {f'import:{module}': measure_import(module, repeat) for module in modules},
+    }
+
+def compare(results: Dict, baseline: Dict, threshold: float = 0.2) -> List[str]:
+    """与基准比较, 返回变慢超过阈值的描述"""
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if previous is None:
+            continue
+        ratio = current['best_us'] / previous['best_us']
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {previous['best_us']:.2f}us -> "
+                               f"{current['best_us']:.2f}us ({ratio:.2f}x)")
+    return regressions
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark engine hot paths")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all)")
+    parser.add_argument('--output', help="write JSON results to this file")
+    parser.add_argument('--baseline', help="compare against a stored JSON result")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="allowed slowdown ratio before failing (default: 0.2)")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05,
+                        help="minimum seconds per timing run")
+    parser.add_argument('--imports', action='store_true',
+                        help="measure cold-start import time of the given modules "
+                             "(default: engine-only modules) instead")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        results = run_import_benchmarks(args.names or IMPORT_TARGETS, args.repeat)
+    else:
+        results = run_benchmarks(args.names, args.seed, args.repeat, args.min_time)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+# 每种牌的张数(0~4)用3位表示, 34种牌分两段打包为不超过102位的整数
+_LOW_KINDS = 17
+_PACK_WEIGHTS = 8 ** np.arange(_LOW_KINDS, dtype=np.int64)
+
+def pack_counts(counts: np.ndarray) -> int:
+    """将34格计数向量打包为紧凑的整数键"""
+    low = int(np.dot(counts[:_LOW_KINDS], _PACK_WEIGHTS))
+    high = int(np.dot(counts[_LOW_KINDS:], _PACK_WEIGHTS))
+    return (high << (3 * _LOW_KINDS)) | low
+
+class LRUCache:
+    """按条目数和字节数双重限制的LRU缓存"""
+    def __init__(self, max_entries: int = 4096, max_bytes: Optional[int] = None):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """查询并将命中的条目移到最近使用位置"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None):
+        """写入条目, 超出限制时淘汰最久未使用的条目"""
+        if size is None:
+            size = sys.getsizeof(key) + sys.getsizeof(value)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self.current_bytes += size
+        while len(self._entries) > self.max_entries or \
+                (self.max_bytes is not None and self.current_bytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+        }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
@@ -0,0 +1,133 @@
+from functools import lru_cache
+from typing import Dict, Tuple
+
+import numpy as np
+
+from .tiles import NUM_TILE_KINDS
+
+# 花色对称规范化
+#
+# 评估规则对万/筒/条三门一视同仁, 且每门数牌关于5对称(1↔9, 2↔8...)。
+# 把手牌映射到规范形式(每门取翻转前后较小者, 再按键排序三门)后评估,
+# 结果再映射回原牌, 对称的手牌即可共用同一份缓存与查表结果。
+
+_SUIT_WIDTH = 9
+_HONOR_WIDTH = 7
+_SUIT_STARTS = (0, 9, 18)
+_HONOR_START = 27
+
+def _reverse_digits(key: int, width: int) -> int:
+    result = 0
+    for _ in range(width):
+        result = result * 5 + key % 5
+        key //= 5
+    return result
+
+# 4位五进制数的翻转表, 9位键按 低4位 | 中间1位 | 高4位 拆开后查表翻转
+_REVERSE4 = tuple(_reverse_digits(key, 4) for key in range(5 ** 4))
+
+def mirror_suit_key(key: int) -> int:
+    """数牌五进制键按1↔9翻转"""
+    return (_REVERSE4[key % 625] * 3125 + key // 625 % 5 * 625
+            + _REVERSE4[key // 3125])
+
+def canonical_suit_key(key: int) -> int:
+    """数牌键与其翻转中较小的一个"""
+    mirrored = mirror_suit_key(key)
+    return mirrored if mirrored < key else key
+
+@lru_cache(maxsize=None)
+def canonical_honor_key(key: int) -> int:
+    """字牌之间可任意互换, 各字牌张数排序后重新编码的键"""
+    digits = []
+    for _ in range(_HONOR_WIDTH):
+        digits.append(key % 5)
+        key //= 5
+    result = 0
+    for digit in sorted(digits):
+        result = result * 5 + digit
+    return result
+
+def canonical_group_keys(wan: int, tong: int, suo: int, honor: int) -> Tuple[int, int, int, int]:
+    """四组键的规范形式: 三门数牌各自取翻转规范键后排序"""
+    a, b, c = sort_suit_keys(canonical_suit_key(wan), canonical_suit_key(tong),
+                             canonical_suit_key(suo))
+    return a, b, c, canonical_honor_key(honor)
+
+def sort_suit_keys(a: int, b: int, c: int) -> Tuple[int, int, int]:
+    """三门数牌键按升序排列"""
+    if a > b:
+        a, b = b, a
+    if b > c:
+        b, c = c, b
+        if a > b:
+            a, b = b, a
+    return a, b, c
+
+def _oriented_blocks():
+    blocks = []
+    for start in _SUIT_STARTS:
+        forward = list(range(start, start + _SUIT_WIDTH))
+        blocks.append((forward, forward[::-1]))
+    return blocks
+
+_BLOCKS = _oriented_blocks()
+
+def _build_orientation_weights() -> np.ndarray:
+    """[27, 6]权重: 每门正向/翻转各一列, 格值按25进制从高位到低位编码"""
+    weights = np.zeros((27, 6), dtype=np.int64)
+    for suit, orientations in enumerate(_BLOCKS):
+        for flip, cells in enumerate(orientations):
+            for position, cell in enumerate(cells):
+                weights[cell, 2 * suit + flip] = 25 ** (_SUIT_WIDTH - 1 - position)
+    return weights
+
+_ORIENTATION_WEIGHTS = _build_orientation_weights()
+_HONOR_WEIGHTS = 25 ** np.arange(_HONOR_WIDTH - 1, -1, -1, dtype=np.int64)
+_SUIT_SPAN = 25 ** _SUIT_WIDTH
+_PERMUTATIONS: Dict[Tuple[int, ...], Tuple[np.ndarray, np.ndarray]] = {}
+
+def _permutation(layout: Tuple[int, ...]) -> Tuple[np.ndarray, np.ndarray]:
+    entry = _PERMUTATIONS.get(layout)
+    if entry is None:
+        cells = []
+        for suit, flip in zip(layout[::2], layout[1::2]):
+            cells.extend(_BLOCKS[suit][flip])
+        perm = np.array(cells + list(range(_HONOR_START, NUM_TILE_KINDS)))
+        inverse = np.argsort(perm)
+        perm.setflags(write=False)
+        inverse.setflags(write=False)
+        entry = _PERMUTATIONS[layout] = (perm, inverse)
+    return entry
+
+def canonical_order(counts: np.ndarray, seen: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray]:
+    """返回规范形式的整数键、perm及其逆置换inverse
+
+    规范形式第i格对应原来的第perm[i]格, 原来的第j格位于规范形式的第inverse[j]格。
+    每格按 张数*5+已见数 编码, 每门取正向与翻转中键较小的方向, 三门再按键排序,
+    两手牌(连同已见牌)在花色互换与翻转下等价当且仅当键相同。
+    """
+    cells = counts * 5 + seen.astype(np.int64)
+    fwd0, rev0, fwd1, rev1, fwd2, rev2 = (cells[:27] @ _ORIENTATION_WEIGHTS).tolist()
+    suits = sorted(((rev0, 0, 1) if rev0 < fwd0 else (fwd0, 0, 0),
+                    (rev1, 1, 1) if rev1 < fwd1 else (fwd1, 1, 0),
+                    (rev2, 2, 1) if rev2 < fwd2 else (fwd2, 2, 0)))
+    honor = int(cells[27:] @ _HONOR_WEIGHTS)
+    key = ((suits[0][0] * _SUIT_SPAN + suits[1][0]) * _SUIT_SPAN + suits[2][0]) \
+        * 25 ** _HONOR_WIDTH + honor
+    layout = (suits[0][1], suits[0][2], suits[1][1], suits[1][2], suits[2][1], suits[2][2])
+    return (key,) + _permutation(layout)
+
+def canonical_cells_key(cells: bytes) -> bytes:
+    """34字节格值串(如 张数*5+剩余数)的规范键
+
+    每门数牌取正向与翻转中较小者后三门排序, 字牌格值排序,
+    适用于字牌之间也可互换的评估(如只关心能否和牌)。
+    """
+    suits = []
+    for start in _SUIT_STARTS:
+        forward = cells[start:start + _SUIT_WIDTH]
+        reverse = forward[::-1]
+        suits.append(reverse if reverse < forward else forward)
+    suits.sort()
+    return b''.join(suits) + bytes(sorted(cells[_HONOR_START:]))
@@ -0,0 +1,144 @@
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES, NUM_TILE_KINDS, tile_counts
+from .shanten import _improving_tiles, _rank_discards, group_keys, infer_exposed_melds
+from .cache import LRUCache
+
+# 鸣牌决策
+#
+# 比较"不鸣"与各种鸣牌后的手牌状态: 吃碰后还须打出一张, 取打出后最优的一张;
+# 明杠后手牌少三张并补摸一张。状态按 (向听数, 进张枚数) 字典序比较,
+# 价值为 -向听数 + 进张枚数 * UKEIRE_WEIGHT, 进张项总小于1, 不会跨越向听数。
+# 向听数与进张牌种只取决于手牌计数与副露数, 按手牌记忆; 进张枚数再按当前的
+# 剩余张数求和, 因此同一手牌在多次鸣牌窗口中只需计算一次。
+
+UKEIRE_WEIGHT = 1.0 / 136
+
+class ClaimDecision(NamedTuple):
+    """鸣牌决策"""
+    action: str                  # 'pass' / 'chi' / 'peng' / 'minggang'
+    value: float
+    shanten: int                 # 动作(吃碰后连同打牌)之后的向听数
+    ukeire: int                  # 动作之后的进张枚数
+    tiles: Tuple[Tile, ...]      # 从暗手中拿出组成副露的牌, 不鸣时为空
+    discard: Optional[Tile]      # 吃碰后应打出的牌
+
+def chi_shapes(counts: Sequence[int], tile: Tile) -> List[Tuple[int, int]]:
+    """可与tile组成顺子的两张手牌索引组合"""
+    if tile.is_honor:
+        return []
+    value = tile.value
+    base = tile.index - value + 1
+    shapes = []
+    for low in (value - 2, value - 1, value):
+        if low < 1 or low + 2 > 9:
+            continue
+        others = tuple(base + v - 1 for v in (low, low + 1, low + 2) if v != value)
+        if all(counts[i] for i in others):
+            shapes.append(others)
+    return shapes
+
+class ClaimEvaluator:
+    """鸣牌评估器
+
+    claim_penalty为鸣牌的额外代价(失去门清与防守余地), kong_bonus为明杠多摸一张的奖励。
+    """
+    def __init__(self, claim_penalty: float = 0.0, kong_bonus: float = 0.01,
+                 cache_entries: int = 1 << 14):
+        self.claim_penalty = claim_penalty
+        self.kong_bonus = kong_bonus
+        self._improving = LRUCache(cache_entries)
+        self._discards = LRUCache(cache_entries)
+
+    def _improving_tiles(self, counts: List[int], exposed: int) -> Tuple[int, List[int]]:
+        key = bytes(counts) + bytes((exposed,))
+        entry = self._improving.get(key)
+        if entry is None:
+            entry = _improving_tiles(counts, exposed)
+            self._improving.put(key, entry, size=len(key))
+        return entry
+
+    def _rank_discards(self, counts: List[int], exposed: int) -> Dict[Tile, int]:
+        key = bytes(counts) + bytes((exposed,))
+        entry = self._discards.get(key)
+        if entry is None:
+            entry = _rank_discards(counts, group_keys(counts), exposed)
+            self._discards.put(key, entry, size=len(key))
+        return entry
+
+    def _state(self, counts: List[int], exposed: int,
+               remaining: Sequence[int]) -> Tuple[int, int]:
+        """摸牌前手牌的向听数与进张枚数"""
+        shanten, improving = self._improving_tiles(counts, exposed)
+        return shanten, sum(remaining[i] for i in improving)
+
+    def _after_meld(self, counts: List[int], exposed: int,
+                    remaining: Sequence[int]) -> Tuple[int, int, Tile]:
+        """吃碰后打出一张: 先取向听数最小, 再取进张最多"""
+        ranked = self._rank_discards(counts, exposed)
+        best_shanten = min(ranked.values())
+        best = None
+        for tile, shanten in ranked.items():
+            if shanten != best_shanten:
+                continue
+            counts[tile.index] -= 1
+            _, ukeire = self._state(counts, exposed, remaining)
+            counts[tile.index] += 1
+            if best is None or ukeire > best[1]:
+                best = (shanten, ukeire, tile)
+        return best
+
+    def _value(self, shanten: int, ukeire: int) -> float:
+        return -shanten + ukeire * UKEIRE_WEIGHT
+
+    def evaluate(self, tiles: Union[List[Tile], Hand, np.ndarray], tile: Tile,
+                 options: Sequence[str] = ('chi', 'peng', 'minggang'),
+                 exposed_melds: Optional[int] = None,
+                 remaining: Optional[Sequence[int]] = None) -> ClaimDecision:
+        """对他家打出的tile在options中选择最优动作, 不划算时返回'pass'
+
+        tiles为自己的暗手(不含tile); remaining为34格剩余张数, 缺省时按4减去手牌
+        与tile计算; options中不可能成立的动作会被忽略。
+        """
+        counts = tile_counts(tiles).tolist()
+        if exposed_melds is None:
+            exposed_melds = infer_exposed_melds(sum(counts) + 1)
+        if remaining is None:
+            remaining = [4 - c for c in counts]
+            remaining[tile.index] -= 1
+        else:
+            remaining = [int(r) for r in remaining]
+        if len(remaining) != NUM_TILE_KINDS:
+            raise ValueError(f"Expected {NUM_TILE_KINDS} remaining counts, got {len(remaining)}")
+
+        shanten, ukeire = self._state(counts, exposed_melds, remaining)
+        best = ClaimDecision('pass', self._value(shanten, ukeire), shanten, ukeire, (), None)
+        index = tile.index
+        exposed = exposed_melds + 1
+
+        candidates = []
+        if 'peng' in options and counts[index] >= 2:
+            candidates.append(('peng', (index, index)))
+        if 'chi' in options:
+            candidates.extend(('chi', shape) for shape in chi_shapes(counts, tile))
+        for action, used in candidates:
+            for i in used:
+                counts[i] -= 1
+            shanten, ukeire, discard = self._after_meld(counts, exposed, remaining)
+            for i in used:
+                counts[i] += 1
+            value = self._value(shanten, ukeire) - self.claim_penalty
+            if value > best.value:
+                best = ClaimDecision(action, value, shanten, ukeire,
+                                     tuple(ALL_TILES[i] for i in used), discard)
+
+        if 'minggang' in options and counts[index] >= 3:
+            counts[index] -= 3
+            shanten, ukeire = self._state(counts, exposed, remaining)
+            counts[index] += 3
+            value = self._value(shanten, ukeire) + self.kong_bonus - self.claim_penalty
+            if value > best.value:
+                best = ClaimDecision('minggang', value, shanten, ukeire, (tile,) * 3, None)
+        return best
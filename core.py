@@ -1,47 +1,113 @@
 import random
 import numpy as np
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Union
 from collections import defaultdict
-import time
 
-from .tiles import Tile, TileType, TileSet
-from .utils import ProbabilityEngine, OperationDelay
-from .vision import ScreenProcessor
-from .automation import GameController
-from .anti_detection import BehaviorSimulator
+from .tiles import Tile, TileType, TileSet, Hand
+from .utils import ProbabilityEngine, OperationDelay, VirtualClock, SystemClock
+from .evaluator import IncrementalEvaluator
+from .expectimax import ExpectimaxSolver, estimate_draws
+from .danger import DangerTable
+from .claim import ClaimDecision, ClaimEvaluator
+from .agari import HandPattern, win_patterns
+from .probability import DrawOutlook, discard_outlook
+
+# vision(cv2/PIL/pytesseract)、automation(pyautogui/win32gui)与anti_detection
+# 只在首次使用画面识别、窗口操作或行为模拟时导入, 纯决策引擎不依赖它们
 
 class ChaoshanMJPlugin:
-    def __init__(self, window_title: str = ""):
+    def __init__(self, window_title: str = "", headless: bool = False, clock=None,
+                 rng: Optional[random.Random] = None):
+        """headless为True时为无头模式: 不等待、不操作游戏窗口、不做行为模拟,
+        决策调用以纯计算速度运行。clock需提供time()与sleep(), 无头模式默认使用虚拟时钟。
+        rng为插件使用的随机数生成器, 传入带种子的实例即可复现结果。
+        """
+        self.headless = headless
+        self.rng = rng if rng is not None else random.Random()
+        if clock is None:
+            clock = VirtualClock() if headless else SystemClock()
+        self.clock = clock
         self.history = []
         self.prob_engine = ProbabilityEngine()
-        self.delay_module = OperationDelay()
-        self.screen_processor = ScreenProcessor()
-        self.game_controller = GameController(window_title) if window_title else None
-        self.behavior_sim = BehaviorSimulator()
+        self.evaluator = IncrementalEvaluator(self.prob_engine)
+        self.delay_module = OperationDelay(clock, self.rng)
+        self._screen_processor = None
+        self._behavior_sim = None
+        self.game_controller = self._create_controller(window_title) \
+            if window_title and not headless else None
         self.hand_tiles = []
+        self.melds = []
         self.discard_history = []
         self.game_context = GameContext()
+        self.rank_by_shanten = True
+        # 终局精确搜索, 设为None则始终使用启发式; 无头模式下另按节点数限制搜索,
+        # 预算通常在超时之前用尽, 结果与机器快慢无关
+        self.expectimax = ExpectimaxSolver(max_nodes=2048 if headless else None)
+        # 放铳危险度, defense_weight>0时按 得分*(1-defense_weight*危险度) 折减
+        self.danger = DangerTable()
+        self.defense_weight = 0.0
+        # 设为OpponentInference后按对手动作推断三家暗手
+        self.inference = None
+        # 设为RolloutEvaluator后, 在向听数最优的候选之间按推演收益选择
+        self.rollout = None
+        # 吃/碰/杠的鸣牌决策
+        self.claim_evaluator = ClaimEvaluator()
+        self._claim_decision: Optional[ClaimDecision] = None
+        self._claim_discard: Optional[Tile] = None
+        self._last_discard: Optional[Tile] = None
 
     def initialize(self, window_title: str) -> bool:
         """初始化插件"""
-        self.game_controller = GameController(window_title)
+        if self.headless:
+            return False
+        self.game_controller = self._create_controller(window_title)
         return self.game_controller.initialize()
 
-    def intelligent_discard(self, tiles: List[Tile]) -> Tile:
+    @staticmethod
+    def _create_controller(window_title: str):
+        from .automation import GameController
+        return GameController(window_title)
+
+    @property
+    def screen_processor(self):
+        """画面识别模块, 首次使用时导入vision"""
+        if self._screen_processor is None:
+            from .vision import ScreenProcessor
+            self._screen_processor = ScreenProcessor()
+        return self._screen_processor
+
+    @property
+    def behavior_sim(self):
+        """行为模拟模块, 首次使用时导入anti_detection"""
+        if self._behavior_sim is None:
+            from .anti_detection import BehaviorSimulator
+            self._behavior_sim = BehaviorSimulator(self.clock)
+        return self._behavior_sim
+
+    def new_game(self):
+        """开始新的一局, 清空局内状态"""
+        self.history = []
+        self.prob_engine.reset()
+        self.evaluator.reset()
+        self.danger.reset()
+        if self.inference is not None:
+            self.inference.reset()
+        self.hand_tiles = []
+        self.melds = []
+        self.discard_history = []
+        self.game_context = GameContext()
+        self._claim_decision = None
+        self._claim_discard = None
+        self._last_discard = None
+
+    def intelligent_discard(self, tiles: Union[List[Tile], Hand]) -> Tile:
         """智能出牌决策"""
-        # 更新状态
-        self.hand_tiles = tiles.copy()
-        
-        # 动态权重评估
-        scores = self.prob_engine.calculate_tile_scores(tiles)
-        
-        # 行为模拟
-        options = [(tile, score) for tile, score in scores.items()]
-        selected_tile, _ = self.behavior_sim.simulate_decision(options)
+        selected_tile = self.suggest_discard(tiles)
         
         # 模拟反应时间
-        reaction_time = self.behavior_sim.simulate_reaction('decision')
-        self.delay_module.random_delay('discard')
+        if not self.headless:
+            reaction_time = self.behavior_sim.simulate_reaction('decision')
+            self.delay_module.random_delay('discard')
         
         # 如果有游戏控制器，执行实际操作
         if self.game_controller:
@@ -49,14 +115,63 @@ class ChaoshanMJPlugin:
             if tile_pos:
                 self.game_controller.click_tile(tile_pos)
         
-        self._record_discard(selected_tile)
+        self.record_own_discard(selected_tile)
         return selected_tile
 
-    def tile_selection(self, available_tiles: List[Tile]) -> List[Tile]:
+    def suggest_discard(self, tiles: Union[List[Tile], Hand]) -> Tile:
+        """选出要打的牌, 不执行操作也不记录出牌"""
+        # 更新状态
+        self.hand_tiles = tiles.copy()
+        
+        # 动态权重评估: 相邻两次调用之间手牌通常只差一摸一打, 增量更新
+        self.evaluator.sync(tiles)
+        scores = self.evaluator.scores()
+        if self.inference is not None:
+            self.inference.observe_own(tiles)
+        
+        # 吃碰后打出评估鸣牌时选定的牌, 与鸣牌价值的计算保持一致
+        claim_discard, self._claim_discard = self._claim_discard, None
+        self._claim_decision = None
+        if claim_discard is not None and claim_discard in tiles:
+            return claim_discard
+        
+        # 终局精确搜索得到的最优打法优先, 搜索不可用或超时时按向听数优先
+        optimal = self._late_game_discards(tiles)
+        if optimal:
+            scores = {tile: score for tile, score in scores.items() if tile in optimal}
+        elif self.rank_by_shanten:
+            scores = self._filter_by_shanten(scores)
+        
+        # 防守: 按放铳危险度折减得分
+        if self.defense_weight:
+            risk = self.danger.risk(tiles)
+            scores = {tile: score * (1 - self.defense_weight * risk[tile.index])
+                      for tile, score in scores.items()}
+        
+        # 推演评估
+        if self.rollout is not None and len(scores) > 1:
+            result = self.rollout.evaluate(tiles, self.prob_engine.live_copies(tiles),
+                                           candidates=list(scores))
+            scores = result.values
+        
+        # 行为模拟
+        options = [(tile, score) for tile, score in scores.items()]
+        selected_tile, _ = self._choose(options)
+        return selected_tile
+
+    def record_own_discard(self, tile: Tile):
+        """记录自己实际打出的牌(须在当前手牌中), 如回放牌谱时打出的与建议不同"""
+        self.evaluator.discard(tile)
+        if self.inference is not None:
+            self.inference.observe_own_discard(tile)
+        self._record_discard(tile)
+
+    def tile_selection(self, available_tiles: Union[List[Tile], Hand]) -> List[Tile]:
         """智能选牌"""
         # 行为模拟
-        reaction_time = self.behavior_sim.simulate_reaction('select')
-        self.delay_module.random_delay('select')
+        if not self.headless:
+            reaction_time = self.behavior_sim.simulate_reaction('select')
+            self.delay_module.random_delay('select')
         
         # 概率增强
         enhanced_tiles = self.prob_engine.enhance_quality(available_tiles)
@@ -68,7 +183,7 @@ class ChaoshanMJPlugin:
                 break
             options = [(tile, self._calculate_selection_score(tile)) 
                       for tile in enhanced_tiles[:5]]
-            choice, _ = self.behavior_sim.simulate_decision(options)
+            choice, _ = self._choose(options)
             selected.append(choice)
             enhanced_tiles.remove(choice)
         
@@ -79,7 +194,7 @@ class ChaoshanMJPlugin:
                 if tile_pos:
                     self.game_controller.click_tile(tile_pos)
                     # 模拟人类操作间隔
-                    time.sleep(self.behavior_sim.simulate_reaction('click'))
+                    self.clock.sleep(self.behavior_sim.simulate_reaction('click'))
         
         self._update_history(selected)
         return selected
@@ -88,11 +203,79 @@ class ChaoshanMJPlugin:
         """处理游戏画面"""
         return self.screen_processor.process_screen(screen_img)
 
-    def handle_opponent_action(self, action_type: str, tiles: List[Tile]):
-        """处理对手动作"""
+    def handle_opponent_action(self, action_type: str, tiles: List[Tile],
+                               seat: Optional[int] = None):
+        """处理对手动作, seat为对手相对自己的座位(1下家, 2对家, 3上家)"""
         for tile in tiles:
             self.prob_engine.update_seen_tiles(tile)
+        if action_type == 'discard' and tiles:
+            self._last_discard = tiles[-1]
+        # 他家先鸣或已摸牌, 之前的鸣牌决策不再执行
+        self._claim_decision = None
         self.game_context.update_opponent_action(action_type, tiles)
+        self.danger.observe(seat - 1 if seat is not None else None, action_type, tiles)
+        if self.inference is not None and seat is not None:
+            self.inference.observe(seat - 1, action_type, tiles)
+
+    def record_meld(self, action_type: str, tiles: List[Tile]):
+        """记录自己的副露(吃/碰/杠), tiles为组成副露的全部牌(加杠时第一张为加上的牌)"""
+        self.melds.append(list(tiles))
+        self.danger.observe(None, action_type, tiles)
+        # 从暗手中拿出的牌转为公开; 鸣的是上一张打出的牌, 已计入已见牌
+        claimed = self._last_discard if action_type in ('chi', 'peng', 'minggang') else None
+        for tile in (tiles[:1] if action_type == 'bugang' else tiles):
+            if tile is claimed:
+                claimed = None
+                continue
+            self.prob_engine.update_own_revealed(tile)
+        decision, self._claim_decision = self._claim_decision, None
+        if decision is not None and decision.action == action_type:
+            self._claim_discard = decision.discard
+
+    def decide_claim(self, tiles: Union[List[Tile], Hand], tile: Tile,
+                     options: List[str]) -> ClaimDecision:
+        """对他家打出的tile在options('chi'/'peng'/'minggang')中选择动作, 不鸣时为'pass'
+
+        随后以record_meld记录该鸣牌时, 下一次出牌打出决策中的discard。
+        """
+        self._claim_decision = self.claim_evaluator.evaluate(
+            tiles, tile, options, exposed_melds=len(self.melds),
+            remaining=self.prob_engine.live_copies(tiles))
+        return self._claim_decision
+
+    def check_win(self, tiles: Union[List[Tile], Hand]) -> Optional[HandPattern]:
+        """结合已记录的副露判断暗手是否和牌, 返回牌型标志, 不和牌时返回None"""
+        return win_patterns(tiles, self.melds)
+
+    def draw_outlook(self, tiles: Union[List[Tile], Hand], wall_size: int) -> DrawOutlook:
+        """按已见牌信息评估每种打法在剩余牌墙内进张、听牌与和牌的概率"""
+        return discard_outlook(tiles, self.prob_engine.live_copies(tiles), wall_size)
+
+    def _choose(self, options: List[Tuple[Tile, float]]) -> Tuple[Tile, float]:
+        """选择得分最高的选项, 非无头模式下模拟人类决策"""
+        if self.headless:
+            return max(options, key=lambda x: x[1])
+        return self.behavior_sim.simulate_decision(options)
+
+    def _filter_by_shanten(self, scores: Dict[Tile, float]) -> Dict[Tile, float]:
+        """只保留打出后向听数最小的牌, 同向听时沿用原有得分"""
+        shanten = self.evaluator.rank_discards()
+        best = min(shanten.values())
+        return {tile: score for tile, score in scores.items() if shanten[tile] == best}
+
+    def _late_game_discards(self, tiles: Union[List[Tile], Hand]) -> Optional[List[Tile]]:
+        """后期剩余摸牌次数不多时, 返回自摸概率最高的打法; 不适用、超时或无法和牌时返回None"""
+        if self.expectimax is None or self.game_context.game_stage != "late":
+            return None
+        remaining = self.prob_engine.live_copies(tiles)
+        draws = estimate_draws(remaining)
+        if not 0 < draws <= self.expectimax.max_draws:
+            return None
+        result = self.expectimax.solve(tiles, remaining, draws)
+        if result is None or result.values[result.best] <= 0:
+            return None
+        best = result.values[result.best]
+        return [tile for tile, value in result.values.items() if value >= best - 1e-12]
 
     def _find_tile_position(self, tile: Tile) -> Optional[Tuple[int, int]]:
         """查找牌的位置"""
@@ -102,10 +285,10 @@ class ChaoshanMJPlugin:
 
     def _calculate_selection_score(self, tile: Tile) -> float:
         """计算选牌分数"""
-        base_score = random.uniform(0.8, 1.2)
+        base_score = self.rng.uniform(0.8, 1.2)
         
         # 考虑牌型
-        if tile.type in [TileType.WIND, TileType.DRAGON]:
+        if tile.is_honor:
             base_score *= 1.1
             
         # 考虑数值
@@ -118,13 +301,14 @@ class ChaoshanMJPlugin:
     def _record_discard(self, tile: Tile):
         """记录出牌"""
         self.discard_history.append(tile)
-        self.prob_engine.update_seen_tiles(tile)
+        self.prob_engine.update_own_revealed(tile)
+        self.danger.observe(None, 'discard', [tile])
 
     def _update_history(self, tiles: List[Tile]):
         """更新历史记录"""
         self.history.append(tiles)
         for tile in tiles:
-            self.prob_engine.update_seen_tiles(tile)
+            self.prob_engine.update_seen_tiles(tile, held=True)
 
 class GameContext:
     """游戏上下文管理"""
@@ -0,0 +1,122 @@
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, NUM_TILE_KINDS, tile_counts
+
+# 放铳危险度
+#
+# 每张牌对每家对手的危险度由能和这张牌的听牌形估计:
+# - 两面(顺子的一端)、嵌张、边张, 所需的搭子中任一张已全部可见(壁)时不可能成立;
+#   对手打过这张牌另一端的筋牌时两面的可能性降低(筋)
+# - 单骑与双碰, 需要对手手中还有这张牌, 未见张数为0时不可能成立(死牌)
+# - 对手自己打过的牌(现物)危险度大幅降低; 潮汕规则没有振听, 现物并非绝对安全
+# 每次观察动作只做O(1)的更新(可见张数、现物、筋), 查询时再以34格的数组运算
+# 结合自己的手牌得出危险度向量。
+
+NUM_OPPONENTS = 3
+
+RYANMEN_WEIGHT = 1.0     # 两面
+PARTIAL_WEIGHT = 0.5     # 嵌张/边张
+PAIR_WEIGHT = 0.4        # 单骑/双碰, 按未见张数(最多2)计
+_MAX_WEIGHT = 2 * RYANMEN_WEIGHT + PARTIAL_WEIGHT + 2 * PAIR_WEIGHT
+
+def _build_shapes():
+    """各牌作为和牌张的三种顺子搭子: 左(t-2,t-1)、中(t-1,t+1)、右(t+1,t+2)"""
+    index = np.arange(NUM_TILE_KINDS)
+    value = np.where(index < 27, index % 9 + 1, 0)
+    suit = index < 27
+    left = suit & (value >= 3)
+    middle = suit & (value >= 2) & (value <= 8)
+    right = suit & (value <= 7)
+    # 两面之外的左/右搭子为边张(12听3, 89听7)
+    left_weight = np.where(value >= 4, RYANMEN_WEIGHT, PARTIAL_WEIGHT) * left
+    right_weight = np.where(value <= 6, RYANMEN_WEIGHT, PARTIAL_WEIGHT) * right
+    middle_weight = PARTIAL_WEIGHT * middle
+    clip = lambda offset: np.clip(index + offset, 0, NUM_TILE_KINDS - 1)
+    partners = (clip(-2), clip(-1), clip(1), clip(2))
+    return left_weight, middle_weight, right_weight, partners, value
+
+_LEFT_WEIGHT, _MIDDLE_WEIGHT, _RIGHT_WEIGHT, _PARTNERS, _VALUES = _build_shapes()
+
+class DangerTable:
+    """按已见牌增量维护的放铳危险度
+
+    对手序号0为下家, 1为对家, 2为上家, None表示自己。
+    各家的听牌可能性按出牌数与副露数估计: min(1, 出牌数*per_discard + 副露数*per_meld)。
+    """
+    def __init__(self, per_discard: float = 0.04, per_meld: float = 0.15,
+                 genbutsu_factor: float = 0.1, suji_factor: float = 0.4):
+        self.per_discard = per_discard
+        self.per_meld = per_meld
+        self.genbutsu_factor = genbutsu_factor
+        self.suji_factor = suji_factor
+        self.reset()
+
+    def reset(self):
+        """新的一局"""
+        self.visible = np.zeros(NUM_TILE_KINDS, dtype=np.int64)     # 牌河与副露中的张数
+        self.genbutsu = np.zeros((NUM_OPPONENTS, NUM_TILE_KINDS), dtype=bool)
+        # 左/右两面搭子的另一端已是该家现物
+        self.suji_left = np.zeros((NUM_OPPONENTS, NUM_TILE_KINDS), dtype=bool)
+        self.suji_right = np.zeros((NUM_OPPONENTS, NUM_TILE_KINDS), dtype=bool)
+        self.discards = np.zeros(NUM_OPPONENTS, dtype=np.int64)
+        self.melds = np.zeros(NUM_OPPONENTS, dtype=np.int64)
+        self._last_discard: Optional[Tile] = None
+
+    def observe(self, seat: Optional[int], action: str, tiles: Sequence[Tile]):
+        """观察一个动作: 'discard'或吃/碰/杠等, tiles为打出或组成副露的牌"""
+        if seat is not None and not 0 <= seat < NUM_OPPONENTS:
+            raise ValueError(f"Opponent seat must be between 0 and {NUM_OPPONENTS - 1}")
+        if action == 'discard':
+            for tile in tiles:
+                self._discard(seat, tile)
+            return
+        claimed = self._last_discard if action in ('chi', 'peng', 'minggang') else None
+        for tile in tiles:
+            if tile is claimed:
+                # 鸣的是上一张打出的牌, 已经计入可见张数
+                claimed = None
+                continue
+            self.visible[tile.index] += 1
+        if seat is not None and len(tiles) >= 3:
+            self.melds[seat] += 1
+
+    def _discard(self, seat: Optional[int], tile: Tile):
+        index = tile.index
+        self.visible[index] += 1
+        self._last_discard = tile
+        if seat is None:
+            return
+        self.discards[seat] += 1
+        self.genbutsu[seat, index] = True
+        value = _VALUES[index]
+        if value and value + 3 <= 9:
+            self.suji_left[seat, index + 3] = True
+        if value and value - 3 >= 1:
+            self.suji_right[seat, index - 3] = True
+
+    def tenpai_estimate(self) -> np.ndarray:
+        """各家已听牌的粗略估计 [3]"""
+        return np.minimum(1.0, self.discards * self.per_discard + self.melds * self.per_meld)
+
+    def seat_risk(self, tiles: Union[List[Tile], Hand, np.ndarray]) -> np.ndarray:
+        """假定各家已听牌时, 打出各牌放铳的相对危险度 [3, 34], 取值0~1
+
+        tiles为自己的暗手, 与牌河、副露一起计入可见张数。
+        """
+        seen = self.visible + tile_counts(tiles)
+        unseen = np.maximum(4 - seen, 0)
+        wall = seen >= 4                          # 壁: 已全部可见
+        low2, low1, high1, high2 = (wall[p] for p in _PARTNERS)
+        left = _LEFT_WEIGHT * ~(low2 | low1) * np.where(self.suji_left, self.suji_factor, 1.0)
+        right = _RIGHT_WEIGHT * ~(high1 | high2) * np.where(self.suji_right, self.suji_factor, 1.0)
+        middle = _MIDDLE_WEIGHT * ~(low1 | high1)
+        pair = PAIR_WEIGHT * np.minimum(unseen, 2)
+        risk = (left + right + middle + pair) / _MAX_WEIGHT
+        return np.where(self.genbutsu, risk * self.genbutsu_factor, risk)
+
+    def risk(self, tiles: Union[List[Tile], Hand, np.ndarray]) -> np.ndarray:
+        """打出各牌时至少有一家和牌的估计概率 [34]"""
+        threat = self.tenpai_estimate()[:, None]
+        return 1.0 - np.prod(1.0 - threat * self.seat_risk(tiles), axis=0)
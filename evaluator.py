@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES, NUM_TILE_KINDS, tile_counts
+from .shanten import POW5, _rank_discards, _shanten, group_keys, infer_exposed_melds
+from .utils import ProbabilityEngine, _score_kernel
+
+# 万/筒/条/字四组在34格中的切片
+_GROUP_CELLS = (slice(0, 9), slice(9, 18), slice(18, 27), slice(27, 34))
+_GROUP_OF = tuple(index // 9 if index < 27 else 3 for index in range(NUM_TILE_KINDS))
+
+# 摸打前后相差的张数超过此值时直接重建状态
+_SYNC_LIMIT = 4
+
+class IncrementalEvaluator:
+    """增量手牌评估器
+
+    维护手牌计数、四组五进制键、向听数与逐牌得分。摸牌、出牌、鸣牌只修改所在组的键
+    并把该组标记为待重算, 读取得分时只重算变动过的组(每组至多9格);
+    已见牌的变化通过与上次使用的已见牌快照比较得到。
+    """
+    def __init__(self, engine: ProbabilityEngine,
+                 tiles: Union[List[Tile], Hand, np.ndarray] = (),
+                 exposed_melds: Optional[int] = None):
+        self.engine = engine
+        self.reset(tiles, exposed_melds)
+
+    def reset(self, tiles: Union[List[Tile], Hand, np.ndarray] = (),
+              exposed_melds: Optional[int] = None):
+        """按给定手牌重建全部状态, exposed_melds缺省时由张数推断"""
+        self.counts = tile_counts(tiles).tolist()
+        self.size = sum(self.counts)
+        self.exposed_melds = infer_exposed_melds(self.size) if exposed_melds is None \
+            else exposed_melds
+        self.keys = list(group_keys(self.counts))
+        self._scores = np.zeros(NUM_TILE_KINDS)
+        self._seen = self.engine.seen_counts
+        self._dirty = {0, 1, 2, 3}
+        self._shanten = None
+
+    def _change(self, tile: Tile, delta: int):
+        index = tile.index
+        count = self.counts[index] + delta
+        if count < 0:
+            raise ValueError(f"{tile} not in hand")
+        if count > 4:
+            raise ValueError(f"Cannot hold more than 4 copies of {tile}")
+        group = _GROUP_OF[index]
+        self.counts[index] = count
+        self.size += delta
+        self.keys[group] += delta * POW5[index - group * 9]
+        self._dirty.add(group)
+        self._shanten = None
+
+    def draw(self, tile: Tile):
+        """摸入一张牌"""
+        self._change(tile, 1)
+
+    def discard(self, tile: Tile):
+        """打出一张牌"""
+        self._change(tile, -1)
+
+    def meld(self, tiles: List[Tile]):
+        """鸣牌: 从手牌中移除组成副露的手牌, 副露面子数加一"""
+        removed = []
+        try:
+            for tile in tiles:
+                self._change(tile, -1)
+                removed.append(tile)
+        except ValueError:
+            for tile in removed:
+                self._change(tile, 1)
+            raise
+        self.exposed_melds += 1
+
+    def sync(self, tiles: Union[List[Tile], Hand, np.ndarray]):
+        """使状态与给定手牌一致, 只对差异部分做增量更新
+
+        副露面子数按新的张数推断, 差异较大(如新的一局)时直接重建。
+        """
+        array = tile_counts(tiles)
+        counts = array.tolist()
+        current = self.counts
+        changes = [(index, count - current[index])
+                   for index, count in enumerate(counts) if count != current[index]]
+        if sum(abs(delta) for _, delta in changes) > _SYNC_LIMIT:
+            self.reset(array)
+            return
+        for index, delta in changes:
+            self._change(ALL_TILES[index], delta)
+        self.exposed_melds = infer_exposed_melds(self.size)
+
+    @property
+    def shanten(self) -> int:
+        """当前手牌的向听数"""
+        if self._shanten is None:
+            self._shanten = _shanten(self.counts, self.exposed_melds, self.keys)
+        return self._shanten
+
+    def rank_discards(self) -> Dict[Tile, int]:
+        """打出每种牌后的向听数, 复用已维护的各组键"""
+        return _rank_discards(self.counts, self.keys, self.exposed_melds)
+
+    def scores(self) -> Dict[Tile, float]:
+        """手牌中每种牌的得分, 与ProbabilityEngine.calculate_tile_scores结果一致"""
+        seen = self.engine.seen_counts
+        for index in np.flatnonzero(seen != self._seen).tolist():
+            self._dirty.add(_GROUP_OF[index])
+        self._seen = seen
+
+        if self._dirty:
+            for group in self._dirty:
+                self._score_group(group, seen)
+            self._dirty.clear()
+
+        scores = self._scores.tolist()
+        return {ALL_TILES[index]: scores[index]
+                for index, count in enumerate(self.counts) if count}
+
+    def _score_group(self, group: int, seen: np.ndarray):
+        """重算一组的得分, 顺子窗口不跨组, 与整手计算的结果一致"""
+        cells = _GROUP_CELLS[group]
+        self._scores[cells] = _score_kernel(np.array(self.counts[cells]), seen[cells],
+                                            self.engine.pattern_weights, cells)
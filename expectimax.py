@@ -0,0 +1,162 @@
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, NUM_TILE_KINDS, tile_counts
+from .shanten import _improving_tiles, _rank_discards, group_keys, infer_exposed_melds
+from .cache import LRUCache
+from .canonical import canonical_cells_key
+
+# 终局期望最大化搜索
+#
+# 剩余摸牌次数很少时, 精确计算每种打法在之后的摸牌中自摸和牌的概率:
+# 机会节点按剩余张数加权枚举下一张摸牌, 决策节点在打出后的各手牌中取最大值。
+# 他家摸走的牌对自己而言同样是随机的未见牌, 因此自己的摸牌序列等价于
+# 从全部未见牌中不放回地抽取, 不必模拟他家。
+# 向听数为s的手牌至少还需s+1次摸牌才能和牌, 摸牌次数不足的分支直接剪枝。
+# 置换表以 (手牌, 剩余张数) 的规范键加上摸牌次数为键, 花色互换、数牌翻转
+# 与字牌互换的局面共用同一表项, 且表项跨多次搜索保留。
+
+class _SearchTimeout(Exception):
+    pass
+
+class ExpectimaxResult(NamedTuple):
+    """搜索结果"""
+    values: Dict[Tile, float]   # 各打法在剩余摸牌次数内自摸和牌的概率
+    best: Tile
+    nodes: int
+    elapsed: float
+
+class ExpectimaxSolver:
+    """终局精确搜索
+
+    budget_ms为每次搜索的时间预算(毫秒, 按time.perf_counter计时), 超时返回None
+    由调用方回退到启发式; max_nodes为每次搜索展开的节点数上限, 超过时同样返回None,
+    与机器快慢无关, 需要复现结果时使用; 两者为None时不限制。
+    max_draws为搜索的最大摸牌次数, 超过时不搜索。
+    """
+    def __init__(self, budget_ms: Optional[float] = 100.0, max_draws: int = 2,
+                 table_entries: int = 1 << 16, max_nodes: Optional[int] = None):
+        if max_draws <= 0:
+            raise ValueError("max_draws must be positive")
+        self.budget_ms = budget_ms
+        self.max_draws = max_draws
+        self.max_nodes = max_nodes
+        self.table = LRUCache(table_entries)
+        # 向听数与进张只取决于手牌, 按手牌计数串记忆, 每次搜索开始时清空
+        self._discards: Dict[bytes, List[Tuple[int, int]]] = {}
+        self._improving: Dict[bytes, List[int]] = {}
+        self._nodes = 0
+        self._deadline = 0.0
+        self._node_limit = 0
+
+    def solve(self, tiles: Union[List[Tile], Hand, np.ndarray],
+              remaining: Union[Sequence[int], np.ndarray], draws: int,
+              exposed_melds: Optional[int] = None) -> Optional[ExpectimaxResult]:
+        """求每种打法在之后draws次摸牌内自摸和牌的概率
+
+        remaining为不含自己手牌的34格剩余张数(见ProbabilityEngine.live_copies)。
+        draws超过max_draws或超出时间、节点预算时返回None。
+        """
+        if draws < 0:
+            raise ValueError("draws must be non-negative")
+        if draws > self.max_draws:
+            return None
+        counts = tile_counts(tiles).tolist()
+        remaining = [int(r) for r in remaining]
+        if len(remaining) != NUM_TILE_KINDS:
+            raise ValueError(f"Expected {NUM_TILE_KINDS} remaining counts, got {len(remaining)}")
+        if exposed_melds is None:
+            exposed_melds = infer_exposed_melds(sum(counts) - 1)
+        total = sum(remaining)
+        draws = min(draws, total)
+
+        start = time.perf_counter()
+        self._nodes = 0
+        self._discards.clear()
+        self._improving.clear()
+        self._deadline = start + self.budget_ms / 1000.0 if self.budget_ms is not None else float('inf')
+        self._node_limit = self.max_nodes if self.max_nodes is not None else float('inf')
+        values = {}
+        try:
+            for tile, shanten in _rank_discards(counts, group_keys(counts), exposed_melds).items():
+                counts[tile.index] -= 1
+                values[tile] = self._chance(counts, remaining, total, draws, exposed_melds, shanten)
+                counts[tile.index] += 1
+        except _SearchTimeout:
+            return None
+        best = max(values, key=values.get)
+        return ExpectimaxResult(values, best, self._nodes, time.perf_counter() - start)
+
+    def _chance(self, counts: List[int], remaining: List[int], total: int, draws: int,
+                exposed: int, shanten: int) -> float:
+        """打出后的手牌在之后draws次摸牌内和牌的概率"""
+        if shanten >= draws:
+            return 0.0
+        self._nodes += 1
+        if self._nodes > self._node_limit or time.perf_counter() > self._deadline:
+            raise _SearchTimeout()
+
+        key = canonical_cells_key(bytes([c * 5 + r for c, r in zip(counts, remaining)])) \
+            + bytes((draws, exposed))
+        value = self.table.get(key)
+        if value is not None:
+            return value
+
+        # 摸入进张使向听数减一, 听牌时即为和牌; 其余的牌不改变向听数,
+        # 向听数恰为draws-1时摸到它们已来不及和牌
+        hand = bytes(counts)
+        improving = self._improving.get(hand)
+        if improving is None:
+            improving = self._improving[hand] = _improving_tiles(counts, exposed)[1]
+        if shanten == draws - 1:
+            candidates = improving
+        else:
+            candidates = [index for index in range(NUM_TILE_KINDS) if remaining[index]]
+        improving = set(improving)
+        value = 0.0
+        for index in candidates:
+            count = remaining[index]
+            if not count:
+                continue
+            if shanten == 0 and index in improving:
+                value += count
+            elif draws > 1:
+                counts[index] += 1
+                remaining[index] -= 1
+                value += count * self._decide(counts, remaining, total - 1, draws - 1, exposed)
+                remaining[index] += 1
+                counts[index] -= 1
+        value /= total
+        self.table.put(key, value, size=len(key))
+        return value
+
+    def _decide(self, counts: List[int], remaining: List[int], total: int, draws: int,
+                exposed: int) -> float:
+        """摸牌后选择最优打法"""
+        hand = bytes(counts)
+        discards = self._discards.get(hand)
+        if discards is None:
+            discards = self._discards[hand] = [
+                (tile.index, shanten)
+                for tile, shanten in _rank_discards(counts, group_keys(counts), exposed).items()]
+        best = 0.0
+        for index, shanten in discards:
+            if shanten >= draws:
+                continue
+            counts[index] -= 1
+            value = self._chance(counts, remaining, total, draws, exposed, shanten)
+            counts[index] += 1
+            if value > best:
+                best = value
+        return best
+
+    def clear(self):
+        """清空置换表"""
+        self.table.clear()
+
+def estimate_draws(remaining: Union[Sequence[int], np.ndarray], opponent_tiles: int = 39) -> int:
+    """按未见牌数估计自己剩余的摸牌次数: 扣除他家暗手后的牌墙四家平分"""
+    wall = int(np.sum(remaining)) - opponent_tiles
+    return max(wall, 0) // 4
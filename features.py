@@ -0,0 +1,207 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tiles import Tile, NUM_TILE_KINDS, tile_counts
+from .core import GameContext
+
+# 训练特征编码
+#
+# 每个样本是某座位出牌前的局面, 编码为[NUM_PLANES, 34]的平面, 座位均相对出牌者:
+#   0-3    自己暗手, 张数>=1..>=4(阶梯编码)
+#   4-7    自己、下家、对家、上家的牌河张数
+#   8-11   同上顺序的副露张数
+#   12     自己视角的未见张数
+#   13-15  GameContext.game_stage的独热编码(early/middle/late), 整个平面取同一值
+# 标签为实际打出的牌索引。逐条add只把原始计数复制进预分配的缓冲,
+# encode对整批做一次向量化编码并原地写入输出缓冲。
+
+HAND_PLANES = 0
+DISCARD_PLANES = 4
+MELD_PLANES = 8
+UNSEEN_PLANE = 12
+STAGE_PLANES = 13
+NUM_PLANES = 16
+
+NUM_SEATS = 4
+STAGES = ('early', 'middle', 'late')
+STAGE_CODES = {stage: code for code, stage in enumerate(STAGES)}
+
+_LEVELS = np.arange(1, 5, dtype=np.uint8)[:, None]
+_SEAT_OFFSETS = np.arange(NUM_SEATS)
+
+def encode_batch(hands: np.ndarray, discards: np.ndarray, melds: np.ndarray,
+                 seats: np.ndarray, stages: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """向量化编码n个样本并写入out
+
+    hands为[n, 34]暗手计数, discards与melds为[n, 4, 34]按绝对座位的计数,
+    seats为出牌者座位, stages为阶段编码, out为[n, NUM_PLANES, 34]的输出缓冲。
+    """
+    n = len(hands)
+    if out.shape != (n, NUM_PLANES, NUM_TILE_KINDS):
+        raise ValueError(f"Expected output of shape {(n, NUM_PLANES, NUM_TILE_KINDS)}, got {out.shape}")
+    rows = np.arange(n)[:, None]
+    order = (seats[:, None] + _SEAT_OFFSETS) % NUM_SEATS
+    out[:, HAND_PLANES:HAND_PLANES + 4] = hands[:, None, :] >= _LEVELS
+    out[:, DISCARD_PLANES:DISCARD_PLANES + NUM_SEATS] = discards[rows, order]
+    out[:, MELD_PLANES:MELD_PLANES + NUM_SEATS] = melds[rows, order]
+    seen = hands.astype(np.int16) + discards.sum(axis=1) + melds.sum(axis=1)
+    out[:, UNSEEN_PLANE] = np.maximum(4 - seen, 0)
+    out[:, STAGE_PLANES:STAGE_PLANES + len(STAGES)] = \
+        (stages[:, None] == np.arange(len(STAGES)))[:, :, None]
+    return out
+
+class FeatureEncoder:
+    """按批编码的特征缓冲
+
+    add把一个样本的原始计数写入预分配缓冲, 满batch_size条后调用encode整批编码。
+    """
+    def __init__(self, batch_size: int = 1024):
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self.batch_size = batch_size
+        self.hands = np.zeros((batch_size, NUM_TILE_KINDS), dtype=np.uint8)
+        self.discards = np.zeros((batch_size, NUM_SEATS, NUM_TILE_KINDS), dtype=np.uint8)
+        self.melds = np.zeros((batch_size, NUM_SEATS, NUM_TILE_KINDS), dtype=np.uint8)
+        self.seats = np.zeros(batch_size, dtype=np.int64)
+        self.stages = np.zeros(batch_size, dtype=np.int64)
+        self.labels = np.zeros(batch_size, dtype=np.uint8)
+        self.size = 0
+
+    @property
+    def full(self) -> bool:
+        return self.size >= self.batch_size
+
+    def add(self, hand: np.ndarray, discards: np.ndarray, melds: np.ndarray,
+            seat: int, stage: str, label: int) -> bool:
+        """追加一个样本, 返回缓冲是否已满"""
+        if self.full:
+            raise ValueError("Feature buffer is full")
+        i = self.size
+        self.hands[i] = hand
+        self.discards[i] = discards
+        self.melds[i] = melds
+        self.seats[i] = seat
+        self.stages[i] = STAGE_CODES[stage]
+        self.labels[i] = label
+        self.size += 1
+        return self.full
+
+    def encode(self, out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """编码缓冲中的样本, 返回(平面, 标签); 指定out时原地写入out"""
+        n = self.size
+        if out is None:
+            out = np.empty((n, NUM_PLANES, NUM_TILE_KINDS), dtype=np.uint8)
+        encode_batch(self.hands[:n], self.discards[:n], self.melds[:n],
+                     self.seats[:n], self.stages[:n], out)
+        return out, self.labels[:n]
+
+    def clear(self):
+        self.size = 0
+
+class ShardExporter:
+    """把自对弈中的出牌样本编码后写入大小有限的npz分片
+
+    提供与RecordWriter相同的begin_game/action/end_game接口, 可直接作为
+    SelfPlaySimulator的writer。每个分片最多shard_size个样本, 文件为
+    {prefix}-{序号:05d}.npz, 含planes([n, NUM_PLANES, 34], uint8)与labels([n], uint8)。
+    """
+    def __init__(self, directory: str, prefix: str = 'shard', shard_size: int = 65536,
+                 batch_size: int = 1024, compress: bool = True):
+        if batch_size <= 0 or shard_size <= 0 or shard_size % min(batch_size, shard_size):
+            raise ValueError("shard_size must be a positive multiple of batch_size")
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.compress = compress
+        self.encoder = FeatureEncoder(min(batch_size, shard_size))
+        self._planes = np.zeros((shard_size, NUM_PLANES, NUM_TILE_KINDS), dtype=np.uint8)
+        self._labels = np.zeros(shard_size, dtype=np.uint8)
+        self._count = 0
+        self.shards: List[str] = []
+        self.samples = 0
+        os.makedirs(directory, exist_ok=True)
+        self._game = False
+
+    def begin_game(self, hands: Sequence[Sequence[Tile]], dealer: int = 0):
+        """开始新的一局, hands为四家的起手牌"""
+        if len(hands) != NUM_SEATS:
+            raise ValueError(f"Expected {NUM_SEATS} hands, got {len(hands)}")
+        self._hands = np.stack([tile_counts(list(hand)) for hand in hands]).astype(np.uint8)
+        self._discards = np.zeros((NUM_SEATS, NUM_TILE_KINDS), dtype=np.uint8)
+        self._melds = np.zeros((NUM_SEATS, NUM_TILE_KINDS), dtype=np.uint8)
+        self._contexts = [GameContext() for _ in range(NUM_SEATS)]
+        self._last_discard: Optional[Tuple[int, Tile]] = None
+        self._game = True
+
+    def action(self, seat: int, action: str, tiles: Sequence[Tile] = ()):
+        """观察一个动作, 出牌时先以出牌前的局面生成样本"""
+        if not self._game:
+            raise ValueError("No game in progress")
+        hand = self._hands[seat]
+        if action == 'draw' or action == 'ron':
+            hand[tiles[0].index] += 1
+        elif action == 'discard':
+            index = tiles[0].index
+            if self.encoder.add(hand, self._discards, self._melds, seat,
+                                self._contexts[seat].game_stage, index):
+                self._flush_batch()
+            hand[index] -= 1
+            self._discards[seat, index] += 1
+            self._last_discard = (seat, tiles[0])
+        elif action == 'bugang':
+            hand[tiles[0].index] -= 1
+            self._melds[seat, tiles[0].index] += 1
+        elif action != 'tsumo':
+            claimed = None
+            if action in ('chi', 'peng', 'minggang') and self._last_discard is not None:
+                # 被鸣的牌从出牌者的牌河移入副露
+                discarder, claimed = self._last_discard
+                self._discards[discarder, claimed.index] -= 1
+            for tile in tiles:
+                self._melds[seat, tile.index] += 1
+                if tile is claimed:
+                    claimed = None
+                else:
+                    hand[tile.index] -= 1
+        if action in ('discard', 'chi', 'peng', 'minggang', 'angang', 'bugang'):
+            for other in range(NUM_SEATS):
+                if other != seat:
+                    self._contexts[other].update_opponent_action(action, list(tiles))
+
+    def end_game(self, winner: Optional[int] = None, loser: Optional[int] = None,
+                 result: str = 'draw', scores: Sequence[int] = (0,) * NUM_SEATS):
+        self._game = False
+
+    def _flush_batch(self):
+        n = self.encoder.size
+        if not n:
+            return
+        _, labels = self.encoder.encode(self._planes[self._count:self._count + n])
+        self._labels[self._count:self._count + n] = labels
+        self._count += n
+        self.samples += n
+        self.encoder.clear()
+        if self._count >= self.shard_size:
+            self._write_shard()
+
+    def _write_shard(self):
+        if not self._count:
+            return
+        path = os.path.join(self.directory, f"{self.prefix}-{len(self.shards):05d}.npz")
+        save = np.savez_compressed if self.compress else np.savez
+        save(path, planes=self._planes[:self._count], labels=self._labels[:self._count])
+        self.shards.append(path)
+        self._count = 0
+
+    def close(self):
+        """写出剩余样本"""
+        self._flush_batch()
+        self._write_shard()
+
+    def __enter__(self) -> 'ShardExporter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
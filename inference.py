@@ -0,0 +1,244 @@
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, NUM_TILE_KINDS, tile_counts
+from .shanten import _shanten, infer_exposed_melds
+from .agari import is_winning_data
+from .cache import LRUCache
+
+# 对手暗手推断(粒子滤波)
+#
+# 每个粒子是三家暗手的一种可能, 全部粒子存为[粒子数, 3, 34]的计数数组,
+# 自己看不到的牌(未见牌)减去粒子中三家暗手即为该粒子的牌墙。
+# 每观察到一个动作, 对全部粒子做一次向量化的推进与重新加权:
+# - 对手摸打: 先从粒子牌墙中随机摸一张, 再按出牌模型计算打出该牌的概率作为权重;
+#   暗手中没有该牌的粒子只可能是摸切, 改为摸入该牌并乘以摸到它的概率
+# - 对手鸣牌: 暗手中须有亮出的牌, 缺牌的粒子从自己的牌墙中补入
+# - 自己摸牌: 乘以从粒子牌墙中摸到这些牌的概率
+# 有效粒子数过低时系统重采样, 权重全部为0时按未见牌重新抽样。
+
+NUM_OPPONENTS = 3
+
+class OpponentInference:
+    """对手暗手的粒子推断
+
+    对手序号0为下家, 1为对家, 2为上家。temperature为出牌模型的参数:
+    打出一张牌的概率正比于 exp(-temperature * 该牌与同门相邻(两格内)牌的张数),
+    即越孤立的牌越可能被打出。
+    """
+    def __init__(self, particles: int = 256, hand_size: int = 13, temperature: float = 1.0,
+                 resample_threshold: float = 0.5, seed: Optional[int] = None):
+        if particles <= 0:
+            raise ValueError("particles must be positive")
+        self.n_particles = particles
+        self.hand_size = hand_size
+        self.temperature = temperature
+        self.resample_threshold = resample_threshold
+        self.rng = np.random.default_rng(seed)
+        # 相邻张数(最多5格各4张)对应的出牌倾向
+        self._isolation = np.exp(-temperature * np.arange(21))
+        self._waits = LRUCache(1 << 14)
+        self.reset()
+
+    def reset(self, tiles: Union[List[Tile], Hand, np.ndarray, None] = None):
+        """新的一局, tiles为自己的起手牌"""
+        self.known = np.zeros(NUM_TILE_KINDS, dtype=np.int64)
+        self._hand = np.zeros(NUM_TILE_KINDS, dtype=np.int64)
+        if tiles is not None:
+            self._hand = tile_counts(tiles).astype(np.int64)
+            self.known += self._hand
+        self.sizes = np.full(NUM_OPPONENTS, self.hand_size, dtype=np.int64)
+        self._claimed = [False] * NUM_OPPONENTS
+        self._last_discard: Optional[Tile] = None
+        self._rebuild()
+
+    @property
+    def unseen(self) -> np.ndarray:
+        """自己看不到的各牌张数(三家暗手与牌墙)"""
+        return np.maximum(4 - self.known, 0)
+
+    def walls(self) -> np.ndarray:
+        """各粒子的牌墙计数 [粒子数, 34]"""
+        return self.unseen - self.hands.sum(axis=1)
+
+    def _sample(self, n: int) -> np.ndarray:
+        """按未见牌与各家暗手张数随机抽取n个粒子"""
+        pool = np.repeat(np.arange(NUM_TILE_KINDS), self.unseen)
+        sizes = self.sizes.copy()
+        # 只在观察不一致(未见牌少于三家暗手)时发生, 从最大的暗手中扣除
+        for _ in range(max(int(sizes.sum()) - len(pool), 0)):
+            sizes[sizes.argmax()] -= 1
+        total = int(sizes.sum())
+        order = np.argsort(self.rng.random((n, len(pool))), axis=1)[:, :total]
+        seats = np.repeat(np.arange(NUM_OPPONENTS), sizes)
+        hands = np.zeros((n, NUM_OPPONENTS, NUM_TILE_KINDS), dtype=np.int64)
+        np.add.at(hands, (np.arange(n)[:, None], seats[None, :], pool[order]), 1)
+        return hands
+
+    def _rebuild(self):
+        self.hands = self._sample(self.n_particles)
+        self.weights = np.full(self.n_particles, 1.0 / self.n_particles)
+
+    def _normalize(self):
+        total = self.weights.sum()
+        if not total > 0:
+            self._rebuild()
+            return
+        self.weights /= total
+        ess = 1.0 / np.square(self.weights).sum()
+        if ess < self.resample_threshold * self.n_particles or not self.weights.all():
+            # 系统重采样, 同时淘汰与观察矛盾(权重为0)的粒子
+            positions = (self.rng.random() + np.arange(self.n_particles)) / self.n_particles
+            cumulative = np.cumsum(self.weights)
+            cumulative[-1] = 1.0
+            indices = np.searchsorted(cumulative, positions)
+            self.hands = self.hands[indices]
+            self.weights = np.full(self.n_particles, 1.0 / self.n_particles)
+
+    def _discard_probability(self, hands: np.ndarray, index: int) -> np.ndarray:
+        """出牌模型下各粒子从hands([粒子数, 34])中打出index的概率"""
+        suits = hands[:, :27].reshape(-1, 3, 9)
+        window = suits.copy()
+        for shift in (1, 2):
+            window[..., shift:] += suits[..., :-shift]
+            window[..., :-shift] += suits[..., shift:]
+        neighbours = np.concatenate((window.reshape(-1, 27), hands[:, 27:]), axis=1)
+        # 相邻张数不含这张牌自己
+        preference = hands * self._isolation[np.maximum(neighbours - 1, 0)]
+        total = preference.sum(axis=1)
+        return np.divide(preference[:, index], total, out=np.zeros_like(total), where=total > 0)
+
+    def observe_own(self, tiles: Union[List[Tile], Hand, np.ndarray]):
+        """自己的当前暗手, 比上次多出的牌视为从牌墙摸入"""
+        counts = tile_counts(tiles).astype(np.int64)
+        gained = np.maximum(counts - self._hand, 0)
+        self._hand = counts
+        if not gained.any():
+            return
+        walls = self.walls()
+        likelihood = np.ones(self.n_particles)
+        size = walls.sum(axis=1)
+        for index in np.flatnonzero(gained):
+            for _ in range(gained[index]):
+                likelihood *= np.divide(np.maximum(walls[:, index], 0), size,
+                                        out=np.zeros(self.n_particles), where=size > 0)
+                walls[:, index] -= 1
+                size -= 1
+        self.known += gained
+        self.weights *= likelihood
+        self._normalize()
+
+    def observe_own_discard(self, tile: Tile):
+        """自己打出的牌仍然可见, 只从记录的暗手中移除"""
+        if self._hand[tile.index]:
+            self._hand[tile.index] -= 1
+
+    def observe(self, seat: int, action: str, tiles: Sequence[Tile]):
+        """对手seat的动作: 'discard'或吃/碰/杠等, tiles为打出或亮出的牌"""
+        if not 0 <= seat < NUM_OPPONENTS:
+            raise ValueError(f"Opponent seat must be between 0 and {NUM_OPPONENTS - 1}")
+        if action == 'discard':
+            for tile in tiles:
+                self._discard(seat, tile.index, drew=not self._claimed[seat])
+                self._claimed[seat] = False
+                self._last_discard = tile
+            return
+
+        revealed = tile_counts(tiles).astype(np.int64)
+        if action in ('chi', 'peng', 'minggang') and self._last_discard is not None \
+                and revealed[self._last_discard.index]:
+            # 鸣的是上一张打出的牌, 它已计入可见牌
+            revealed[self._last_discard.index] -= 1
+        self._reveal(seat, revealed)
+        # 吃碰后直接出牌, 杠后先补牌
+        self._claimed[seat] = action in ('chi', 'peng')
+
+    def _discard(self, seat: int, index: int, drew: bool):
+        hands = self.hands[:, seat]
+        rows = np.arange(self.n_particles)
+        if drew:
+            walls = self.walls()
+            size = walls.sum(axis=1)
+            holding = hands[:, index] > 0
+            # 持有该牌的粒子按牌墙随机摸一张, 其余粒子只能是摸到该牌后摸切
+            cumulative = np.cumsum(walls, axis=1)
+            targets = self.rng.random(self.n_particles) * size
+            draws = (cumulative <= targets[:, None]).sum(axis=1).clip(0, NUM_TILE_KINDS - 1)
+            draws = np.where(holding, draws, index)
+            self.weights *= np.where(
+                holding, 1.0,
+                np.divide(np.maximum(walls[:, index], 0), size,
+                          out=np.zeros(self.n_particles), where=size > 0))
+            hands[rows, draws] += np.where(size > 0, 1, 0)
+        else:
+            self.sizes[seat] -= 1
+        self.weights *= self._discard_probability(hands, index)
+        hands[:, index] = np.maximum(hands[:, index] - 1, 0)
+        self.known[index] += 1
+        self._normalize()
+
+    def _reveal(self, seat: int, revealed: np.ndarray):
+        hands = self.hands[:, seat]
+        missing = np.maximum(revealed - hands, 0)
+        walls = self.walls()
+        for row in np.flatnonzero(missing.any(axis=1)):
+            # 从粒子牌墙补入缺的牌, 换出同样张数的其余暗手牌
+            need = missing[row]
+            if (walls[row] < need).any():
+                self.weights[row] = 0.0
+                continue
+            spare = hands[row] - np.minimum(hands[row], revealed)
+            pool = np.repeat(np.arange(NUM_TILE_KINDS), spare)
+            if len(pool) < need.sum():
+                self.weights[row] = 0.0
+                continue
+            returned = self.rng.choice(pool, size=int(need.sum()), replace=False)
+            np.subtract.at(hands[row], returned, 1)
+            hands[row] += need
+        self.hands[:, seat] = np.maximum(hands - revealed, 0)
+        self.sizes[seat] -= int(revealed.sum())
+        self.known += revealed
+        self._normalize()
+
+    def tile_probabilities(self) -> np.ndarray:
+        """各对手暗手中至少有一张该牌的概率 [3, 34]"""
+        return np.tensordot(self.weights, self.hands > 0, axes=1)
+
+    def expected_counts(self) -> np.ndarray:
+        """各对手暗手中该牌的期望张数 [3, 34]"""
+        return np.tensordot(self.weights, self.hands, axes=1)
+
+    def _wait_mask(self, counts: np.ndarray, exposed: int) -> np.ndarray:
+        key = counts.astype(np.uint8).tobytes() + bytes((exposed,))
+        mask = self._waits.get(key)
+        if mask is None:
+            mask = np.zeros(NUM_TILE_KINDS, dtype=bool)
+            hand = counts.tolist()
+            if sum(hand) + 3 * exposed == 13 and _shanten(hand, exposed) == 0:
+                data = bytearray(key[:-1])
+                for index in range(NUM_TILE_KINDS):
+                    if data[index] < 4:
+                        data[index] += 1
+                        mask[index] = is_winning_data(bytes(data), exposed)
+                        data[index] -= 1
+            self._waits.put(key, mask, size=len(key) + NUM_TILE_KINDS)
+        return mask
+
+    def _wait_masks(self) -> np.ndarray:
+        """各粒子中各对手的听牌掩码 [粒子数, 3, 34], 未听牌时全为False"""
+        waits = np.zeros((self.n_particles, NUM_OPPONENTS, NUM_TILE_KINDS), dtype=bool)
+        for seat in range(NUM_OPPONENTS):
+            # 暗手张数即可推断副露数, 杠子按3张计
+            exposed = infer_exposed_melds(int(self.sizes[seat]) + 1)
+            for row in range(self.n_particles):
+                waits[row, seat] = self._wait_mask(self.hands[row, seat], exposed)
+        return waits
+
+    def wait_probabilities(self) -> np.ndarray:
+        """各对手已听牌且以该牌和牌的概率 [3, 34]"""
+        return np.tensordot(self.weights, self._wait_masks(), axes=1)
+
+    def deal_in_probability(self) -> np.ndarray:
+        """打出各牌时至少有一家以它和牌的概率 [34]"""
+        return self.weights @ self._wait_masks().any(axis=1)
@@ -0,0 +1,99 @@
+from typing import List, NamedTuple, Optional, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, NUM_TILE_KINDS
+from .shanten import calculate_ukeire
+
+# 牌墙摸牌概率
+#
+# 从N张未见牌中不放回地摸k张, 其中W张为目标牌, 摸到目标牌张数服从超几何分布。
+# 组合数用预先算好的对数阶乘表计算, 所有参数都可以是可广播的数组,
+# 一次数组运算即可评估全部候选打法。
+
+MAX_TILES = 136
+_LOG_FACTORIAL = np.concatenate(([0.0], np.cumsum(np.log(np.arange(1, MAX_TILES + 1)))))
+
+def _log_comb(n: np.ndarray, k: np.ndarray) -> np.ndarray:
+    """log C(n, k), k<0或k>n时为-inf"""
+    valid = (k >= 0) & (k <= n)
+    n = np.where(valid, n, 0)
+    k = np.where(valid, k, 0)
+    return np.where(valid, _LOG_FACTORIAL[n] - _LOG_FACTORIAL[k] - _LOG_FACTORIAL[n - k], -np.inf)
+
+def _as_int(values) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    if values.size and (values.min() < 0 or values.max() > MAX_TILES):
+        raise ValueError(f"Tile counts must be between 0 and {MAX_TILES}")
+    return values
+
+def miss_probability(targets, population, draws) -> np.ndarray:
+    """k次摸牌都没有摸到目标牌的概率 C(N-W, k) / C(N, k)"""
+    targets, population, draws = (_as_int(v) for v in (targets, population, draws))
+    if np.any(targets > population):
+        raise ValueError("targets cannot exceed population")
+    draws = np.minimum(draws, population)
+    return np.exp(_log_comb(population - targets, draws) - _log_comb(population, draws))
+
+def hit_probability(targets, population, draws) -> np.ndarray:
+    """k次摸牌内至少摸到一张目标牌的概率"""
+    return 1.0 - miss_probability(targets, population, draws)
+
+def at_least_probability(targets, population, draws, needed) -> np.ndarray:
+    """k次摸牌内至少摸到needed张目标牌的概率(超几何分布的上尾)"""
+    targets, population, draws, needed = (
+        _as_int(v) for v in (targets, population, draws, needed))
+    if np.any(targets > population):
+        raise ValueError("targets cannot exceed population")
+    draws = np.minimum(draws, population)
+    shape = np.broadcast(targets, population, draws, needed).shape
+    hits = np.arange(MAX_TILES + 1).reshape((1,) * len(shape) + (-1,))
+    targets, population, draws, needed = (
+        np.broadcast_to(v, shape)[..., None] for v in (targets, population, draws, needed))
+    log_pmf = (_log_comb(targets, hits) + _log_comb(population - targets, draws - hits)
+               - _log_comb(population, draws))
+    return np.where(hits >= needed, np.exp(log_pmf), 0.0).sum(axis=-1).clip(0.0, 1.0)
+
+def wait_probability(remaining: np.ndarray, waits: np.ndarray, draws) -> np.ndarray:
+    """摸到任一听牌的概率
+
+    remaining为34格剩余张数; waits为[..., 34]的布尔掩码, 每行一组听牌。
+    """
+    remaining = np.asarray(remaining, dtype=np.int64)
+    targets = (np.asarray(waits, dtype=bool) * remaining).sum(axis=-1)
+    return hit_probability(targets, remaining.sum(), draws)
+
+class DrawOutlook(NamedTuple):
+    """各候选打法打出后的向听数、进张及摸牌前景"""
+    discards: List[Tile]
+    shanten: np.ndarray     # 打出后的向听数
+    ukeire: np.ndarray      # 进张枚数
+    improve: np.ndarray     # 剩余摸牌次数内至少进张一次的概率
+    tenpai: np.ndarray      # 剩余摸牌次数内听牌(或已听牌)的概率
+    win: np.ndarray         # 剩余摸牌次数内自摸和牌的概率
+
+def discard_outlook(tiles: Union[Hand, np.ndarray, List[Tile]], remaining: np.ndarray,
+                    wall_size: int, draws: Optional[int] = None,
+                    exposed_melds: Optional[int] = None) -> DrawOutlook:
+    """一次性评估全部候选打法的摸牌前景
+
+    remaining为不含自己手牌的34格剩余张数(见ProbabilityEngine.live_copies);
+    draws为自己剩余的摸牌次数, 缺省时按牌墙张数的四分之一计算。
+    听牌与和牌概率假定之后每一步的进张枚数与当前相同, 即需要的进张次数服从
+    以当前进张为目标牌的超几何分布, 是一个偏乐观的近似。
+    """
+    remaining = np.asarray(remaining, dtype=np.int64)
+    if remaining.shape != (NUM_TILE_KINDS,):
+        raise ValueError(f"Expected remaining of shape ({NUM_TILE_KINDS},), got {remaining.shape}")
+    if draws is None:
+        draws = wall_size // 4
+    population = int(remaining.sum())
+
+    ukeire = calculate_ukeire(tiles, remaining, exposed_melds)
+    discards = list(ukeire)
+    shanten = np.array([ukeire[tile].shanten for tile in discards])
+    targets = np.array([ukeire[tile].total for tile in discards])
+    # 听牌需要shanten次进张, 和牌还需要再进张一次
+    needed = np.stack([np.ones_like(shanten), np.maximum(shanten, 0), shanten + 1])
+    improve, tenpai, win = at_least_probability(targets, population, draws, needed)
+    return DrawOutlook(discards, shanten, targets, improve, tenpai, win)
@@ -0,0 +1,197 @@
+import mmap
+import struct
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tiles import Tile, ALL_TILES
+
+# 二进制牌谱格式
+#
+#   文件头   MAGIC(8字节) + 版本(uint32) + 保留(uint32)
+#   动作区   全部对局的动作依次排列, 每条动作定长6字节:
+#            座位(uint8) 动作(uint8) 牌索引×4(uint8, 不足以NO_TILE补齐)
+#   对局索引 每局一条定长记录(GAME_DTYPE), 含该局在动作区的起始序号与条数、
+#            庄家、结果、得失分与四家起手牌
+#   文件尾   对局索引的字节偏移(uint64) + 对局数(uint64) + MAGIC
+#
+# 写入时动作按局追加写出, 对局索引先在内存中累积, 关闭时写在文件末尾;
+# 读取时整个文件以mmap映射, 动作区与对局索引直接作为numpy结构化数组访问,
+# 不构造任何Tile对象。一亿条动作约占600MB。
+
+MAGIC = b'CSMJREC\x00'
+VERSION = 1
+NO_TILE = 0xFF
+MAX_MELD_TILES = 4
+HAND_SIZE = 13
+NUM_SEATS = 4
+
+ACTIONS = ('draw', 'discard', 'chi', 'peng', 'minggang', 'angang', 'bugang', 'tsumo', 'ron')
+ACTION_CODES = {name: code for code, name in enumerate(ACTIONS)}
+RESULTS = ('draw', 'tsumo', 'ron')
+RESULT_CODES = {name: code for code, name in enumerate(RESULTS)}
+
+ACTION_DTYPE = np.dtype([('seat', 'u1'), ('action', 'u1'), ('tiles', 'u1', (MAX_MELD_TILES,))])
+GAME_DTYPE = np.dtype([
+    ('start', '<u8'), ('count', '<u4'), ('dealer', 'u1'), ('winner', 'i1'), ('loser', 'i1'),
+    ('result', 'u1'), ('scores', '<i4', (NUM_SEATS,)), ('hands', 'u1', (NUM_SEATS, HAND_SIZE)),
+])
+
+_HEADER = struct.Struct('<8sII')
+_FOOTER = struct.Struct('<QQ8s')
+_GAME = struct.Struct(f'<QIBbbB{NUM_SEATS}i{NUM_SEATS * HAND_SIZE}B')
+
+def encode_tiles(tiles: Sequence[Tile], width: int) -> List[int]:
+    """牌列表编码为定长的索引列表, 不足以NO_TILE补齐"""
+    if len(tiles) > width:
+        raise ValueError(f"At most {width} tiles per record, got {len(tiles)}")
+    return [tile.index for tile in tiles] + [NO_TILE] * (width - len(tiles))
+
+def decode_tiles(indices: Sequence[int]) -> List[Tile]:
+    """还原为Tile列表, 仅用于调试与展示"""
+    return [ALL_TILES[index] for index in indices if index != NO_TILE]
+
+class RecordWriter:
+    """流式写入牌谱
+
+    每局依次调用begin_game、action(若干次)、end_game; 关闭时未结束的对局被丢弃。
+    """
+    def __init__(self, path: str, flush_bytes: int = 1 << 20):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self._file = open(path, 'wb')
+        self._file.write(_HEADER.pack(MAGIC, VERSION, 0))
+        self._pending = bytearray()
+        self._index = bytearray()
+        self._written = 0          # 已写出的动作条数
+        self._game: Optional[Tuple[int, List[int]]] = None
+        self._start = 0
+        self.games = 0
+
+    def begin_game(self, hands: Sequence[Sequence[Tile]], dealer: int = 0):
+        """开始新的一局, hands为四家的起手牌(每家最多13张)"""
+        if self._game is not None:
+            raise ValueError("Previous game has not ended")
+        if len(hands) != NUM_SEATS:
+            raise ValueError(f"Expected {NUM_SEATS} hands, got {len(hands)}")
+        cells = []
+        for hand in hands:
+            cells.extend(encode_tiles(list(hand), HAND_SIZE))
+        self._start = self._written + len(self._pending) // ACTION_DTYPE.itemsize
+        self._game = (dealer, cells)
+
+    def action(self, seat: int, action: str, tiles: Sequence[Tile] = ()):
+        """追加一条动作"""
+        if self._game is None:
+            raise ValueError("No game in progress")
+        code = ACTION_CODES.get(action)
+        if code is None:
+            raise ValueError(f"Unknown action: {action}")
+        self._pending.append(seat)
+        self._pending.append(code)
+        self._pending.extend(encode_tiles(tiles, MAX_MELD_TILES))
+
+    def end_game(self, winner: Optional[int] = None, loser: Optional[int] = None,
+                 result: str = 'draw', scores: Sequence[int] = (0,) * NUM_SEATS):
+        """结束当前对局并写入索引"""
+        if self._game is None:
+            raise ValueError("No game in progress")
+        if result not in RESULT_CODES:
+            raise ValueError(f"Unknown result: {result}")
+        dealer, cells = self._game
+        end = self._written + len(self._pending) // ACTION_DTYPE.itemsize
+        self._index += _GAME.pack(
+            self._start, end - self._start, dealer,
+            -1 if winner is None else winner, -1 if loser is None else loser,
+            RESULT_CODES[result], *scores, *cells)
+        self._game = None
+        self.games += 1
+        if len(self._pending) >= self.flush_bytes:
+            self._flush()
+
+    def _flush(self):
+        self._file.write(self._pending)
+        self._written += len(self._pending) // ACTION_DTYPE.itemsize
+        self._pending.clear()
+
+    def close(self):
+        """写出剩余动作、对局索引与文件尾"""
+        if self._file.closed:
+            return
+        if self._game is not None:
+            # 未结束的对局: 丢弃其动作(只可能在未写出的缓冲中)
+            del self._pending[(self._start - self._written) * ACTION_DTYPE.itemsize:]
+            self._game = None
+        self._flush()
+        index_offset = self._file.tell()
+        self._file.write(self._index)
+        self._file.write(_FOOTER.pack(index_offset, self.games, MAGIC))
+        self._file.close()
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class RecordReader:
+    """以mmap读取牌谱
+
+    games与actions均为映射在文件上的numpy结构化数组, 不复制数据;
+    关闭前须释放从中取出的数组视图。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Not a game record file: {path}")
+        size = len(self._mmap)
+        if size < _HEADER.size + _FOOTER.size:
+            self.close()
+            raise ValueError(f"Not a game record file: {path}")
+        magic, version, _ = _HEADER.unpack_from(self._mmap, 0)
+        index_offset, n_games, tail = _FOOTER.unpack_from(self._mmap, size - _FOOTER.size)
+        if magic != MAGIC or tail != MAGIC:
+            self.close()
+            raise ValueError(f"Not a game record file: {path}")
+        if version != VERSION:
+            self.close()
+            raise ValueError(f"Unsupported record version: {version}")
+        n_actions = (index_offset - _HEADER.size) // ACTION_DTYPE.itemsize
+        self.actions = np.frombuffer(self._mmap, ACTION_DTYPE, count=n_actions,
+                                     offset=_HEADER.size)
+        self.games = np.frombuffer(self._mmap, GAME_DTYPE, count=n_games, offset=index_offset)
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def game_actions(self, game: int) -> np.ndarray:
+        """第game局的全部动作(视图)"""
+        entry = self.games[game]
+        start = int(entry['start'])
+        return self.actions[start:start + int(entry['count'])]
+
+    def __iter__(self) -> Iterator[Tuple[np.void, np.ndarray]]:
+        """依次给出每局的索引记录与动作视图"""
+        for game in range(len(self.games)):
+            yield self.games[game], self.game_actions(game)
+
+    def close(self):
+        self.actions = self.games = None
+        if getattr(self, '_mmap', None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 仍有外部视图引用映射, 留待其释放后由垃圾回收关闭
+                pass
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> 'RecordReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
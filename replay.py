@@ -0,0 +1,299 @@
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES
+from .records import RecordReader, ACTIONS, NO_TILE, NUM_SEATS, HAND_SIZE
+from .core import ChaoshanMJPlugin, GameContext
+
+# 牌谱回放分析
+#
+# replay_game按牌谱逐条还原四家手牌与各家视角的GameContext, 生成ReplayEvent;
+# 分析阶段(AnalysisStage)逐事件累计统计量, 只保存计数而不保存对局,
+# 因此内存占用与牌谱规模无关。ReplayPipeline把对局按区间分块交给工作进程,
+# 每个进程自行以mmap打开牌谱, 返回各阶段的累计结果后在主进程按分块顺序合并。
+
+STAGES = ('early', 'middle', 'late')
+WALL_SIZE = 136 - NUM_SEATS * HAND_SIZE
+
+class ReplayEvent(NamedTuple):
+    """回放中的一个动作"""
+    seat: int
+    action: str
+    tiles: Tuple[Tile, ...]
+    hand: Hand            # 该座位动作前的暗手, 回放过程中会被原地修改
+    stage: str            # 该座位视角的GameContext.game_stage(动作前)
+    turn: int             # 此前的出牌数
+    wall: int             # 剩余牌墙张数
+
+def replay_game(game: np.void, actions: np.ndarray) -> Iterator[ReplayEvent]:
+    """逐条回放一局, game与actions来自RecordReader"""
+    hands = [Hand(ALL_TILES[i] for i in row if i != NO_TILE) for row in game['hands'].tolist()]
+    contexts = [GameContext() for _ in range(NUM_SEATS)]
+    turn = 0
+    wall = WALL_SIZE
+    last_discard: Optional[Tile] = None
+    for seat, code, cells in zip(actions['seat'].tolist(), actions['action'].tolist(),
+                                 actions['tiles'].tolist()):
+        action = ACTIONS[code]
+        tiles = tuple(ALL_TILES[i] for i in cells if i != NO_TILE)
+        hand = hands[seat]
+        yield ReplayEvent(seat, action, tiles, hand, contexts[seat].game_stage, turn, wall)
+
+        if action == 'draw':
+            hand.add(tiles[0])
+            wall -= 1
+        elif action == 'discard':
+            hand.remove(tiles[0])
+            last_discard = tiles[0]
+            turn += 1
+        elif action == 'ron':
+            hand.add(tiles[0])
+        elif action == 'bugang':
+            # 加杠只从暗手中拿出第四张
+            hand.remove(tiles[0])
+        elif action != 'tsumo':
+            claimed = last_discard if action in ('chi', 'peng', 'minggang') else None
+            for tile in tiles:
+                if tile is claimed:
+                    # 鸣的是上一张打出的牌, 不在暗手中
+                    claimed = None
+                    continue
+                hand.remove(tile)
+        if action in ('discard', 'chi', 'peng', 'minggang', 'angang', 'bugang'):
+            # 与ChaoshanMJPlugin.handle_opponent_action相同, 只统计他家的动作
+            for other in range(NUM_SEATS):
+                if other != seat:
+                    contexts[other].update_opponent_action(action, list(tiles))
+
+class AnalysisStage(ABC):
+    """分析阶段接口
+
+    对每局依次调用start_game、observe(每个事件)、end_game; close在结果跨进程
+    传回前调用, 用于释放不可pickle的资源; merge合并另一个分块的同类阶段。
+    """
+    name = "stage"
+
+    def start_game(self, game: np.void):
+        pass
+
+    @abstractmethod
+    def observe(self, event: ReplayEvent):
+        pass
+
+    def end_game(self, game: np.void):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def merge(self, other: 'AnalysisStage'):
+        pass
+
+    @abstractmethod
+    def result(self) -> Any:
+        pass
+
+def _rates(hits: Counter, totals: Counter) -> Dict[str, float]:
+    rates = {stage: hits[stage] / totals[stage] for stage in STAGES if totals[stage]}
+    total = sum(totals.values())
+    rates['all'] = sum(hits.values()) / total if total else 0.0
+    return rates
+
+class DiscardAgreement(AnalysisStage):
+    """牌谱中的出牌与当前intelligent_discard建议一致的比例, 按阶段统计
+
+    每个座位使用一个插件, 按PluginPolicy的方式观察动作, 出牌时比较
+    suggest_discard的建议后记录实际打出的牌; 自己鸣牌前先以decide_claim评估,
+    使鸣牌后的建议与自对弈时相同。
+    """
+    name = "discard_agreement"
+
+    def __init__(self, plugin_factory: Optional[Callable[[], ChaoshanMJPlugin]] = None,
+                 seats: Sequence[int] = tuple(range(NUM_SEATS)), seed: int = 0):
+        self.plugin_factory = plugin_factory
+        self.seats = tuple(seats)
+        self.seed = seed
+        self.agree: Counter = Counter()
+        self.total: Counter = Counter()
+        self._plugins: Optional[Dict[int, ChaoshanMJPlugin]] = None
+        self._last_discard: Optional[Tile] = None
+
+    def _create(self, seat: int) -> ChaoshanMJPlugin:
+        if self.plugin_factory is not None:
+            return self.plugin_factory()
+        return ChaoshanMJPlugin(headless=True, rng=random.Random(self.seed + seat))
+
+    def start_game(self, game: np.void):
+        if self._plugins is None:
+            self._plugins = {seat: self._create(seat) for seat in self.seats}
+        for plugin in self._plugins.values():
+            plugin.new_game()
+        self._last_discard = None
+
+    def observe(self, event: ReplayEvent):
+        if event.action in ('draw', 'tsumo', 'ron'):
+            return
+        for seat, plugin in self._plugins.items():
+            if seat != event.seat:
+                plugin.handle_opponent_action(event.action, list(event.tiles),
+                                              (event.seat - seat) % NUM_SEATS)
+            elif event.action == 'discard':
+                actual = event.tiles[0]
+                self.total[event.stage] += 1
+                self.agree[event.stage] += plugin.suggest_discard(event.hand) is actual
+                plugin.record_own_discard(actual)
+            else:
+                if event.action in ('chi', 'peng', 'minggang') and self._last_discard is not None:
+                    plugin.decide_claim(event.hand, self._last_discard, [event.action])
+                plugin.record_meld(event.action, list(event.tiles))
+        if event.action == 'discard':
+            self._last_discard = event.tiles[0]
+
+    def close(self):
+        self._plugins = None
+
+    def merge(self, other: 'DiscardAgreement'):
+        self.agree += other.agree
+        self.total += other.total
+
+    def result(self) -> Dict[str, float]:
+        return _rates(self.agree, self.total)
+
+class DealInRate(AnalysisStage):
+    """每次出牌被荣和的比例, 按出牌者所处阶段统计"""
+    name = "deal_in_rate"
+
+    def __init__(self):
+        self.deal_ins: Counter = Counter()
+        self.discards: Counter = Counter()
+        self._last_stage: Optional[str] = None
+
+    def observe(self, event: ReplayEvent):
+        if event.action == 'discard':
+            self.discards[event.stage] += 1
+            self._last_stage = event.stage
+        elif event.action == 'ron' and self._last_stage is not None:
+            self.deal_ins[self._last_stage] += 1
+
+    def end_game(self, game: np.void):
+        self._last_stage = None
+
+    def merge(self, other: 'DealInRate'):
+        self.deal_ins += other.deal_ins
+        self.discards += other.discards
+
+    def result(self) -> Dict[str, float]:
+        return _rates(self.deal_ins, self.discards)
+
+class ScoreDistribution(AnalysisStage):
+    """各座位终局得失分的分布, 按该座位终局时所处阶段统计"""
+    name = "score_distribution"
+
+    def __init__(self):
+        self.counts: Dict[str, Counter] = {stage: Counter() for stage in STAGES}
+        self._stages = [STAGES[0]] * NUM_SEATS
+
+    def start_game(self, game: np.void):
+        self._stages = [STAGES[0]] * NUM_SEATS
+
+    def observe(self, event: ReplayEvent):
+        self._stages[event.seat] = event.stage
+
+    def end_game(self, game: np.void):
+        for stage, score in zip(self._stages, game['scores'].tolist()):
+            self.counts[stage][score] += 1
+
+    def merge(self, other: 'ScoreDistribution'):
+        for stage in STAGES:
+            self.counts[stage] += other.counts[stage]
+
+    def result(self) -> Dict[str, Dict[int, int]]:
+        return {stage: dict(sorted(counter.items())) for stage, counter in self.counts.items()}
+
+def analyze_range(path: str, stage_factories: Sequence[Callable[[], AnalysisStage]],
+                  start: int, stop: int) -> Tuple[List[AnalysisStage], int]:
+    """在当前进程内分析第start至stop-1局, 返回各阶段及局数"""
+    stages = [factory() for factory in stage_factories]
+    with RecordReader(path) as reader:
+        stop = min(stop, len(reader))
+        for index in range(start, stop):
+            game = reader.games[index]
+            for stage in stages:
+                stage.start_game(game)
+            for event in replay_game(game, reader.game_actions(index)):
+                for stage in stages:
+                    stage.observe(event)
+            for stage in stages:
+                stage.end_game(game)
+    for stage in stages:
+        stage.close()
+    return stages, max(stop - start, 0)
+
+def _analyze_range_args(args) -> Tuple[List[AnalysisStage], int]:
+    return analyze_range(*args)
+
+class ReplayReport(NamedTuple):
+    """回放分析结果"""
+    games: int
+    results: Dict[str, Any]     # 阶段名 -> result()
+    elapsed: float
+
+class ReplayPipeline:
+    """分块并行的牌谱分析
+
+    stage_factories须为可被pickle的可调用对象(如阶段类本身或functools.partial);
+    同时在途的分块数不超过workers的两倍, 主进程只保存各阶段的累计结果。
+    """
+    def __init__(self, path: str, stage_factories: Sequence[Callable[[], AnalysisStage]],
+                 workers: int = 1, chunk_size: int = 256):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        self.path = path
+        self.stage_factories = list(stage_factories)
+        self.workers = workers
+        self.chunk_size = chunk_size
+
+    def _chunks(self, start: int, stop: int) -> Iterator[tuple]:
+        for first in range(start, stop, self.chunk_size):
+            yield (self.path, self.stage_factories, first, min(first + self.chunk_size, stop))
+
+    def _results(self, start: int, stop: int) -> Iterator[Tuple[List[AnalysisStage], int]]:
+        if self.workers <= 1:
+            for chunk in self._chunks(start, stop):
+                yield _analyze_range_args(chunk)
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            for chunk in self._chunks(start, stop):
+                pending.append(executor.submit(_analyze_range_args, chunk))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def run(self, start: int = 0, stop: Optional[int] = None) -> ReplayReport:
+        """分析第start至stop-1局(缺省至最后一局)"""
+        with RecordReader(self.path) as reader:
+            total = len(reader)
+        stop = total if stop is None else min(stop, total)
+        begin = time.perf_counter()
+        merged: Optional[List[AnalysisStage]] = None
+        games = 0
+        for stages, count in self._results(start, stop):
+            games += count
+            if merged is None:
+                merged = stages
+            else:
+                for mine, theirs in zip(merged, stages):
+                    mine.merge(theirs)
+        if merged is None:
+            merged = [factory() for factory in self.stage_factories]
+        results = {stage.name: stage.result() for stage in merged}
+        return ReplayReport(games, results, time.perf_counter() - begin)
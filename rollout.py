@@ -0,0 +1,217 @@
+import math
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES, NUM_TILE_KINDS, tile_counts
+from .shanten import _rank_discards, group_keys, infer_exposed_melds
+from .agari import is_winning_data
+
+# 蒙特卡洛推演出牌评估
+#
+# 对每个候选打法, 按已见牌信息随机补全三家手牌与牌墙, 四家均以向听数贪心策略
+# 摸打至和牌或流局, 以自己的得失作为该次推演的收益。候选打法按逐轮减半
+# (successive halving)分配推演次数: 每轮各候选推演相同次数, 保留平均收益较高的
+# 一半, 下一轮次数加倍, 直至只剩一个候选或用尽时间/次数预算。
+
+class RolloutState(NamedTuple):
+    """推演的起始局面(可被pickle, 用于进程池)"""
+    counts: Tuple[int, ...]           # 自己的暗手计数(含将打出的牌)
+    pool: Tuple[int, ...]             # 自己看不到的全部牌(三家暗手与牌墙)的牌索引
+    wall_size: int
+    exposed_melds: int
+    opponent_sizes: Tuple[int, int, int]
+
+def greedy_discard(counts: List[int], exposed_melds: int, rng: random.Random) -> int:
+    """打出使向听数最小的牌, 同向听时随机选择, 返回牌索引"""
+    ranked = _rank_discards(counts, group_keys(counts), exposed_melds)
+    best = min(ranked.values())
+    choices = [tile.index for tile, shanten in ranked.items() if shanten == best]
+    return choices[0] if len(choices) == 1 else rng.choice(choices)
+
+def simulate(state: RolloutState, discard: int, rng: random.Random) -> float:
+    """打出discard后推演一局, 返回自己的收益
+
+    自己和牌: 荣和+1, 自摸+3; 点炮-1; 他家自摸-1; 他家之间荣和或流局为0。
+    """
+    pool = list(state.pool)
+    rng.shuffle(pool)
+    hands = [list(state.counts)]
+    exposed = [state.exposed_melds]
+    position = 0
+    for size in state.opponent_sizes:
+        counts = [0] * NUM_TILE_KINDS
+        for index in pool[position:position + size]:
+            counts[index] += 1
+        position += size
+        hands.append(counts)
+        exposed.append(infer_exposed_melds(size + 1))
+    wall = pool[position:position + state.wall_size]
+
+    hands[0][discard] -= 1
+    seat, tile = 0, discard
+    while True:
+        # 荣和按出牌者下家顺序判断
+        for offset in (1, 2, 3):
+            other = (seat + offset) % 4
+            hand = hands[other]
+            if hand[tile] < 4:
+                hand[tile] += 1
+                won = is_winning_data(bytes(hand), exposed[other])
+                hand[tile] -= 1
+                if won:
+                    if other == 0:
+                        return 1.0
+                    return -1.0 if seat == 0 else 0.0
+        if not wall:
+            return 0.0
+        seat = (seat + 1) % 4
+        hand = hands[seat]
+        hand[wall.pop()] += 1
+        if is_winning_data(bytes(hand), exposed[seat]):
+            return 3.0 if seat == 0 else -1.0
+        tile = greedy_discard(hand, exposed[seat], rng)
+        hand[tile] -= 1
+
+def run_rollouts(state: RolloutState, discard: int, seed: int, n: int) -> Tuple[float, int]:
+    """以给定种子推演n次, 返回收益之和与次数"""
+    rng = random.Random(seed)
+    return sum(simulate(state, discard, rng) for _ in range(n)), n
+
+def _run_rollouts_args(args) -> Tuple[float, int]:
+    return run_rollouts(*args)
+
+class RolloutResult(NamedTuple):
+    """推演结果"""
+    values: Dict[Tile, float]    # 各候选的平均收益
+    visits: Dict[Tile, int]      # 各候选的推演次数
+    best: Tile                   # 最后一轮保留下来的候选中平均收益最高者
+    rollouts: int
+    elapsed: float
+
+class RolloutEvaluator:
+    """基于推演的出牌评估器
+
+    time_budget为每次评估的时间预算(秒), max_rollouts为推演总次数上限,
+    min_rollouts为第一轮每个候选的推演次数。workers大于1时用进程池并行推演。
+    clock需提供time(), 缺省使用time.perf_counter。
+    """
+    def __init__(self, time_budget: float = 0.5, max_rollouts: int = 2000,
+                 min_rollouts: int = 4, workers: int = 1, seed: Optional[int] = None,
+                 clock=None):
+        if min_rollouts <= 0:
+            raise ValueError("min_rollouts must be positive")
+        self.time_budget = time_budget
+        self.max_rollouts = max_rollouts
+        self.min_rollouts = min_rollouts
+        self.workers = workers
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self._executor = None
+
+    def _now(self) -> float:
+        return self.clock.time() if self.clock is not None else time.perf_counter()
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def evaluate(self, tiles: Union[List[Tile], Hand, np.ndarray],
+                 remaining: Union[Sequence[int], np.ndarray],
+                 candidates: Optional[Sequence[Tile]] = None,
+                 wall_size: Optional[int] = None,
+                 exposed_melds: Optional[int] = None,
+                 opponent_sizes: Tuple[int, int, int] = (13, 13, 13)) -> RolloutResult:
+        """评估候选打法
+
+        remaining为不含自己手牌的34格剩余张数, candidates缺省为手牌中的全部牌种;
+        wall_size缺省为剩余张数减去三家暗手张数。
+        """
+        start = self._now()
+        counts = tile_counts(tiles).tolist()
+        remaining = np.asarray(remaining, dtype=np.int64)
+        pool = tuple(np.repeat(np.arange(NUM_TILE_KINDS), remaining).tolist())
+        if wall_size is None:
+            if len(pool) < sum(opponent_sizes):
+                # 终局时未见牌不足, 视为他家已有副露, 暗手相应减少
+                size = len(pool) // 3
+                opponent_sizes = (max(size - (size - 1) % 3, 1),) * 3
+            wall_size = len(pool) - sum(opponent_sizes)
+        if wall_size < 0 or wall_size + sum(opponent_sizes) > len(pool):
+            raise ValueError(f"Wall of {wall_size} tiles does not fit {len(pool)} unseen tiles")
+        if exposed_melds is None:
+            exposed_melds = infer_exposed_melds(sum(counts) - 1)
+        state = RolloutState(tuple(counts), pool, wall_size, exposed_melds, tuple(opponent_sizes))
+
+        if candidates is None:
+            candidates = [ALL_TILES[i] for i, count in enumerate(counts) if count]
+        for tile in candidates:
+            if not counts[tile.index]:
+                raise ValueError(f"{tile} not in hand")
+        alive = list(candidates)
+        totals = {tile: 0.0 for tile in alive}
+        visits = {tile: 0 for tile in alive}
+        budget = self.max_rollouts
+        per_candidate = self.min_rollouts
+
+        while alive and budget > 0:
+            jobs = []
+            for tile in alive:
+                n = min(per_candidate, budget)
+                if n <= 0:
+                    break
+                budget -= n
+                jobs.append((tile, (state, tile.index, self.rng.getrandbits(64), n)))
+            if not self._run_round(jobs, totals, visits, start):
+                break
+            if len(alive) == 1:
+                break
+            alive.sort(key=lambda t: totals[t] / max(visits[t], 1), reverse=True)
+            alive = alive[:math.ceil(len(alive) / 2)]
+            per_candidate *= 2
+
+        values = {tile: totals[tile] / visits[tile] if visits[tile] else 0.0 for tile in totals}
+        survivors = alive or list(candidates)
+        best = max(survivors, key=lambda t: (visits[t], values[t]))
+        return RolloutResult(values, visits, best, sum(visits.values()), self._now() - start)
+
+    def _run_round(self, jobs, totals, visits, start: float) -> bool:
+        """运行一轮推演, 超出时间预算时返回False"""
+        deadline = start + self.time_budget
+        if self.workers <= 1:
+            for tile, args in jobs:
+                # 分批运行以便及时检查时间预算
+                state, discard, seed, n = args
+                rng = random.Random(seed)
+                for _ in range(n):
+                    if self._now() >= deadline:
+                        return False
+                    totals[tile] += simulate(state, discard, rng)
+                    visits[tile] += 1
+            return True
+
+        executor = self._pool()
+        futures = {executor.submit(_run_rollouts_args, args): tile for tile, args in jobs}
+        pending = set(futures)
+        while pending:
+            timeout = deadline - self._now()
+            if timeout <= 0:
+                break
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                total, n = future.result()
+                totals[futures[future]] += total
+                visits[futures[future]] += n
+        for future in pending:
+            future.cancel()
+        return not pending
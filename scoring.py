@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES
+from .agari import HandPattern, wait_patterns, win_patterns
+
+# 潮汕麻将计分
+#
+# 规则(各牌型番数、附加倍数、封顶、马牌)在构造时编译为查找表:
+# 以HandPattern位掩码为下标的番数表、以附加条件位掩码为下标的倍数表,
+# 以及34格的马牌座位表。计分时只做查表与乘法。
+
+DEFAULT_FAN = {
+    'chicken': 1,            # 鸡胡
+    'all_triplets': 2,       # 碰碰胡
+    'half_flush': 2,         # 混一色
+    'full_flush': 4,         # 清一色
+    'seven_pairs': 4,        # 七对
+    'thirteen_orphans': 13,  # 十三幺
+}
+
+DEFAULT_MULTIPLIERS = {
+    'tsumo': 2,              # 自摸
+    'kong_draw': 2,          # 杠上开花
+    'last_tile': 2,          # 海底捞月
+}
+
+_PATTERN_NAMES = {
+    HandPattern.SEVEN_PAIRS: 'seven_pairs',
+    HandPattern.THIRTEEN_ORPHANS: 'thirteen_orphans',
+    HandPattern.ALL_TRIPLETS: 'all_triplets',
+    HandPattern.HALF_FLUSH: 'half_flush',
+    HandPattern.FULL_FLUSH: 'full_flush',
+}
+_PATTERN_MASKS = 1 << len(_PATTERN_NAMES)
+
+def _build_horse_seats() -> List[int]:
+    """马牌对应的座位(相对庄家): 数牌1/5/9为庄家, 2/6下家, 3/7对家, 4/8上家;
+    风牌东南西北依次对应, 中发白对应庄家/下家/对家"""
+    return [(tile.value - 1) % 4 for tile in ALL_TILES]
+
+HORSE_SEATS = _build_horse_seats()
+_HORSE_SEAT_ARRAY = np.array(HORSE_SEATS)
+
+class ScoringEngine:
+    """规则编译后的计分器
+
+    fan为各牌型番数, 多个牌型同时成立时番数相乘, 无任何牌型时为鸡胡;
+    multipliers为附加条件的倍数; limit为番数封顶(None为不封顶);
+    horses为和牌后翻的马牌张数, 每中一匹马得分增加一倍基础分。
+    """
+    def __init__(self, fan: Optional[Dict[str, int]] = None,
+                 multipliers: Optional[Dict[str, int]] = None,
+                 limit: Optional[int] = None, horses: int = 0):
+        self.fan = dict(DEFAULT_FAN, **(fan or {}))
+        self.multipliers = dict(DEFAULT_MULTIPLIERS, **(multipliers or {}))
+        unknown = set(self.fan) - set(DEFAULT_FAN)
+        if unknown:
+            raise ValueError(f"Unknown patterns: {', '.join(sorted(unknown))}")
+        if horses < 0:
+            raise ValueError("horses must be non-negative")
+        self.limit = limit
+        self.horses = horses
+        self._fan_table = self._compile_fan_table()
+        self._condition_bits = {name: 1 << i for i, name in enumerate(self.multipliers)}
+        self._multiplier_table = self._compile_multiplier_table()
+
+    def _compile_fan_table(self) -> List[int]:
+        table = []
+        for mask in range(_PATTERN_MASKS):
+            fan = 1
+            matched = False
+            for flag, name in _PATTERN_NAMES.items():
+                if mask & flag:
+                    fan *= self.fan[name]
+                    matched = True
+            if not matched:
+                fan = self.fan['chicken']
+            if self.limit is not None:
+                fan = min(fan, self.limit)
+            table.append(fan)
+        return table
+
+    def _compile_multiplier_table(self) -> List[int]:
+        values = list(self.multipliers.values())
+        table = []
+        for mask in range(1 << len(values)):
+            product = 1
+            for i, value in enumerate(values):
+                if mask >> i & 1:
+                    product *= value
+            table.append(product)
+        return table
+
+    def _condition_mask(self, conditions: Iterable[str]) -> int:
+        mask = 0
+        for name in conditions:
+            bit = self._condition_bits.get(name)
+            if bit is None:
+                raise ValueError(f"Unknown scoring condition: {name}")
+            mask |= bit
+        return mask
+
+    def pattern_fan(self, patterns: HandPattern) -> int:
+        """牌型标志对应的番数"""
+        return self._fan_table[patterns]
+
+    def horse_hits(self, horse_tiles: Sequence[Tile], seat: int) -> int:
+        """马牌中属于seat(相对庄家的座位)的张数"""
+        return sum(1 for tile in horse_tiles if HORSE_SEATS[tile.index] == seat)
+
+    def expected_horse_hits(self, remaining: Union[Sequence[int], np.ndarray], seat: int) -> float:
+        """按剩余牌张数估计的中马期望张数"""
+        remaining = np.asarray(remaining)
+        total = remaining.sum()
+        if not total:
+            return 0.0
+        hits = remaining[_HORSE_SEAT_ARRAY == seat].sum()
+        return self.horses * float(hits) / float(total)
+
+    def score(self, tiles: Union[Hand, np.ndarray, List[Tile]],
+              melds: Sequence[Sequence[Tile]] = (), conditions: Iterable[str] = (),
+              horse_tiles: Sequence[Tile] = (), seat: int = 0) -> Optional[int]:
+        """和牌得分: 番数 x 附加倍数 x (1 + 中马数), 不和牌时返回None
+
+        tiles为含和牌张的暗手, conditions为附加条件名(如'tsumo'),
+        seat为和牌者相对庄家的座位, 用于计算中马。
+        """
+        patterns = win_patterns(tiles, melds)
+        if patterns is None:
+            return None
+        base = self._fan_table[patterns] * self._multiplier_table[self._condition_mask(conditions)]
+        return base * (1 + self.horse_hits(horse_tiles, seat))
+
+    def score_waits(self, tiles: Union[Hand, np.ndarray, List[Tile]],
+                    melds: Sequence[Sequence[Tile]] = (), conditions: Iterable[str] = (),
+                    horse_factor: float = 1.0) -> Dict[Tile, float]:
+        """听牌手一次性计算每种和牌张的得分
+
+        horse_factor为马牌带来的倍数, 如 1 + expected_horse_hits(...)。
+        """
+        multiplier = self._multiplier_table[self._condition_mask(conditions)] * horse_factor
+        return {tile: self._fan_table[patterns] * multiplier
+                for tile, patterns in wait_patterns(tiles, melds).items()}
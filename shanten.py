@@ -0,0 +1,347 @@
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .tiles import Tile, Hand, ALL_TILES, tile_counts
+from .canonical import (canonical_group_keys, canonical_honor_key, canonical_suit_key,
+                        sort_suit_keys)
+
+# 向听数计算
+#
+# 每个花色(及字牌)按9位(字牌7位)五进制计数编码为整数键, 查表得到该组的
+# 分解结果: 由(面子数, 雀头数, 最多搭子数)三元组构成的元组。各组结果合并后按
+# 8 - 2*面子 - 搭子 - 雀头 (面子+搭子不超过4) 得到一般型向听数。
+# 分组表按需构建并缓存, 只以规范键(数牌1↔9翻转、字牌互换后最小的形式)存储,
+# 每类对称的键只计算一次。
+
+_EMPTY_ENTRY = ((0, 0, 0),)
+POW5 = tuple(5 ** i for i in range(10))
+
+_SUIT_TABLE: Dict[int, Tuple[Tuple[int, int, int], ...]] = {}
+_HONOR_TABLE: Dict[int, Tuple[Tuple[int, int, int], ...]] = {}
+
+TERMINAL_INDICES = (0, 8, 9, 17, 18, 26, 27, 28, 29, 30, 31, 32, 33)
+_TERMINAL_MASK = tuple(i in TERMINAL_INDICES for i in range(34))
+
+def suit_key(counts: Sequence[int], start: int, width: int = 9) -> int:
+    """将一组计数编码为五进制整数键"""
+    key = 0
+    for i in range(start + width - 1, start - 1, -1):
+        key = key * 5 + counts[i]
+    return key
+
+def group_keys(counts: Sequence[int]) -> Tuple[int, int, int, int]:
+    """万/筒/条/字四组的五进制键"""
+    return (suit_key(counts, 0), suit_key(counts, 9),
+            suit_key(counts, 18), suit_key(counts, 27, 7))
+
+def group_entry(key: int, honor: bool = False) -> Tuple[Tuple[int, int, int], ...]:
+    """查询(必要时构建)一组牌的分解结果"""
+    table = _HONOR_TABLE if honor else _SUIT_TABLE
+    entry = table.get(key)
+    if entry is None:
+        key = canonical_honor_key(key) if honor else canonical_suit_key(key)
+        entry = table.get(key)
+        if entry is None:
+            entry = _build_entry(key, honor)
+            table[key] = entry
+    return entry
+
+def _pack(best: Dict[Tuple[int, int], int]) -> Tuple[Tuple[int, int, int], ...]:
+    return tuple((m, p, t) for (m, p), t in sorted(best.items()))
+
+def _build_entry(key: int, honor: bool) -> Tuple[Tuple[int, int, int], ...]:
+    """从最低位非零的牌开始枚举拆法"""
+    if key == 0:
+        return _EMPTY_ENTRY
+
+    position = 0
+    rest = key
+    while rest % 5 == 0:
+        rest //= 5
+        position += 1
+    count = rest % 5
+    next1 = rest // 5 % 5
+    next2 = rest // 25 % 5
+    unit = POW5[position]
+    best = {}
+
+    def absorb(sub_key: int, melds: int, pair: int, partials: int):
+        for m, p, t in group_entry(sub_key, honor):
+            m += melds
+            p += pair
+            if m > 4 or p > 1:
+                continue
+            value = min(t + partials, 4)
+            if value > best.get((m, p), -1):
+                best[(m, p)] = value
+
+    # 孤张
+    absorb(key - unit, 0, 0, 0)
+    # 刻子
+    if count >= 3:
+        absorb(key - 3 * unit, 1, 0, 0)
+    # 对子: 作雀头或作搭子
+    if count >= 2:
+        absorb(key - 2 * unit, 0, 1, 0)
+        absorb(key - 2 * unit, 0, 0, 1)
+    if not honor:
+        # 顺子
+        if position <= 6 and next1 and next2:
+            absorb(key - unit - 5 * unit - 25 * unit, 1, 0, 0)
+        # 两面/边张搭子
+        if position <= 7 and next1:
+            absorb(key - unit - 5 * unit, 0, 0, 1)
+        # 嵌张搭子
+        if position <= 6 and next2:
+            absorb(key - unit - 25 * unit, 0, 0, 1)
+
+    return _pack(best)
+
+@lru_cache(maxsize=1 << 16)
+def merge_entries(a: Sequence[Tuple[int, int, int]],
+                  b: Sequence[Tuple[int, int, int]]) -> Tuple[Tuple[int, int, int], ...]:
+    """合并两组的分解结果"""
+    best = {}
+    for ma, pa, ta in a:
+        for mb, pb, tb in b:
+            m = ma + mb
+            p = pa + pb
+            if m > 4 or p > 1:
+                continue
+            value = min(ta + tb, 4)
+            if value > best.get((m, p), -1):
+                best[(m, p)] = value
+    return _pack(best)
+
+def entry_shanten(entry: Sequence[Tuple[int, int, int]], exposed_melds: int) -> int:
+    """由合并后的分解结果计算一般型向听数"""
+    slots = 4 - exposed_melds
+    best = 0
+    for m, p, t in entry:
+        if m > slots:
+            continue
+        value = 2 * m + p + min(t, slots - m)
+        if value > best:
+            best = value
+    return 8 - 2 * exposed_melds - best
+
+@lru_cache(maxsize=1 << 16)
+def combined_shanten(a: Sequence[Tuple[int, int, int]],
+                     b: Sequence[Tuple[int, int, int]], exposed_melds: int) -> int:
+    """不生成合并结果, 直接计算两部分组合后的一般型向听数"""
+    slots = 4 - exposed_melds
+    best = 0
+    for ma, pa, ta in a:
+        for mb, pb, tb in b:
+            m = ma + mb
+            if m > slots or pa + pb > 1:
+                continue
+            value = 2 * m + pa + pb + min(ta + tb, slots - m)
+            if value > best:
+                best = value
+    return 8 - 2 * exposed_melds - best
+
+def _standard_from_keys(wan: int, tong: int, suo: int, honor: int, exposed_melds: int) -> int:
+    """三门数牌可互换, 规范化后再查缓存"""
+    return _standard_from_canonical(*canonical_group_keys(wan, tong, suo, honor), exposed_melds)
+
+@lru_cache(maxsize=1 << 16)
+def _standard_from_canonical(wan: int, tong: int, suo: int, honor: int, exposed_melds: int) -> int:
+    entry = merge_entries(group_entry(wan), group_entry(tong))
+    entry = merge_entries(entry, group_entry(suo))
+    entry = merge_entries(entry, group_entry(honor, True))
+    return entry_shanten(entry, exposed_melds)
+
+def infer_exposed_melds(total: int) -> int:
+    """根据手牌张数推断副露面子数"""
+    return max(0, (14 - total) // 3)
+
+def _as_list(tiles) -> List[int]:
+    return tile_counts(tiles).tolist()
+
+def _seven_pairs(counts: List[int]) -> int:
+    pairs = sum(c // 2 for c in counts)
+    return 6 - min(pairs, 7)
+
+def _thirteen_orphans(counts: List[int]) -> int:
+    kinds = 0
+    has_pair = False
+    for index in TERMINAL_INDICES:
+        if counts[index]:
+            kinds += 1
+            if counts[index] >= 2:
+                has_pair = True
+    return 13 - kinds - (1 if has_pair else 0)
+
+def _shanten(counts: List[int], exposed_melds: int,
+             keys: Optional[Sequence[int]] = None) -> int:
+    """keys为预先算好的四组键, 缺省时由counts计算"""
+    if keys is None:
+        keys = group_keys(counts)
+    shanten = _standard_from_keys(*keys, exposed_melds)
+    if exposed_melds == 0:
+        shanten = min(shanten, _seven_pairs(counts), _thirteen_orphans(counts))
+    return shanten
+
+def standard_shanten(tiles: Union[Hand, np.ndarray, List[Tile]],
+                     exposed_melds: Optional[int] = None) -> int:
+    """一般型(四面子一雀头)向听数"""
+    counts = _as_list(tiles)
+    if exposed_melds is None:
+        exposed_melds = infer_exposed_melds(sum(counts))
+    return _standard_from_keys(*group_keys(counts), exposed_melds)
+
+def seven_pairs_shanten(tiles: Union[Hand, np.ndarray, List[Tile]]) -> int:
+    """七对向听数(潮汕规则下四张相同可算两对)"""
+    return _seven_pairs(_as_list(tiles))
+
+def thirteen_orphans_shanten(tiles: Union[Hand, np.ndarray, List[Tile]]) -> int:
+    """十三幺向听数"""
+    return _thirteen_orphans(_as_list(tiles))
+
+def calculate_shanten(tiles: Union[Hand, np.ndarray, List[Tile]],
+                      exposed_melds: Optional[int] = None) -> int:
+    """向听数: 一般型、七对、十三幺中的最小值, -1表示已和牌"""
+    counts = _as_list(tiles)
+    if exposed_melds is None:
+        exposed_melds = infer_exposed_melds(sum(counts))
+    return _shanten(counts, exposed_melds)
+
+def rank_discards(tiles: Union[Hand, np.ndarray, List[Tile]],
+                  exposed_melds: Optional[int] = None) -> Dict[Tile, int]:
+    """计算打出每种牌后的向听数
+
+    只调整被打出牌所在组的(规范)键, 七对与十三幺按增量计算。
+    """
+    counts = _as_list(tiles)
+    if exposed_melds is None:
+        exposed_melds = infer_exposed_melds(sum(counts) - 1)
+    return _rank_discards(counts, group_keys(counts), exposed_melds)
+
+def _rank_discards(counts: List[int], keys: Sequence[int], exposed_melds: int) -> Dict[Tile, int]:
+    canonical = [canonical_suit_key(keys[0]), canonical_suit_key(keys[1]),
+                 canonical_suit_key(keys[2]), canonical_honor_key(keys[3])]
+    closed = exposed_melds == 0
+    if closed:
+        pairs = sum(c // 2 for c in counts)
+        kinds = sum(1 for i in TERMINAL_INDICES if counts[i])
+        pair_kinds = sum(1 for i in TERMINAL_INDICES if counts[i] >= 2)
+
+    result = {}
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        group = index // 9 if index < 27 else 3
+        saved = canonical[group]
+        key = keys[group] - POW5[index - group * 9]
+        canonical[group] = canonical_honor_key(key) if group == 3 else canonical_suit_key(key)
+        a, b, c = sort_suit_keys(canonical[0], canonical[1], canonical[2])
+        shanten = _standard_from_canonical(a, b, c, canonical[3], exposed_melds)
+        canonical[group] = saved
+        if closed:
+            shanten = min(shanten, 6 - min(pairs - (count % 2 == 0), 7))
+            if _TERMINAL_MASK[index]:
+                orphans = 13 - (kinds - (count == 1)) - (pair_kinds - (count == 2) > 0)
+            else:
+                orphans = 13 - kinds - (pair_kinds > 0)
+            shanten = min(shanten, orphans)
+        result[ALL_TILES[index]] = shanten
+    return result
+
+class Ukeire(NamedTuple):
+    """打出某张牌后的进张信息"""
+    shanten: int
+    tiles: Dict[Tile, int]
+
+    @property
+    def total(self) -> int:
+        """进张总枚数"""
+        return sum(self.tiles.values())
+
+def _improving_tiles(counts: List[int], exposed_melds: int) -> Tuple[int, List[int]]:
+    """计算当前手牌的向听数及能使向听数减少的牌
+
+    只重新查询摸入牌所在的那一组, 其余三组的合并结果预先算好复用。
+    """
+    keys = group_keys(counts)
+    entries = [group_entry(keys[0]), group_entry(keys[1]),
+               group_entry(keys[2]), group_entry(keys[3], True)]
+    low = merge_entries(entries[0], entries[1])
+    high = merge_entries(entries[2], entries[3])
+    others = (merge_entries(entries[1], high), merge_entries(entries[0], high),
+              merge_entries(low, entries[3]), merge_entries(low, entries[2]))
+    shanten = entry_shanten(merge_entries(low, high), exposed_melds)
+
+    closed = exposed_melds == 0
+    if closed:
+        pairs = sum(c // 2 for c in counts)
+        kinds = 0
+        has_pair = False
+        for index in TERMINAL_INDICES:
+            if counts[index]:
+                kinds += 1
+                has_pair = has_pair or counts[index] >= 2
+        shanten = min(shanten, 6 - min(pairs, 7), 13 - kinds - has_pair)
+
+    # 一般型: 摸入的牌须与同组已有的牌相邻(字牌须已有), 否则只是孤张
+    connected = [False] * 34
+    for start in (0, 9, 18):
+        for j in range(start, start + 9):
+            if counts[j]:
+                for k in range(max(start, j - 2), min(start + 9, j + 3)):
+                    connected[k] = True
+    for j in range(27, 34):
+        connected[j] = counts[j] > 0
+
+    improving = []
+    for index in range(34):
+        count = counts[index]
+        if count >= 4:
+            continue
+        new_shanten = shanten + 1
+        if connected[index]:
+            group = index // 9 if index < 27 else 3
+            entry = group_entry(keys[group] + POW5[index - group * 9], group == 3)
+            new_shanten = combined_shanten(entry, others[group], exposed_melds)
+        if closed:
+            if count % 2 and pairs < 7 and 5 - pairs < new_shanten:
+                new_shanten = 5 - pairs
+            if _TERMINAL_MASK[index]:
+                orphans = 13 - kinds - (count == 0) - (has_pair or count >= 1)
+                if orphans < new_shanten:
+                    new_shanten = orphans
+        if new_shanten < shanten:
+            improving.append(index)
+    return shanten, improving
+
+def calculate_ukeire(tiles: Union[Hand, np.ndarray, List[Tile]],
+                     remaining: Optional[Sequence[int]] = None,
+                     exposed_melds: Optional[int] = None) -> Dict[Tile, Ukeire]:
+    """计算打出每种牌后的向听数、进张及各进张的剩余张数
+
+    remaining为34格剩余张数(不含自己手牌), 缺省时按4减去手牌张数计算。
+    """
+    counts = _as_list(tiles)
+    if exposed_melds is None:
+        exposed_melds = infer_exposed_melds(sum(counts) - 1)
+    if remaining is None:
+        remaining = [4 - c for c in counts]
+    elif isinstance(remaining, np.ndarray):
+        remaining = remaining.tolist()
+
+    result = {}
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        counts[index] -= 1
+        shanten, improving = _improving_tiles(counts, exposed_melds)
+        live = {}
+        for draw in improving:
+            copies = remaining[draw]
+            if copies > 0:
+                live[ALL_TILES[draw]] = copies
+        counts[index] += 1
+        result[ALL_TILES[index]] = Ukeire(shanten, live)
+    return result
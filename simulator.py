@@ -0,0 +1,316 @@
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from .tiles import Tile, Hand, ALL_TILES, NUM_TILE_KINDS
+from .agari import is_winning
+from .shanten import infer_exposed_melds
+from .rollout import greedy_discard
+from .claim import chi_shapes
+from .records import RecordWriter
+from .core import ChaoshanMJPlugin
+
+NUM_SEATS = 4
+HAND_SIZE = 13
+
+class Policy(ABC):
+    """座位策略接口, 子类至少需要实现discard"""
+    name = "policy"
+
+    def new_game(self, seat: int, rng: random.Random):
+        """新一局开始, rng为本局的随机数生成器"""
+        self.seat = seat
+
+    @abstractmethod
+    def discard(self, hand: Hand, game: 'SelfPlayGame') -> Tile:
+        """从14张(或副露后相应张数)手牌中选择打出的牌"""
+
+    def claim(self, hand: Hand, tile: Tile, options: List[str], game: 'SelfPlayGame') -> str:
+        """对他家打出的牌选择'pass'或options中的某个动作"""
+        return 'pass'
+
+    def chi_shape(self, hand: Hand, tile: Tile, shapes: List[Tuple[int, int]]) -> Tuple[int, int]:
+        """吃牌时从shapes中选择用于组成顺子的两张手牌"""
+        return shapes[0]
+
+    def observe(self, seat: int, action: str, tiles: List[Tile]):
+        """观察任意座位的动作(包括自己)"""
+        pass
+
+class PluginPolicy(Policy):
+    """以ChaoshanMJPlugin.intelligent_discard为出牌策略"""
+    name = "plugin"
+
+    def __init__(self, plugin: Optional[ChaoshanMJPlugin] = None):
+        self.plugin = plugin if plugin is not None else ChaoshanMJPlugin(headless=True)
+        self._decision = None
+
+    def new_game(self, seat: int, rng: random.Random):
+        super().new_game(seat, rng)
+        self.plugin.new_game()
+        self.plugin.rng.seed(rng.getrandbits(64))
+
+    def discard(self, hand: Hand, game: 'SelfPlayGame') -> Tile:
+        return self.plugin.intelligent_discard(hand)
+
+    def claim(self, hand: Hand, tile: Tile, options: List[str], game: 'SelfPlayGame') -> str:
+        self._decision = self.plugin.decide_claim(hand, tile, options)
+        return self._decision.action
+
+    def chi_shape(self, hand: Hand, tile: Tile, shapes: List[Tuple[int, int]]) -> Tuple[int, int]:
+        chosen = tuple(t.index for t in self._decision.tiles)
+        return chosen if chosen in shapes else shapes[0]
+
+    def observe(self, seat: int, action: str, tiles: List[Tile]):
+        # 自己的出牌已在intelligent_discard中记录
+        if seat != self.seat:
+            self.plugin.handle_opponent_action(action, tiles, (seat - self.seat) % NUM_SEATS)
+        elif action != 'discard':
+            self.plugin.record_meld(action, tiles)
+
+class GreedyPolicy(Policy):
+    """打出使向听数最小的牌, 同向听时随机选择; 与推演评估器的默认策略相同"""
+    name = "greedy"
+
+    def new_game(self, seat: int, rng: random.Random):
+        super().new_game(seat, rng)
+        self.rng = random.Random(rng.getrandbits(64))
+
+    def discard(self, hand: Hand, game: 'SelfPlayGame') -> Tile:
+        counts = hand.counts.tolist()
+        return ALL_TILES[greedy_discard(counts, infer_exposed_melds(len(hand) - 1), self.rng)]
+
+class GameResult(NamedTuple):
+    """一局的结果"""
+    winner: Optional[int]
+    loser: Optional[int]      # 点炮者, 自摸或流局时为None
+    win_type: str             # 'tsumo' / 'ron' / 'draw'
+    turns: int
+    scores: Tuple[int, ...]   # 各座位得失分
+
+class SelfPlayGame:
+    """单局自对弈: 发牌、摸打、鸣牌直至和牌或流局
+
+    指定writer时将起手牌、全部动作与结果写入牌谱。
+    """
+    def __init__(self, policies: Sequence[Policy], rng: random.Random,
+                 dealer: int = 0, allow_ron: bool = True, allow_chi: bool = False,
+                 writer: Optional[RecordWriter] = None):
+        if len(policies) != NUM_SEATS:
+            raise ValueError(f"Expected {NUM_SEATS} policies, got {len(policies)}")
+        self.policies = policies
+        self.rng = rng
+        self.dealer = dealer
+        self.allow_ron = allow_ron
+        self.allow_chi = allow_chi
+        self.writer = writer
+
+        self.wall = [index for index in range(NUM_TILE_KINDS) for _ in range(4)]
+        rng.shuffle(self.wall)
+        self.hands = [Hand() for _ in range(NUM_SEATS)]
+        self.melds: List[List[Tuple[str, List[Tile]]]] = [[] for _ in range(NUM_SEATS)]
+        self.discards: List[List[Tile]] = [[] for _ in range(NUM_SEATS)]
+        self.turns = 0
+
+    @property
+    def wall_remaining(self) -> int:
+        return len(self.wall)
+
+    def _draw(self, seat: int, record: bool = True) -> Optional[Tile]:
+        if not self.wall:
+            return None
+        tile = ALL_TILES[self.wall.pop()]
+        self.hands[seat].add(tile)
+        if record:
+            self._record(seat, 'draw', [tile])
+        return tile
+
+    def _record(self, seat: int, action: str, tiles: List[Tile]):
+        if self.writer is not None:
+            self.writer.action(seat, action, tiles)
+
+    def _notify(self, seat: int, action: str, tiles: List[Tile]):
+        self._record(seat, action, tiles)
+        for policy in self.policies:
+            policy.observe(seat, action, tiles)
+
+    def is_winning(self, seat: int, extra: Optional[Tile] = None) -> bool:
+        """判断座位手牌(可附加一张他家打出的牌)是否和牌"""
+        counts = self.hands[seat].counts
+        if extra is not None:
+            if counts[extra.index] >= 4:
+                return False
+            counts = counts.copy()
+            counts[extra.index] += 1
+        return is_winning(counts, [tiles for _, tiles in self.melds[seat]])
+
+    def _settle(self, winner: Optional[int], loser: Optional[int], win_type: str) -> GameResult:
+        scores = [0] * NUM_SEATS
+        if win_type == 'tsumo':
+            for seat in range(NUM_SEATS):
+                if seat != winner:
+                    scores[seat] -= 1
+                    scores[winner] += 1
+        elif win_type == 'ron':
+            scores[loser] -= 1
+            scores[winner] += 1
+        if self.writer is not None:
+            self.writer.end_game(winner, loser, win_type, scores)
+        return GameResult(winner, loser, win_type, self.turns, tuple(scores))
+
+    def play(self) -> GameResult:
+        """进行一局直至结束"""
+        for seat, policy in enumerate(self.policies):
+            policy.new_game(seat, self.rng)
+        for _ in range(HAND_SIZE):
+            for seat in range(NUM_SEATS):
+                self._draw(seat, record=False)
+        if self.writer is not None:
+            self.writer.begin_game([list(hand) for hand in self.hands], self.dealer)
+
+        seat = self.dealer
+        need_draw = True
+        while True:
+            if need_draw:
+                if self._draw(seat) is None:
+                    return self._settle(None, None, 'draw')
+                if self.is_winning(seat):
+                    self._record(seat, 'tsumo', [])
+                    return self._settle(seat, None, 'tsumo')
+
+            hand = self.hands[seat]
+            tile = self.policies[seat].discard(hand, self)
+            hand.remove(tile)
+            self.discards[seat].append(tile)
+            self.turns += 1
+            self._notify(seat, 'discard', [tile])
+
+            # 荣和优先, 按出牌者下家顺序判断
+            if self.allow_ron:
+                for offset in range(1, NUM_SEATS):
+                    other = (seat + offset) % NUM_SEATS
+                    if self.is_winning(other, tile):
+                        self.hands[other].add(tile)
+                        self._record(other, 'ron', [tile])
+                        return self._settle(other, seat, 'ron')
+
+            claimer, action = self._resolve_claims(seat, tile)
+            if claimer is None:
+                seat = (seat + 1) % NUM_SEATS
+                need_draw = True
+                continue
+
+            self._apply_claim(claimer, action, tile, seat)
+            seat = claimer
+            if action == 'minggang':
+                # 杠后补牌
+                if self._draw(seat) is None:
+                    return self._settle(None, None, 'draw')
+                if self.is_winning(seat):
+                    self._record(seat, 'tsumo', [])
+                    return self._settle(seat, None, 'tsumo')
+            need_draw = False
+
+    def _claim_options(self, seat: int, discarder: int, tile: Tile) -> List[str]:
+        counts = self.hands[seat].counts
+        options = []
+        if counts[tile.index] >= 2:
+            options.append('peng')
+        if counts[tile.index] >= 3:
+            options.append('minggang')
+        if (self.allow_chi and not tile.is_honor
+                and seat == (discarder + 1) % NUM_SEATS and self._chi_shapes(seat, tile)):
+            options.append('chi')
+        return options
+
+    def _chi_shapes(self, seat: int, tile: Tile) -> List[Tuple[int, int]]:
+        """可用于吃牌的两张手牌索引组合"""
+        return chi_shapes(self.hands[seat].counts, tile)
+
+    def _resolve_claims(self, discarder: int, tile: Tile) -> Tuple[Optional[int], Optional[str]]:
+        """按碰/杠优先于吃的顺序询问其他座位"""
+        requests = []
+        for offset in range(1, NUM_SEATS):
+            seat = (discarder + offset) % NUM_SEATS
+            options = self._claim_options(seat, discarder, tile)
+            if not options:
+                continue
+            action = self.policies[seat].claim(self.hands[seat], tile, options, self)
+            if action in options:
+                requests.append((seat, action))
+        for seat, action in requests:
+            if action != 'chi':
+                return seat, action
+        if requests:
+            return requests[0]
+        return None, None
+
+    def _apply_claim(self, seat: int, action: str, tile: Tile, discarder: int):
+        hand = self.hands[seat]
+        self.discards[discarder].pop()
+        if action == 'chi':
+            shape = self.policies[seat].chi_shape(hand, tile, self._chi_shapes(seat, tile))
+            used = [ALL_TILES[i] for i in shape]
+            meld_tiles = sorted(used + [tile], key=lambda t: t.index)
+        else:
+            used = [tile] * (3 if action == 'minggang' else 2)
+            meld_tiles = used + [tile]
+        for t in used:
+            hand.remove(t)
+        self.melds[seat].append((action, meld_tiles))
+        self._notify(seat, action, meld_tiles)
+
+class SimulationReport(NamedTuple):
+    """多局自对弈统计"""
+    games: int
+    wins: Tuple[int, ...]
+    deal_ins: Tuple[int, ...]
+    draws: int
+    scores: Tuple[int, ...]
+    elapsed: float
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.elapsed if self.elapsed > 0 else float('inf')
+
+class SelfPlaySimulator:
+    """四人自对弈模拟器, 指定writer时记录每局牌谱"""
+    def __init__(self, policies: Optional[Sequence[Policy]] = None,
+                 seed: Optional[int] = None, allow_ron: bool = True, allow_chi: bool = False,
+                 writer: Optional[RecordWriter] = None):
+        self.policies = list(policies) if policies is not None else \
+            [PluginPolicy() for _ in range(NUM_SEATS)]
+        self.rng = random.Random(seed)
+        self.allow_ron = allow_ron
+        self.allow_chi = allow_chi
+        self.writer = writer
+        self.games_played = 0
+
+    def play_game(self) -> GameResult:
+        """进行一局, 庄家按局数轮转"""
+        game = SelfPlayGame(self.policies, self.rng, dealer=self.games_played % NUM_SEATS,
+                            allow_ron=self.allow_ron, allow_chi=self.allow_chi, writer=self.writer)
+        self.games_played += 1
+        return game.play()
+
+    def run(self, n_games: int) -> SimulationReport:
+        """连续进行n_games局并汇总统计"""
+        wins = [0] * NUM_SEATS
+        deal_ins = [0] * NUM_SEATS
+        scores = [0] * NUM_SEATS
+        draws = 0
+        start = time.perf_counter()
+        for _ in range(n_games):
+            result = self.play_game()
+            if result.winner is None:
+                draws += 1
+            else:
+                wins[result.winner] += 1
+            if result.loser is not None:
+                deal_ins[result.loser] += 1
+            for seat, score in enumerate(result.scores):
+                scores[seat] += score
+        elapsed = time.perf_counter() - start
+        return SimulationReport(n_games, tuple(wins), tuple(deal_ins), draws,
+                                tuple(scores), elapsed)
@@ -1,9 +1,37 @@
+import random
+
+import numpy as np
 import pytest
 from chaoshan_mahjong_ai import ChaoshanMJPlugin
-from chaoshan_mahjong_ai.tiles import Tile, TileType, TileSet
+from chaoshan_mahjong_ai.tiles import Tile, TileType, TileSet, Hand, ALL_TILES
+from chaoshan_mahjong_ai.utils import ProbabilityEngine, VirtualClock
+from chaoshan_mahjong_ai.shanten import (calculate_shanten, seven_pairs_shanten,
+                                         thirteen_orphans_shanten, rank_discards,
+                                         group_keys, group_entry, TERMINAL_INDICES)
+from chaoshan_mahjong_ai.simulator import SelfPlaySimulator, Policy, PluginPolicy, GreedyPolicy
+from chaoshan_mahjong_ai.tournament import TournamentRunner
+from chaoshan_mahjong_ai.benchmarks import run_benchmarks, compare, measure_import, BENCHMARKS
+from chaoshan_mahjong_ai.agari import HandPattern, is_winning, wait_patterns, win_patterns
+from chaoshan_mahjong_ai.scoring import ScoringEngine
+from chaoshan_mahjong_ai.probability import at_least_probability, hit_probability, wait_probability
+from chaoshan_mahjong_ai.evaluator import IncrementalEvaluator
+from chaoshan_mahjong_ai.cache import LRUCache, pack_counts
+from chaoshan_mahjong_ai.canonical import canonical_group_keys, canonical_order, mirror_suit_key
+from chaoshan_mahjong_ai.rollout import RolloutEvaluator
+from chaoshan_mahjong_ai.expectimax import ExpectimaxSolver, estimate_draws
+from chaoshan_mahjong_ai.inference import OpponentInference
+from chaoshan_mahjong_ai.danger import DangerTable, PAIR_WEIGHT, PARTIAL_WEIGHT, RYANMEN_WEIGHT
+from chaoshan_mahjong_ai.claim import ClaimEvaluator
+from chaoshan_mahjong_ai.shanten import calculate_ukeire
+from chaoshan_mahjong_ai.features import (FeatureEncoder, ShardExporter, encode_batch, NUM_PLANES,
+                                          DISCARD_PLANES, MELD_PLANES, UNSEEN_PLANE, STAGE_PLANES)
+from chaoshan_mahjong_ai.replay import (ReplayPipeline, AnalysisStage, DiscardAgreement, DealInRate,
+                                        ScoreDistribution, replay_game)
+from chaoshan_mahjong_ai.records import (RecordWriter, RecordReader, ACTION_CODES, RESULT_CODES,
+                                         NO_TILE, decode_tiles)
 
 def test_tile_selection():
-    plugin = ChaoshanMJPlugin()
+    plugin = ChaoshanMJPlugin(headless=True)
     available_tiles = TileSet.create_full_set()
     selected = plugin.tile_selection(available_tiles)
     
@@ -11,7 +39,7 @@ def test_tile_selection():
     assert all(isinstance(tile, Tile) for tile in selected)
 
 def test_intelligent_discard():
-    plugin = ChaoshanMJPlugin()
+    plugin = ChaoshanMJPlugin(headless=True)
     hand_tiles = [
         Tile(TileType.WAN, 1),
         Tile(TileType.WAN, 2),
@@ -32,7 +60,7 @@ def test_tile_validation():
         Tile(TileType.WIND, 5)  # Invalid wind value
 
 def test_probability_engine():
-    plugin = ChaoshanMJPlugin()
+    plugin = ChaoshanMJPlugin(headless=True)
     tiles = [
         Tile(TileType.WAN, 1),
         Tile(TileType.WAN, 2),
@@ -42,3 +70,917 @@ def test_probability_engine():
     scores = plugin.prob_engine.calculate_tile_scores(tiles)
     assert len(scores) == len(tiles)
     assert all(isinstance(score, float) for score in scores.values())
+
+def test_tile_flyweight():
+    tile = Tile.of(TileType.TONG, 5)
+    assert tile is Tile(TileType.TONG, 5)
+    assert tile.index == 13
+    assert Tile.from_index(tile.index) is tile
+    assert hash(tile) == tile.index
+
+    with pytest.raises(AttributeError):
+        tile.value = 6
+
+    full_set = TileSet.create_full_set()
+    assert len(full_set) == 136
+    assert len(set(full_set)) == 34
+    assert sorted({t.index for t in full_set}) == list(range(34))
+
+def test_hand_counts():
+    hand = Hand([Tile(TileType.WAN, 1), Tile(TileType.WAN, 1), Tile(TileType.SUO, 9)])
+    assert len(hand) == 3
+    assert hand.count(Tile(TileType.WAN, 1)) == 2
+    assert hand.suit(TileType.SUO)[8] == 1
+
+    hand.add(Tile(TileType.DRAGON, 3))
+    hand.remove(Tile(TileType.WAN, 1))
+    assert len(hand) == 3
+    assert hand.tiles() == [Tile(TileType.WAN, 1), Tile(TileType.SUO, 9), Tile(TileType.DRAGON, 3)]
+
+    with pytest.raises(ValueError):
+        hand.remove(Tile(TileType.TONG, 5))
+
+def test_hand_accepted_by_engine():
+    plugin = ChaoshanMJPlugin(headless=True)
+    tiles = [Tile(TileType.WAN, v) for v in (1, 2, 3, 3)] + [Tile(TileType.WIND, 1)]
+    assert plugin.prob_engine.calculate_tile_scores(Hand(tiles)) == \
+        plugin.prob_engine.calculate_tile_scores(tiles)
+
+    discarded = plugin.intelligent_discard(Hand(tiles))
+    assert discarded in tiles
+
+def test_vectorized_scores_match_scalar():
+    engine = ProbabilityEngine()
+    full_set = TileSet.create_full_set()
+    rng = random.Random(7)
+    for _ in range(50):
+        rng.shuffle(full_set)
+        engine.update_seen_tiles(full_set[-1])
+        hand = full_set[:rng.choice([5, 13, 14])]
+        assert engine.calculate_tile_scores(hand) == \
+            engine._calculate_tile_scores_scalar(hand)
+
+def test_score_batch_matches_single_hand():
+    engine = ProbabilityEngine()
+    full_set = TileSet.create_full_set()
+    rng = random.Random(11)
+    hands, seen, expected = [], [], []
+    for _ in range(20):
+        rng.shuffle(full_set)
+        row_engine = ProbabilityEngine()
+        for tile in full_set[100:100 + rng.randint(0, 30)]:
+            row_engine.update_seen_tiles(tile)
+        hand = Hand(full_set[:14])
+        hands.append(hand.counts)
+        seen.append(row_engine.seen_counts)
+        expected.append(row_engine.calculate_tile_scores(hand))
+
+    scores = engine.score_batch(np.array(hands), np.array(seen))
+    order = engine.enhance_quality_batch(np.array(hands), np.array(seen))
+    assert scores.shape == (20, 34)
+    for row, row_scores in enumerate(expected):
+        assert {Tile.from_index(i): scores[row, i] for i in np.flatnonzero(scores[row])} == row_scores
+        best = max(row_scores.values())
+        assert scores[row, order[row, 0]] == best
+
+def test_shanten():
+    tenpai = Hand([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 5)] +
+                  [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+                  [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+                  [Tile(TileType.WIND, 1)] * 2)
+    assert calculate_shanten(tenpai) == 0
+    tenpai.add(Tile(TileType.WIND, 1))
+    assert calculate_shanten(tenpai) == -1
+
+    seven_pairs = Hand([Tile.from_index(i) for i in (0, 4, 10, 20, 27, 30) for _ in range(2)] +
+                       [Tile.from_index(33)])
+    assert seven_pairs_shanten(seven_pairs) == 0
+    orphans = Hand([Tile.from_index(i) for i in TERMINAL_INDICES])
+    assert thirteen_orphans_shanten(orphans) == 0
+    assert calculate_shanten(Hand([Tile(TileType.WAN, 1)] * 3 + [Tile(TileType.SUO, 2)] * 2)) == -1
+
+def test_discard_ranked_by_shanten():
+    plugin = ChaoshanMJPlugin(headless=True)
+    hand_tiles = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 5)] +
+                  [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+                  [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+                  [Tile(TileType.WIND, 1)] * 2 + [Tile(TileType.WIND, 4)])
+    shanten = rank_discards(hand_tiles)
+    assert shanten[Tile(TileType.WIND, 4)] == 0
+    assert min(v for t, v in shanten.items() if t != Tile(TileType.WIND, 4)) == 1
+    assert plugin.intelligent_discard(hand_tiles) is Tile(TileType.WIND, 4)
+
+def test_ukeire_counts_live_copies():
+    engine = ProbabilityEngine()
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 6)] +
+            [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+            [Tile(TileType.WIND, 1)] * 2 + [Tile(TileType.DRAGON, 1)])
+    for _ in range(3):
+        engine.update_seen_tiles(Tile(TileType.WAN, 4))
+    assert engine.remaining_tiles[Tile(TileType.WAN, 4).index] == 1
+    assert engine.seen_counts[Tile(TileType.WAN, 4).index] == 3
+
+    ukeire = engine.calculate_ukeire(hand)
+    best = ukeire[Tile(TileType.DRAGON, 1)]
+    assert best.shanten == 0
+    assert best.tiles == {Tile(TileType.WAN, 4): 1, Tile(TileType.WAN, 7): 4}
+    assert best.total == 5
+
+def test_live_copies_exclude_held_and_seen_tiles():
+    five = Tile(TileType.WAN, 5)
+    engine = ProbabilityEngine()
+    hand = [five, five, Tile(TileType.SUO, 1)]
+    engine.update_seen_tiles(five)
+    engine.update_seen_tiles(five)
+    assert engine.remaining_tiles[five.index] == 2
+    assert engine.live_copies(hand)[five.index] == 0
+    assert engine.live_copies(hand)[Tile(TileType.SUO, 1).index] == 3
+
+    # 选牌时记入已见的手牌不重复扣除, 打出后转为公开
+    plugin = ChaoshanMJPlugin(headless=True)
+    plugin._update_history(hand)
+    assert plugin.prob_engine.live_copies(hand)[five.index] == 2
+    plugin.handle_opponent_action('discard', [five], 1)
+    assert plugin.prob_engine.live_copies(hand)[five.index] == 1
+    plugin._record_discard(five)
+    assert plugin.prob_engine.live_copies([five, Tile(TileType.SUO, 1)])[five.index] == 1
+
+def test_injected_clock_does_not_sleep():
+    clock = VirtualClock()
+    plugin = ChaoshanMJPlugin(clock=clock)
+    hand_tiles = [Tile(TileType.WAN, 1), Tile(TileType.WAN, 2), Tile(TileType.SUO, 7)]
+
+    discarded = plugin.intelligent_discard(hand_tiles)
+    assert discarded in hand_tiles
+    assert 0.5 <= clock.time() <= 2.0
+
+def test_self_play_simulator():
+    report = SelfPlaySimulator(seed=3).run(5)
+    assert report.games == 5
+    assert sum(report.wins) + report.draws == 5
+    assert sum(report.scores) == 0
+    assert report.games_per_second > 0
+
+    replay = SelfPlaySimulator(seed=3).run(5)
+    assert (replay.wins, replay.deal_ins, replay.scores) == \
+        (report.wins, report.deal_ins, report.scores)
+
+    class Passive(Policy):
+        pass
+    with pytest.raises(TypeError):
+        Passive()
+
+def test_tournament_is_reproducible_across_worker_counts():
+    factories = [PluginPolicy] * 4
+    serial = TournamentRunner(factories, master_seed=9, workers=1, chunk_size=2).run(6)
+    parallel = TournamentRunner(factories, master_seed=9, workers=2, chunk_size=2).run(6)
+    assert serial.policies == parallel.policies
+    assert serial.policies['plugin'].games == 24
+    assert parallel.throughput > 0 and parallel.speedup > 0
+
+def test_benchmarks_report_regressions():
+    results = run_benchmarks(['create_full_set'], repeat=1, min_time=0.001)
+    timing = results['benchmarks']['create_full_set']
+    assert timing['best_us'] > 0
+
+    baseline = {'benchmarks': {'create_full_set': {'best_us': timing['best_us'] / 2}}}
+    assert compare(results, baseline, threshold=0.2)
+    assert not compare(results, results, threshold=0.2)
+
+def test_evaluation_cache():
+    engine = ProbabilityEngine(cache_entries=2)
+    hand = Hand([Tile(TileType.WAN, v) for v in (1, 2, 3)] + [Tile(TileType.WIND, 2)])
+    first = engine.calculate_tile_scores(hand)
+    assert engine.calculate_tile_scores(hand) == first
+    assert engine.cache.stats()['hits'] == 1
+
+    # 手牌外的牌不影响得分, 仍命中缓存
+    engine.update_seen_tiles(Tile(TileType.SUO, 9))
+    engine.calculate_tile_scores(hand)
+    assert engine.cache.hits == 2
+
+    # 手牌中的牌被看到后结果改变, 不会命中旧条目
+    engine.update_seen_tiles(Tile(TileType.WIND, 2))
+    updated = engine.calculate_tile_scores(hand)
+    assert updated[Tile(TileType.WIND, 2)] < first[Tile(TileType.WIND, 2)]
+    assert updated == engine._calculate_tile_scores_scalar(hand)
+    assert engine.cache.evictions == 0
+
+    engine.calculate_tile_scores([Tile(TileType.TONG, 5)])
+    assert engine.cache.evictions == 1 and len(engine.cache) == 2
+
+def test_lru_cache_byte_limit():
+    cache = LRUCache(max_entries=10, max_bytes=100)
+    for key in range(5):
+        cache.put(key, key, size=30)
+    assert len(cache) == 3 and cache.current_bytes == 90
+    assert 0 not in cache and 4 in cache
+    assert cache.evictions == 2
+    assert pack_counts(np.full(34, 4, dtype=np.uint8)) < 1 << 102
+
+def _transform(tiles, suits, mirror):
+    """按花色映射suits及1↔9翻转变换手牌"""
+    result = []
+    for tile in tiles:
+        if tile.is_honor:
+            result.append(tile)
+        else:
+            value = 10 - tile.value if mirror else tile.value
+            result.append(Tile(suits[tile.type], value))
+    return result
+
+def test_symmetric_hands_share_cache_entry():
+    engine = ProbabilityEngine()
+    full_set = TileSet.create_full_set()
+    rng = random.Random(23)
+    rng.shuffle(full_set)
+    for tile in full_set[20:40]:
+        engine.update_seen_tiles(tile)
+    hand = full_set[:14]
+    scores = engine.calculate_tile_scores(hand)
+
+    suits = {TileType.WAN: TileType.SUO, TileType.TONG: TileType.WAN, TileType.SUO: TileType.TONG}
+    image = {tile: _transform([tile], suits, True)[0] for tile in hand}
+    mirrored = ProbabilityEngine()
+    mirrored.cache = engine.cache
+    for tile in _transform(full_set[20:40], suits, True):
+        mirrored.update_seen_tiles(tile)
+    transformed_hand = _transform(hand, suits, True)
+    transformed = mirrored.calculate_tile_scores(transformed_hand)
+
+    assert engine.cache.hits == 1 and len(engine.cache) == 1
+    assert {image[tile]: score for tile, score in scores.items()} == transformed
+    assert transformed == mirrored._calculate_tile_scores_scalar(transformed_hand)
+
+def test_canonical_keys():
+    counts = Hand([Tile(TileType.WAN, v) for v in (1, 1, 2, 7)] + [Tile(TileType.TONG, 9)]).counts
+    key, perm, inverse = canonical_order(counts, np.zeros(34, dtype=np.uint8))
+    assert sorted(perm.tolist()) == list(range(34))
+    assert (perm[inverse] == np.arange(34)).all()
+
+    wan, tong, suo, honor = group_keys(counts.tolist())
+    assert group_entry(wan) is group_entry(mirror_suit_key(wan))
+    assert canonical_group_keys(wan, tong, suo, honor) == \
+        canonical_group_keys(suo, mirror_suit_key(wan), tong, honor)
+
+def test_incremental_evaluator_matches_full_evaluation():
+    engine = ProbabilityEngine(cache_entries=0)
+    wall = TileSet.create_full_set()
+    rng = random.Random(31)
+    rng.shuffle(wall)
+    hand = Hand(wall[:13])
+    evaluator = IncrementalEvaluator(engine, hand)
+    for tile in wall[13:60]:
+        hand.add(tile)
+        evaluator.draw(tile)
+        assert evaluator.scores() == engine.calculate_tile_scores(hand)
+        assert evaluator.rank_discards() == rank_discards(hand)
+        assert evaluator.shanten == calculate_shanten(hand)
+        discard = rng.choice(hand.tiles())
+        hand.remove(discard)
+        evaluator.discard(discard)
+        engine.update_seen_tiles(discard)
+        engine.update_seen_tiles(rng.choice(wall))
+
+    # 碰牌: 移除两张手牌, 副露面子数加一
+    pair_hand = Hand([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 5)] +
+                     [Tile(TileType.DRAGON, 1)] * 2 + [Tile(TileType.SUO, 7)])
+    evaluator.reset(pair_hand, exposed_melds=0)
+    evaluator.meld([Tile(TileType.DRAGON, 1)] * 2)
+    assert evaluator.exposed_melds == 1 and evaluator.size == 6
+    rest = Hand([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 5)] + [Tile(TileType.SUO, 7)])
+    assert evaluator.shanten == calculate_shanten(rest, 1)
+    with pytest.raises(ValueError):
+        evaluator.meld([Tile(TileType.SUO, 7)] * 2)
+    assert evaluator.size == 6
+
+def test_win_patterns():
+    wan = lambda *values: [Tile(TileType.WAN, v) for v in values]
+    east = Tile(TileType.WIND, 1)
+    red = Tile(TileType.DRAGON, 1)
+
+    plain = Hand(wan(1, 2, 3, 5, 5) + [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+                 [Tile(TileType.SUO, v) for v in (7, 8, 9)] + [east] * 3)
+    assert win_patterns(plain) == HandPattern(0)
+    plain.remove(east)
+    assert win_patterns(plain) is None and not is_winning(plain)
+
+    assert win_patterns(wan(1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 9, 9)) == \
+        HandPattern.SEVEN_PAIRS | HandPattern.FULL_FLUSH
+    assert win_patterns(wan(1, 1, 1, 1, 2, 2) + [east] * 2 + [red] * 2 + wan(7, 7, 9, 9)) == \
+        HandPattern.SEVEN_PAIRS | HandPattern.HALF_FLUSH
+    orphans = [Tile.from_index(i) for i in TERMINAL_INDICES] + [red]
+    assert win_patterns(orphans) == HandPattern.THIRTEEN_ORPHANS
+
+    # 副露的碰与暗刻组成碰碰胡; 吃牌则不是
+    concealed = wan(2, 2, 2, 8, 8) + [east] * 3 + [red] * 3
+    assert win_patterns(concealed, [wan(5, 5, 5)]) == \
+        HandPattern.ALL_TRIPLETS | HandPattern.HALF_FLUSH
+    assert win_patterns(concealed, [wan(4, 5, 6)]) == HandPattern.HALF_FLUSH
+    assert win_patterns(concealed, [[Tile(TileType.SUO, 3)] * 3]) == HandPattern.ALL_TRIPLETS
+    # 七对须门前清
+    assert not is_winning(wan(1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 9), [[east] * 3])
+    assert win_patterns(wan(1, 1, 1, 2, 2)) is None
+
+def test_is_winning_matches_shanten():
+    wall = TileSet.create_full_set()
+    rng = random.Random(41)
+    for _ in range(300):
+        rng.shuffle(wall)
+        hand = Hand(wall[:14])
+        assert is_winning(hand) == (calculate_shanten(hand) == -1)
+
+    plugin = ChaoshanMJPlugin(headless=True)
+    plugin.record_meld('peng', [Tile(TileType.SUO, 3)] * 3)
+    hand = [Tile(TileType.SUO, v) for v in (1, 1, 4, 5, 6, 7, 8, 9)] + [Tile(TileType.SUO, 2)] * 3
+    assert plugin.check_win(hand) == HandPattern.FULL_FLUSH
+    plugin.new_game()
+    assert plugin.check_win(hand) is None
+
+def test_scoring_engine():
+    suo = lambda *values: [Tile(TileType.SUO, v) for v in values]
+    engine = ScoringEngine(limit=6, horses=2)
+    chicken = suo(1, 2, 3) + [Tile(TileType.WAN, v) for v in (4, 5, 6, 9, 9)] + \
+        [Tile(TileType.TONG, v) for v in (2, 3, 4, 7, 7, 7)]
+    assert engine.score(chicken) == 1
+    assert engine.score(chicken, conditions=['tsumo']) == 2
+    assert engine.score(chicken[:-1]) is None
+
+    # 清一色碰碰胡 4 x 2 = 8, 封顶6番; 中马一匹得分翻倍
+    pure = suo(1, 1, 1, 4, 4, 4, 9, 9)
+    assert engine.pattern_fan(HandPattern.FULL_FLUSH | HandPattern.ALL_TRIPLETS) == 6
+    assert engine.score(pure, [suo(6, 6, 6), suo(7, 7, 7)]) == 6
+    horses = [Tile(TileType.WAN, 5), Tile(TileType.WIND, 2)]
+    assert engine.score(pure, [suo(6, 6, 6), suo(7, 7, 7)], horse_tiles=horses, seat=1) == 12
+    assert engine.expected_horse_hits(np.full(34, 4), 0) == pytest.approx(2 * 11 / 34)
+
+    with pytest.raises(ValueError):
+        engine.score(chicken, conditions=['bogus'])
+    with pytest.raises(ValueError):
+        ScoringEngine(fan={'bogus': 3})
+
+def test_score_waits_matches_single_scores():
+    engine = ScoringEngine()
+    tenpai = [Tile(TileType.TONG, v) for v in (2, 2, 3, 3, 4, 4, 5, 6, 7, 8, 9)] + \
+        [Tile(TileType.DRAGON, 1)] * 2
+    waits = engine.score_waits(tenpai, conditions=['tsumo'])
+    assert set(waits) == set(wait_patterns(tenpai))
+    assert set(waits) == {Tile(TileType.TONG, v) for v in (1, 4, 7)}
+    for tile, value in waits.items():
+        assert value == engine.score(tenpai + [tile], conditions=['tsumo'])
+    # 混一色2番, 自摸加倍
+    assert waits[Tile(TileType.TONG, 4)] == 2 * 2
+
+def test_hypergeometric_probabilities():
+    # 10张中有2张目标牌, 摸3张
+    assert hit_probability(2, 10, 3) == pytest.approx(1 - 56 / 120)
+    assert at_least_probability(2, 10, 3, 2) == pytest.approx(8 / 120)
+    assert at_least_probability(2, 10, 3, 0) == pytest.approx(1.0)
+    assert hit_probability(0, 10, 3) == 0.0
+    assert hit_probability(5, 10, 8) == 1.0
+
+    targets = np.array([0, 4, 8, 12])
+    batch = hit_probability(targets, 80, np.array([[5], [20]]))
+    assert batch.shape == (2, 4)
+    assert (np.diff(batch, axis=1) > 0).all() and (batch[1] > batch[0])[1:].all()
+
+    remaining = np.full(34, 2)
+    waits = np.zeros((2, 34), dtype=bool)
+    waits[0, [3, 6]] = True
+    waits[1, 5] = True
+    assert wait_probability(remaining, waits, 10).tolist() == \
+        pytest.approx([hit_probability(4, 68, 10), hit_probability(2, 68, 10)])
+    with pytest.raises(ValueError):
+        hit_probability(20, 10, 3)
+
+def test_draw_outlook():
+    plugin = ChaoshanMJPlugin(headless=True)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 6)] +
+            [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+            [Tile(TileType.WIND, 1)] * 2 + [Tile(TileType.DRAGON, 1)])
+    outlook = plugin.draw_outlook(hand, wall_size=60)
+    best = outlook.discards.index(Tile(TileType.DRAGON, 1))
+    assert outlook.shanten[best] == 0 and outlook.tenpai[best] == 1.0
+    population = int(plugin.prob_engine.live_copies(hand).sum())
+    assert outlook.win[best] == pytest.approx(hit_probability(outlook.ukeire[best], population, 15))
+    assert ((outlook.win <= outlook.tenpai) & (outlook.tenpai <= 1)).all()
+
+def test_draw_outlook_ignores_dead_waits():
+    plugin = ChaoshanMJPlugin(headless=True)
+    east, one_suo = Tile(TileType.WIND, 1), Tile(TileType.SUO, 1)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3)] + [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] + [east, east, one_suo, one_suo, Tile(TileType.DRAGON, 1)])
+    # 双碰听东风与一条, 手中两张东风之外的两张已被打出
+    for seat in (1, 2):
+        plugin.handle_opponent_action('discard', [east], seat)
+    outlook = plugin.draw_outlook(hand, wall_size=40)
+    best = outlook.discards.index(Tile(TileType.DRAGON, 1))
+    assert outlook.shanten[best] == 0 and outlook.ukeire[best] == 2
+    population = int(plugin.prob_engine.live_copies(hand).sum())
+    assert outlook.win[best] == pytest.approx(hit_probability(2, population, 10))
+
+class _SteppingClock:
+    """每次读取时间前进1秒"""
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        self.now += 1.0
+        return self.now
+
+def test_rollout_evaluator():
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 6)] +
+            [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+            [Tile(TileType.WIND, 1)] * 2 + [Tile(TileType.DRAGON, 1)])
+    remaining = ProbabilityEngine().live_copies(hand)
+    candidates = [Tile(TileType.DRAGON, 1), Tile(TileType.WAN, 1), Tile(TileType.WIND, 1)]
+    result = RolloutEvaluator(time_budget=60, max_rollouts=60, seed=5).evaluate(
+        hand, remaining, candidates=candidates)
+    assert list(result.values) == candidates
+    assert result.rollouts == sum(result.visits.values()) <= 60
+    # 逐轮减半: 保留下来的候选获得更多推演
+    assert result.visits[result.best] == max(result.visits.values())
+    assert result.best == Tile(TileType.DRAGON, 1)
+
+    again = RolloutEvaluator(time_budget=60, max_rollouts=60, seed=5).evaluate(
+        hand, remaining, candidates=candidates)
+    assert again.values == result.values
+
+    limited = RolloutEvaluator(time_budget=10, seed=5, clock=_SteppingClock()).evaluate(
+        hand, remaining, candidates=candidates)
+    assert limited.rollouts < 10
+    with pytest.raises(ValueError):
+        RolloutEvaluator().evaluate(hand, remaining, candidates=[Tile(TileType.SUO, 1)])
+
+def test_plugin_uses_rollouts_and_greedy_policy():
+    plugin = ChaoshanMJPlugin(headless=True, rng=random.Random(1))
+    plugin.rollout = RolloutEvaluator(time_budget=60, max_rollouts=16, seed=2)
+    hand = [Tile(TileType.WAN, v) for v in (1, 2, 3, 4, 9)] + \
+        [Tile(TileType.TONG, v) for v in (2, 2, 5, 7, 8)] + [Tile(TileType.WIND, 3)] * 4
+    assert plugin.intelligent_discard(hand) in hand
+
+    report = SelfPlaySimulator([GreedyPolicy() for _ in range(4)], seed=4).run(3)
+    assert sum(report.wins) + report.draws == 3 and sum(report.scores) == 0
+
+def test_plugin_rollout_pool_excludes_dead_copies():
+    captured = []
+
+    class RecordingEvaluator(RolloutEvaluator):
+        def evaluate(self, tiles, remaining, **kwargs):
+            captured.append(np.array(remaining))
+            return super().evaluate(tiles, remaining, **kwargs)
+
+    plugin = ChaoshanMJPlugin(headless=True, rng=random.Random(1))
+    plugin.rollout = RecordingEvaluator(time_budget=60, max_rollouts=8, seed=2)
+    east = Tile(TileType.WIND, 1)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 6)] + [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8)] + [east, east, Tile(TileType.DRAGON, 1), Tile(TileType.DRAGON, 2)])
+    for seat in (1, 2):
+        plugin.handle_opponent_action('discard', [east], seat)
+    plugin.intelligent_discard(hand)
+    # 推演的牌墙与自己手牌、已见牌合计恰为136张
+    assert captured and captured[0][east.index] == 0
+    assert captured[0].sum() + len(hand) + 2 == 136
+
+def _naive_win_probability(counts, remaining, draws):
+    """不剪枝、不查表的期望最大化, 用于校验"""
+    total = sum(remaining)
+    if not draws or not total:
+        return 0.0
+    value = 0.0
+    for index, count in enumerate(remaining):
+        if not count:
+            continue
+        counts[index] += 1
+        remaining[index] -= 1
+        if is_winning(np.array(counts)):
+            value += count
+        elif draws > 1:
+            best = 0.0
+            for discard in range(34):
+                if counts[discard]:
+                    counts[discard] -= 1
+                    best = max(best, _naive_win_probability(counts, remaining, draws - 1))
+                    counts[discard] += 1
+            value += count * best
+        remaining[index] += 1
+        counts[index] -= 1
+    return value / total
+
+def test_expectimax_matches_naive_search():
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 4, 4)] +
+            [Tile(TileType.TONG, v) for v in (2, 3, 7, 8)] +
+            [Tile(TileType.SUO, v) for v in (5, 5, 5)] + [Tile(TileType.WIND, 2)] * 2)
+    remaining = np.zeros(34, dtype=int)
+    for tile in ([Tile(TileType.TONG, v) for v in (1, 4, 6, 9)] +
+                 [Tile(TileType.WAN, v) for v in (4, 5, 7)] + [Tile(TileType.WIND, 2)] +
+                 [Tile(TileType.DRAGON, 3)] * 3):
+        remaining[tile.index] += 1
+    solver = ExpectimaxSolver(budget_ms=1e6, max_draws=3)
+    result = solver.solve(hand, remaining, draws=2)
+    counts = Hand(hand).counts.tolist()
+    for tile, value in result.values.items():
+        counts[tile.index] -= 1
+        assert value == pytest.approx(_naive_win_probability(counts, remaining.tolist(), 2))
+        counts[tile.index] += 1
+    assert result.values[result.best] > 0
+
+    # 花色互换与翻转后的局面命中置换表, 结果不变
+    suits = {TileType.WAN: TileType.SUO, TileType.TONG: TileType.WAN, TileType.SUO: TileType.TONG}
+    mirrored = _transform(hand, suits, True)
+    mirrored_remaining = np.zeros(34, dtype=int)
+    for tile, count in zip(ALL_TILES, remaining):
+        mirrored_remaining[_transform([tile], suits, True)[0].index] = count
+    hits = solver.table.hits
+    again = solver.solve(mirrored, mirrored_remaining, draws=2)
+    assert solver.table.hits > hits and again.nodes < result.nodes
+    assert sorted(again.values.values()) == pytest.approx(sorted(result.values.values()))
+
+    assert ExpectimaxSolver(max_draws=2).solve(hand, remaining, 3) is None
+
+def test_expectimax_budget_uses_real_time():
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 4, 4)] +
+            [Tile(TileType.TONG, v) for v in (2, 3, 7, 8)] +
+            [Tile(TileType.SUO, v) for v in (5, 5, 5)] + [Tile(TileType.WIND, 2)] * 2)
+    remaining = 4 - Hand(hand).counts.astype(int)
+    full = ExpectimaxSolver(budget_ms=None, max_draws=3).solve(hand, remaining, 3)
+    assert full is not None and full.nodes > 1000
+    # 完整搜索需要上千个节点, 1毫秒内不可能完成
+    assert ExpectimaxSolver(budget_ms=1, max_draws=3).solve(hand, remaining, 3) is None
+    assert ExpectimaxSolver(budget_ms=None, max_draws=3, max_nodes=full.nodes - 1).solve(
+        hand, remaining, 3) is None
+    # 无头插件的虚拟时钟不推动搜索计时, 由节点预算限制
+    plugin = ChaoshanMJPlugin(headless=True)
+    assert plugin.expectimax.max_nodes < full.nodes
+    plugin.expectimax.max_draws = 3
+    assert plugin.expectimax.solve(hand, remaining, 3) is None
+
+def test_plugin_late_game_search():
+    plugin = ChaoshanMJPlugin(headless=True)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 5, 6)] +
+            [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+            [Tile(TileType.WIND, 1)] * 2 + [Tile(TileType.DRAGON, 1)])
+    # 已见牌使剩余摸牌只剩两次
+    seen = ([Tile(TileType.WAN, 4), Tile(TileType.WAN, 7)] +
+            [Tile(TileType.SUO, v) for v in range(1, 7)] +
+            [Tile(TileType.TONG, v) for v in (1, 2, 3, 7, 8, 9)] +
+            [Tile(TileType.WIND, v) for v in (2, 3, 4)] + [Tile(TileType.DRAGON, 2)])
+    for tile in seen:
+        for _ in range(4):
+            plugin.handle_opponent_action('discard', [tile])
+    assert plugin.game_context.game_stage == "late"
+    remaining = plugin.prob_engine.live_copies(hand)
+    assert estimate_draws(remaining) == 2
+    result = plugin.expectimax.solve(hand, remaining, 2)
+    selected = plugin.intelligent_discard(hand)
+    assert result.values[selected] == result.values[result.best] > 0
+    # 四七万已全部打出, 打中也只能靠换听, 与拆万子同为最优, 按启发式得分选择
+    assert selected == Tile(TileType.WAN, 5)
+
+def test_late_game_search_treats_seen_held_tiles_as_dead():
+    plugin = ChaoshanMJPlugin(headless=True)
+    east, one_suo = Tile(TileType.WIND, 1), Tile(TileType.SUO, 1)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3)] + [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (7, 8, 9)] + [east, east, one_suo, one_suo, Tile(TileType.DRAGON, 1)])
+    # 双碰的两种听牌其余两张都已打出, 再打出其他牌直到只剩一次摸牌
+    for tile in [east, east, one_suo, one_suo]:
+        plugin.handle_opponent_action('discard', [tile], 1)
+    counts = Hand(hand).counts
+    for tile in ALL_TILES:
+        for _ in range(4 - counts[tile.index]):
+            if estimate_draws(plugin.prob_engine.live_copies(hand)) == 1 or tile in (east, one_suo):
+                break
+            plugin.handle_opponent_action('discard', [tile], 2)
+    remaining = plugin.prob_engine.live_copies(hand)
+    assert estimate_draws(remaining) == 1 and remaining[east.index] == remaining[one_suo.index] == 0
+    assert plugin.game_context.game_stage == "late"
+    assert plugin._late_game_discards(hand) is None
+
+def _assert_particles_consistent(inference):
+    assert (inference.hands >= 0).all() and (inference.walls() >= 0).all()
+    assert (inference.hands.sum(axis=2) == inference.sizes).all()
+    assert inference.weights.sum() == pytest.approx(1.0)
+
+def test_opponent_inference():
+    own = [Tile(TileType.WAN, v) for v in range(1, 10)] + [Tile(TileType.TONG, 1)] * 4
+    inference = OpponentInference(particles=64, seed=0)
+    inference.reset(own)
+    # 自己持有四张一筒, 任何粒子都不会给对手分到一筒
+    assert inference.tile_probabilities()[:, Tile(TileType.TONG, 1).index].max() == 0
+
+    five_suo = Tile(TileType.SUO, 5)
+    inference.observe(2, 'discard', [five_suo])
+    inference.observe(0, 'peng', [five_suo] * 3)
+    assert list(inference.sizes) == [11, 13, 13]
+    assert inference.known[five_suo.index] == 3
+    _assert_particles_consistent(inference)
+    inference.observe(0, 'discard', [Tile(TileType.DRAGON, 1)])
+    assert list(inference.sizes) == [10, 13, 13]
+    # 五条只剩一张未见
+    assert inference.expected_counts()[:, five_suo.index].sum() <= 1
+    _assert_particles_consistent(inference)
+
+    # 对家的暗手固定为听三六条时, 三六条的放铳概率为1
+    tenpai = Hand([Tile(TileType.SUO, v) for v in (4, 5, 7, 8, 9)] +
+                  [Tile(TileType.TONG, v) for v in (2, 3, 4, 6, 7, 8)] + [Tile(TileType.WIND, 1)] * 2)
+    inference = OpponentInference(particles=8, seed=0)
+    inference.hands[:, 1] = tenpai.counts
+    waits = inference.wait_probabilities()
+    assert np.flatnonzero(waits[1]).tolist() == [Tile(TileType.SUO, 3).index, Tile(TileType.SUO, 6).index]
+    assert inference.deal_in_probability()[Tile(TileType.SUO, 6).index] == 1.0
+
+def test_plugin_tracks_opponents_in_self_play():
+    policies = [PluginPolicy() for _ in range(4)]
+    policies[0].plugin.inference = OpponentInference(particles=32, seed=1)
+    SelfPlaySimulator(policies, seed=6).run(2)
+    _assert_particles_consistent(policies[0].plugin.inference)
+    assert policies[0].plugin.inference.known.sum() > 13
+
+def test_danger_table():
+    danger = DangerTable()
+    east, five_wan = Tile(TileType.WIND, 1), Tile(TileType.WAN, 5)
+    for seat in (0, 1):
+        danger.observe(seat, 'discard', [east])
+    danger.observe(None, 'discard', [east])
+    danger.observe(0, 'discard', [five_wan])
+    hand = [east, five_wan]
+    risk = danger.seat_risk(hand)
+    # 死牌: 东风已无未见张, 字牌不能组成顺子
+    assert risk[:, east.index].tolist() == [0.0, 0.0, 0.0]
+    # 现物
+    assert risk[0, five_wan.index] == pytest.approx(danger.genbutsu_factor * risk[1, five_wan.index])
+    # 筋: 打过五万, 二万与八万的两面可能性降低
+    for value in (2, 8):
+        index = Tile(TileType.WAN, value).index
+        assert risk[0, index] < risk[1, index]
+    assert risk[0, Tile(TileType.WAN, 3).index] == risk[1, Tile(TileType.WAN, 3).index]
+
+    # 壁: 八筒四张全部可见, 九筒只剩单骑/双碰
+    eight_tong, nine_tong = Tile(TileType.TONG, 8), Tile(TileType.TONG, 9)
+    danger.observe(2, 'discard', [eight_tong])
+    danger.observe(1, 'peng', [eight_tong] * 3)
+    assert danger.visible[eight_tong.index] == 3
+    risk = danger.seat_risk(hand + [eight_tong])
+    assert risk[2, nine_tong.index] == pytest.approx(
+        2 * PAIR_WEIGHT / (2 * RYANMEN_WEIGHT + PARTIAL_WEIGHT + 2 * PAIR_WEIGHT))
+    assert list(danger.melds) == [0, 1, 0]
+    total = danger.risk(hand)
+    assert total.shape == (34,) and (0 <= total).all() and (total <= 1).all()
+
+def test_defense_weight_prefers_safe_discards():
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3, 7, 8, 9)] +
+            [Tile(TileType.TONG, v) for v in (2, 3, 4)] + [Tile(TileType.SUO, 5)] * 2 +
+            [Tile(TileType.SUO, 1), Tile(TileType.DRAGON, 1), Tile(TileType.SUO, 9)])
+    selected = []
+    for weight in (0.0, 2.0):
+        plugin = ChaoshanMJPlugin(headless=True)
+        plugin.defense_weight = weight
+        # 三家都打过九条且已副露, 九条是孤张中最安全的
+        for seat in (1, 2, 3):
+            plugin.handle_opponent_action('discard', [Tile(TileType.SUO, 9)], seat)
+            plugin.handle_opponent_action('discard', [Tile(TileType.WIND, seat)], seat)
+            plugin.handle_opponent_action('peng', [Tile(TileType.WIND, seat)] * 3, seat)
+        selected.append(plugin.intelligent_discard(hand))
+    assert selected == [Tile(TileType.SUO, 1), Tile(TileType.SUO, 9)]
+
+def test_claim_evaluator():
+    east, d1, d2 = Tile(TileType.WIND, 1), Tile(TileType.DRAGON, 1), Tile(TileType.DRAGON, 2)
+    hand = ([Tile(TileType.WAN, v) for v in (1, 2, 3)] + [Tile(TileType.TONG, v) for v in (4, 5, 6)] +
+            [Tile(TileType.SUO, v) for v in (5, 7, 8)] + [east, east, d1, d2])
+    evaluator = ClaimEvaluator()
+    decision = evaluator.evaluate(hand, east, ['peng'])
+    assert decision.action == 'peng' and decision.tiles == (east, east)
+    assert calculate_shanten(hand) == 2 and decision.shanten == 1
+    # 与逐一计算吃碰后打牌的进张一致
+    after = list(hand)
+    after.remove(east)
+    after.remove(east)
+    remaining = [4 - c for c in Hand(hand).counts.tolist()]
+    remaining[east.index] -= 1
+    ukeire = calculate_ukeire(after, remaining, exposed_melds=1)
+    best = min(ukeire.values(), key=lambda u: (u.shanten, -u.total))
+    assert (decision.shanten, decision.ukeire) == (best.shanten, best.total)
+    assert decision.discard in (d1, d2)
+    assert evaluator.evaluate(hand, east, ['chi']).action == 'pass'
+    assert ClaimEvaluator(claim_penalty=1.0).evaluate(hand, east, ['peng']).action == 'pass'
+
+    # 单骑听东风: 碰五万不增加进张, 明杠多摸一张
+    five = Tile(TileType.WAN, 5)
+    tenpai = ([five] * 3 + [Tile(TileType.TONG, v) for v in (1, 2, 3)] +
+              [Tile(TileType.SUO, v) for v in (4, 5, 6, 7, 8, 9)] + [east])
+    assert evaluator.evaluate(tenpai, five, ['peng']).action == 'pass'
+    kong = evaluator.evaluate(tenpai, five, ['peng', 'minggang'])
+    assert kong.action == 'minggang' and kong.shanten == 0 and kong.ukeire == 3
+
+    # 吃: 选择使打牌后进张最多的搭子
+    chi_hand = ([Tile(TileType.WAN, v) for v in (2, 3, 5, 6)] + [Tile(TileType.TONG, v) for v in (1, 1, 7, 8, 9)] +
+                [Tile(TileType.SUO, v) for v in (2, 3)] + [d1, d2])
+    decision = evaluator.evaluate(chi_hand, Tile(TileType.WAN, 4), ['chi'])
+    assert decision.action == 'chi' and decision.shanten < calculate_shanten(chi_hand)
+    assert {t.value for t in decision.tiles} in ({2, 3}, {3, 5}, {5, 6})
+    with pytest.raises(ValueError):
+        evaluator.evaluate(hand, east, ['peng'], remaining=[4] * 33)
+
+def test_plugin_claim_uses_true_live_copies():
+    four, six = Tile(TileType.TONG, 4), Tile(TileType.TONG, 6)
+    hand = ([Tile(TileType.WAN, 4)] * 2 + [Tile(TileType.TONG, v) for v in (1, 3, 4, 4, 5, 5, 6, 9)] +
+            [Tile(TileType.SUO, 1), Tile(TileType.WIND, 1), Tile(TileType.WIND, 2)])
+    plugin = ChaoshanMJPlugin(headless=True)
+    plugin.handle_opponent_action('discard', [four], 3)
+    # 手中六筒之外的两张已被打出, 只剩一张可摸; 按纸面张数计算时会选择碰
+    for seat in (1, 2):
+        plugin.handle_opponent_action('discard', [six], seat)
+    assert plugin.prob_engine.live_copies(hand)[six.index] == 1
+    assert plugin.decide_claim(hand, four, ['peng']).action == 'pass'
+    # 只按已见牌截断、不扣除手牌的张数
+    paper = np.minimum(plugin.prob_engine.remaining_tiles, 4 - Hand(hand).counts.astype(np.int16))
+    assert plugin.claim_evaluator.evaluate(hand, four, ['peng'], remaining=paper).action == 'peng'
+
+def test_claimed_meld_tiles_leave_live_copies():
+    five = Tile(TileType.TONG, 5)
+    hand = Hand([Tile(TileType.WAN, v) for v in range(1, 7)] + [Tile(TileType.SUO, v) for v in (7, 8, 9)] +
+                [five, five, Tile(TileType.TONG, 1), Tile(TileType.WIND, 1)])
+    plugin = ChaoshanMJPlugin(headless=True)
+    plugin.handle_opponent_action('discard', [five], 3)
+    decision = plugin.decide_claim(hand, five, ['peng'])
+    assert decision.action == 'peng' and decision.discard is not None
+    plugin.record_meld('peng', [five] * 3)
+    for tile in decision.tiles:
+        hand.remove(tile)
+    # 四张五筒: 一张被鸣、两张从手中亮出, 只剩一张
+    assert plugin.prob_engine.live_copies(hand)[five.index] == 1
+    # 碰后打出评估时选定的牌
+    assert plugin.intelligent_discard(hand) is decision.discard
+
+def test_plugin_claims_in_self_play():
+    claims = []
+
+    class RecordingPolicy(PluginPolicy):
+        def observe(self, seat, action, tiles):
+            if seat == self.seat and action != 'discard':
+                claims.append(action)
+            super().observe(seat, action, tiles)
+
+    report = SelfPlaySimulator([RecordingPolicy() for _ in range(4)], seed=3, allow_chi=True).run(3)
+    assert sum(report.scores) == 0 and claims
+    assert set(claims) <= {'chi', 'peng', 'minggang'}
+
+def test_game_records_roundtrip(tmp_path):
+    path = str(tmp_path / 'games.rec')
+    east, five = Tile(TileType.WIND, 1), Tile(TileType.WAN, 5)
+    hands = [[ALL_TILES[(seat * 13 + i) % 34] for i in range(13)] for seat in range(4)]
+    with RecordWriter(path, flush_bytes=8) as writer:
+        writer.begin_game(hands, dealer=1)
+        writer.action(1, 'draw', [east])
+        writer.action(1, 'discard', [east])
+        writer.action(2, 'peng', [east] * 3)
+        writer.end_game()
+        writer.begin_game(hands, dealer=2)
+        writer.action(2, 'discard', [five])
+        writer.action(3, 'ron', [five])
+        writer.end_game(winner=3, loser=2, result='ron', scores=(0, 0, -1, 1))
+        # 未结束的对局在关闭时丢弃
+        writer.begin_game(hands)
+        writer.action(0, 'discard', [five])
+        with pytest.raises(ValueError):
+            writer.action(0, 'riichi', [five])
+        with pytest.raises(ValueError):
+            writer.action(0, 'peng', [five] * 5)
+
+    with RecordReader(path) as reader:
+        assert len(reader) == 2 and len(reader.actions) == 5
+        first, second = reader.games
+        assert first['dealer'] == 1 and first['winner'] == -1 and first['result'] == RESULT_CODES['draw']
+        assert decode_tiles(first['hands'][2]) == hands[2]
+        actions = reader.game_actions(0)
+        assert actions['action'].tolist() == [ACTION_CODES[a] for a in ('draw', 'discard', 'peng')]
+        assert decode_tiles(actions['tiles'][2]) == [east] * 3 and actions['tiles'][0, 1] == NO_TILE
+        assert (second['winner'], second['loser'], second['scores'].tolist()) == (3, 2, [0, 0, -1, 1])
+        assert reader.game_actions(1)['seat'].tolist() == [2, 3]
+        assert [len(actions) for _, actions in reader] == [3, 2]
+        del first, second, actions
+
+    (tmp_path / 'bad.rec').write_bytes(b'not a record file' * 4)
+    with pytest.raises(ValueError):
+        RecordReader(str(tmp_path / 'bad.rec'))
+
+def test_self_play_writes_records(tmp_path):
+    path = str(tmp_path / 'selfplay.rec')
+    results = []
+    with RecordWriter(path) as writer:
+        simulator = SelfPlaySimulator([GreedyPolicy() for _ in range(4)], seed=2, writer=writer)
+        results = [simulator.play_game() for _ in range(4)]
+    with RecordReader(path) as reader:
+        assert len(reader) == 4
+        for (game, actions), result in zip(reader, results):
+            assert game['winner'] == (-1 if result.winner is None else result.winner)
+            assert game['scores'].tolist() == list(result.scores)
+            assert (actions['action'] == ACTION_CODES['discard']).sum() == result.turns
+            # 起手牌加上全部摸牌不超过每种4张
+            counts = np.bincount(game['hands'].ravel(), minlength=256)[:34]
+            drawn = actions['tiles'][actions['action'] == ACTION_CODES['draw'], 0]
+            counts += np.bincount(drawn, minlength=34)
+            assert counts.max() <= 4 and counts.sum() == 52 + len(drawn)
+        del game, actions
+
+def test_replay_pipeline(tmp_path):
+    path = str(tmp_path / 'corpus.rec')
+    with RecordWriter(path) as writer:
+        simulator = SelfPlaySimulator(seed=5, writer=writer)
+        results = [simulator.play_game() for _ in range(5)]
+
+    with RecordReader(path) as reader:
+        # 回放还原的终局手牌: 和牌者的暗手即为和牌形
+        for (game, actions), result in zip(reader, results):
+            events = list(replay_game(game, actions))
+            assert sum(e.action == 'discard' for e in events) == result.turns
+            if result.winner is not None:
+                assert events[-1].action in ('tsumo', 'ron') and events[-1].seat == result.winner
+                assert len(events[-1].hand) % 3 == 2
+        del game, actions
+
+    stages = [DiscardAgreement, DealInRate, ScoreDistribution]
+    report = ReplayPipeline(path, stages, chunk_size=2).run()
+    assert report.games == 5
+    # 同一插件配置回放自己的牌谱, 建议与实际出牌完全一致
+    assert report.results['discard_agreement']['all'] == 1.0
+    deal_ins = sum(result.win_type == 'ron' for result in results)
+    assert deal_ins == 0 or report.results['deal_in_rate']['all'] > 0
+    scores = report.results['score_distribution']
+    assert sum(sum(counter.values()) for counter in scores.values()) == 20
+    assert sum(score * n for counter in scores.values() for score, n in counter.items()) == 0
+
+    class Incomplete(AnalysisStage):
+        def observe(self, event):
+            pass
+    # 缺少merge/result的阶段在构造时即报错, 而不是在分块结果合并时
+    with pytest.raises(TypeError):
+        ReplayPipeline(path, [Incomplete]).run()
+
+    parallel = ReplayPipeline(path, stages, workers=2, chunk_size=2).run()
+    assert parallel.results == report.results
+    assert ReplayPipeline(path, stages).run(start=5).games == 0
+
+def test_feature_encoder():
+    encoder = FeatureEncoder(batch_size=2)
+    hand = Hand([Tile(TileType.WAN, 1)] * 3 + [Tile(TileType.DRAGON, 1)]).counts
+    discards = np.zeros((4, 34), dtype=np.uint8)
+    melds = np.zeros((4, 34), dtype=np.uint8)
+    discards[2, 5] = 1
+    melds[3, 9:12] = 1
+    assert not encoder.add(hand, discards, melds, seat=2, stage='middle', label=0)
+    assert encoder.add(hand, discards, melds, seat=0, stage='late', label=27)
+    with pytest.raises(ValueError):
+        encoder.add(hand, discards, melds, seat=0, stage='late', label=27)
+    out = np.full((2, NUM_PLANES, 34), 9, dtype=np.uint8)
+    planes, labels = encoder.encode(out)
+    assert planes is out and labels.tolist() == [0, 27]
+    dragon = Tile(TileType.DRAGON, 1).index
+    assert out[0, :4, 0].tolist() == [1, 1, 1, 0] and out[0, :4, dragon].tolist() == [1, 0, 0, 0]
+    # 座位相对出牌者: 座位2出牌时自己的牌河在第一个平面, 座位3是下家
+    assert out[0, DISCARD_PLANES, 5] == 1 and out[1, DISCARD_PLANES + 2, 5] == 1
+    assert out[0, MELD_PLANES + 1, 9] == 1 and out[1, MELD_PLANES + 3, 9] == 1
+    assert out[0, UNSEEN_PLANE, 0] == 1 and out[0, UNSEEN_PLANE, 5] == 3
+    assert out[0, STAGE_PLANES:].tolist() == [[0] * 34, [1] * 34, [0] * 34]
+    with pytest.raises(ValueError):
+        encode_batch(encoder.hands, encoder.discards, encoder.melds, encoder.seats,
+                     encoder.stages, np.zeros((3, NUM_PLANES, 34), dtype=np.uint8))
+
+def test_shard_exporter_from_self_play(tmp_path):
+    directory = str(tmp_path / 'shards')
+    with ShardExporter(directory, shard_size=64, batch_size=16) as exporter:
+        simulator = SelfPlaySimulator([GreedyPolicy() for _ in range(4)], seed=1, writer=exporter)
+        results = [simulator.play_game() for _ in range(3)]
+    assert exporter.samples == sum(result.turns for result in results)
+    total = 0
+    for path in exporter.shards:
+        with np.load(path) as shard:
+            planes, labels = shard['planes'], shard['labels']
+        assert len(planes) == len(labels) <= 64 and planes.shape[1:] == (NUM_PLANES, 34)
+        # 标签总在暗手中, 未见张数非负且不超过4
+        assert planes[np.arange(len(labels)), 0, labels].all()
+        assert planes[:, UNSEEN_PLANE].max() <= 4 and planes[:, STAGE_PLANES:].sum(axis=1).max() == 1
+        total += len(labels)
+    assert total == exporter.samples
+    with pytest.raises(ValueError):
+        ShardExporter(directory, shard_size=100, batch_size=16)
+
+def test_plugin_benchmarks_start_from_same_state():
+    for name in ('intelligent_discard', 'tile_selection'):
+        func = BENCHMARKS[name](random.Random(name))
+        first = func()
+        # 多次调用之间不累积局内状态, 结果与耗时不依赖计时循环次数
+        assert all(func() == first for _ in range(20))
+
+def test_engine_imports_without_optional_dependencies():
+    import chaoshan_mahjong_ai
+    assert chaoshan_mahjong_ai.Tile is Tile
+    with pytest.raises(AttributeError):
+        chaoshan_mahjong_ai.ScreenProcessor
+
+    result = measure_import('chaoshan_mahjong_ai.core', repeat=1)
+    assert result['optional_modules'] == [] and result['best_us'] > 0
@@ -1,5 +1,7 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional, Union
+
+import numpy as np
 
 class TileType(Enum):
     WAN = "Wan"
@@ -8,22 +10,87 @@ class TileType(Enum):
     WIND = "Wind"
     DRAGON = "Dragon"
 
+# 牌种数量及各花色在34格索引中的起始位置
+NUM_TILE_KINDS = 34
+SUIT_TYPES = (TileType.WAN, TileType.TONG, TileType.SUO)
+SUIT_OFFSETS = {
+    TileType.WAN: 0,
+    TileType.TONG: 9,
+    TileType.SUO: 18,
+    TileType.WIND: 27,
+    TileType.DRAGON: 31,
+}
+_VALUE_LIMITS = {
+    TileType.WAN: 9,
+    TileType.TONG: 9,
+    TileType.SUO: 9,
+    TileType.WIND: 4,    # 东南西北
+    TileType.DRAGON: 3,  # 中发白
+}
+
 class Tile:
-    def __init__(self, tile_type: TileType, value: int):
-        self.type = tile_type
-        self.value = value
-        self._validate()
-
-    def _validate(self):
-        if self.type in [TileType.WAN, TileType.TONG, TileType.SUO]:
-            if not 1 <= self.value <= 9:
-                raise ValueError(f"Invalid value {self.value} for {self.type}")
-        elif self.type == TileType.WIND:
-            if not 1 <= self.value <= 4:  # 东南西北
-                raise ValueError(f"Invalid wind value {self.value}")
-        elif self.type == TileType.DRAGON:
-            if not 1 <= self.value <= 3:  # 中发白
-                raise ValueError(f"Invalid dragon value {self.value}")
+    """麻将牌(享元对象)
+
+    每种牌全局只有一个预先校验过的不可变实例, 相等比较退化为身份比较,
+    哈希值即为牌在34格中的索引。
+    """
+    __slots__ = ('type', 'value', 'index', 'is_honor')
+
+    _registry = {}
+    _by_index = []
+
+    def __new__(cls, tile_type: TileType, value: int):
+        tile = cls._registry.get((tile_type, value))
+        if tile is None:
+            cls._raise_invalid(tile_type, value)
+        return tile
+
+    @classmethod
+    def of(cls, tile_type: TileType, value: int) -> 'Tile':
+        """获取缓存的牌实例"""
+        return cls(tile_type, value)
+
+    @classmethod
+    def from_index(cls, index: int) -> 'Tile':
+        """根据34格索引获取牌"""
+        return cls._by_index[index]
+
+    @staticmethod
+    def _raise_invalid(tile_type: TileType, value: int):
+        if tile_type in SUIT_TYPES:
+            raise ValueError(f"Invalid value {value} for {tile_type}")
+        elif tile_type == TileType.WIND:
+            raise ValueError(f"Invalid wind value {value}")
+        elif tile_type == TileType.DRAGON:
+            raise ValueError(f"Invalid dragon value {value}")
+        raise ValueError(f"Invalid tile type {tile_type}")
+
+    @classmethod
+    def _register(cls, tile_type: TileType, value: int) -> 'Tile':
+        tile = object.__new__(cls)
+        object.__setattr__(tile, 'type', tile_type)
+        object.__setattr__(tile, 'value', value)
+        object.__setattr__(tile, 'index', SUIT_OFFSETS[tile_type] + value - 1)
+        object.__setattr__(tile, 'is_honor', tile_type not in SUIT_TYPES)
+        cls._registry[(tile_type, value)] = tile
+        cls._by_index.append(tile)
+        return tile
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Tile is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Tile is immutable")
+
+    def __reduce__(self):
+        # 反序列化时仍返回享元实例
+        return (Tile.from_index, (self.index,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def __str__(self):
         return f"{self.type.value}{self.value}"
@@ -32,33 +99,120 @@ class Tile:
         return f"Tile({self.type.value}, {self.value})"
 
     def __eq__(self, other):
-        if not isinstance(other, Tile):
-            return False
-        return self.type == other.type and self.value == other.value
+        return self is other
 
     def __hash__(self):
-        return hash((self.type, self.value))
+        return self.index
+
+for _tile_type in TileType:
+    for _value in range(1, _VALUE_LIMITS[_tile_type] + 1):
+        Tile._register(_tile_type, _value)
+
+ALL_TILES = tuple(Tile._by_index)
 
 class TileSet:
     """麻将牌组管理类"""
     @staticmethod
     def create_full_set() -> List[Tile]:
         """创建一副完整的麻将牌"""
-        tiles = []
-        # 数牌 (万筒条)
-        for tile_type in [TileType.WAN, TileType.TONG, TileType.SUO]:
-            for value in range(1, 10):
-                for _ in range(4):  # 每种牌4张
-                    tiles.append(Tile(tile_type, value))
-        
-        # 风牌
-        for value in range(1, 5):
-            for _ in range(4):
-                tiles.append(Tile(TileType.WIND, value))
-        
-        # 三元牌
-        for value in range(1, 4):
-            for _ in range(4):
-                tiles.append(Tile(TileType.DRAGON, value))
-        
+        # 按索引顺序: 数牌(万筒条), 风牌, 三元牌, 每种牌4张
+        return [tile for tile in ALL_TILES for _ in range(4)]
+
+class Hand:
+    """手牌(34格计数向量)
+
+    以uint8计数数组保存手牌, 增删为O(1), 各花色可通过切片视图访问。
+    """
+    __slots__ = ('counts', '_size')
+
+    def __init__(self, tiles: Optional[Iterable[Tile]] = None):
+        self.counts = np.zeros(NUM_TILE_KINDS, dtype=np.uint8)
+        self._size = 0
+        if tiles is not None:
+            indices = [tile.index for tile in tiles]
+            counts = np.bincount(indices, minlength=NUM_TILE_KINDS)
+            if indices and counts.max() > 4:
+                raise ValueError("More than 4 copies of a tile in hand")
+            self.counts[:] = counts
+            self._size = len(indices)
+
+    @classmethod
+    def from_counts(cls, counts) -> 'Hand':
+        """由34格计数向量创建手牌"""
+        counts = np.asarray(counts)
+        if counts.shape != (NUM_TILE_KINDS,):
+            raise ValueError(f"Expected {NUM_TILE_KINDS} counts, got {counts.shape}")
+        if counts.min() < 0 or counts.max() > 4:
+            raise ValueError("Tile counts must be between 0 and 4")
+        hand = cls()
+        hand.counts[:] = counts
+        hand._size = int(counts.sum())
+        return hand
+
+    def add(self, tile: Tile):
+        """摸入一张牌"""
+        if self.counts[tile.index] >= 4:
+            raise ValueError(f"More than 4 copies of {tile} in hand")
+        self.counts[tile.index] += 1
+        self._size += 1
+
+    def remove(self, tile: Tile):
+        """打出一张牌"""
+        if not self.counts[tile.index]:
+            raise ValueError(f"{tile} not in hand")
+        self.counts[tile.index] -= 1
+        self._size -= 1
+
+    def count(self, tile: Tile) -> int:
+        """某种牌的张数"""
+        return int(self.counts[tile.index])
+
+    def suit(self, tile_type: TileType) -> np.ndarray:
+        """获取某一花色的计数视图"""
+        start = SUIT_OFFSETS[tile_type]
+        return self.counts[start:start + _VALUE_LIMITS[tile_type]]
+
+    def distinct(self) -> List[Tile]:
+        """手牌中出现的牌种"""
+        return [ALL_TILES[i] for i in np.flatnonzero(self.counts)]
+
+    def tiles(self) -> List[Tile]:
+        """按索引顺序展开为牌列表"""
+        return list(self)
+
+    def copy(self) -> 'Hand':
+        hand = Hand()
+        hand.counts[:] = self.counts
+        hand._size = self._size
+        return hand
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator[Tile]:
+        for index, count in enumerate(self.counts.tolist()):
+            tile = ALL_TILES[index]
+            for _ in range(count):
+                yield tile
+
+    def __contains__(self, tile):
+        return isinstance(tile, Tile) and self.counts[tile.index] > 0
+
+    def __eq__(self, other):
+        if not isinstance(other, Hand):
+            return False
+        return np.array_equal(self.counts, other.counts)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Hand({' '.join(str(tile) for tile in self)})"
+
+def tile_counts(tiles: Union[Hand, np.ndarray, Iterable[Tile]]) -> np.ndarray:
+    """将手牌或牌列表转为34格计数向量"""
+    if isinstance(tiles, Hand):
+        return tiles.counts
+    if isinstance(tiles, np.ndarray):
         return tiles
+    indices = [tile.index for tile in tiles]
+    return np.bincount(indices, minlength=NUM_TILE_KINDS).astype(np.uint8)
@@ -0,0 +1,131 @@
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .simulator import NUM_SEATS, Policy, SelfPlayGame
+
+class PolicyStats(NamedTuple):
+    """单个策略的累计战绩"""
+    games: int = 0
+    wins: int = 0
+    deal_ins: int = 0
+    score: int = 0
+
+    def merge(self, other: 'PolicyStats') -> 'PolicyStats':
+        return PolicyStats(*(a + b for a, b in zip(self, other)))
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def deal_in_rate(self) -> float:
+        return self.deal_ins / self.games if self.games else 0.0
+
+    @property
+    def average_score(self) -> float:
+        return self.score / self.games if self.games else 0.0
+
+class TournamentReport(NamedTuple):
+    """锦标赛汇总结果"""
+    games: int
+    policies: Dict[str, PolicyStats]
+    elapsed: float          # 实际耗时
+    serial_elapsed: float   # 各分块CPU耗时之和, 即单核耗时估计
+    workers: int
+
+    @property
+    def throughput(self) -> float:
+        """每秒局数"""
+        return self.games / self.elapsed if self.elapsed > 0 else float('inf')
+
+    @property
+    def single_core_throughput(self) -> float:
+        return self.games / self.serial_elapsed if self.serial_elapsed > 0 else float('inf')
+
+    @property
+    def speedup(self) -> float:
+        """相对单核的加速比"""
+        return self.serial_elapsed / self.elapsed if self.elapsed > 0 else 1.0
+
+def chunk_seeds(master_seed: int, n_chunks: int) -> List[int]:
+    """由主种子派生各分块相互独立且可复现的随机种子"""
+    children = np.random.SeedSequence(master_seed).spawn(n_chunks)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+def _policy_label(policy: Policy, entry: int, labels: Sequence[str]) -> str:
+    return labels[entry] if labels else policy.name
+
+def run_chunk(policy_factories: Sequence[Callable[[], Policy]], seed: int,
+              first_game: int, n_games: int,
+              labels: Sequence[str] = ()) -> Tuple[Dict[str, PolicyStats], float]:
+    """在当前进程内运行一个分块, 返回各策略战绩及CPU耗时
+
+    第g局中座位s使用第(s + g) % 4个策略, 使每个策略轮流坐每个座位。
+    """
+    start = time.process_time()
+    rng = random.Random(seed)
+    policies = [factory() for factory in policy_factories]
+    stats: Dict[str, PolicyStats] = {}
+    for game_index in range(first_game, first_game + n_games):
+        entries = [(seat + game_index) % NUM_SEATS for seat in range(NUM_SEATS)]
+        game = SelfPlayGame([policies[e] for e in entries], rng,
+                            dealer=game_index % NUM_SEATS)
+        result = game.play()
+        for seat, entry in enumerate(entries):
+            label = _policy_label(policies[entry], entry, labels)
+            stats[label] = stats.get(label, PolicyStats()).merge(PolicyStats(
+                1, int(result.winner == seat), int(result.loser == seat),
+                result.scores[seat]))
+    return stats, time.process_time() - start
+
+def _run_chunk_args(args) -> Tuple[Dict[str, PolicyStats], float]:
+    return run_chunk(*args)
+
+class TournamentRunner:
+    """多进程锦标赛
+
+    每个分块的随机种子只由主种子和分块序号决定, 结果与工作进程数无关。
+    policy_factories须为可被pickle的可调用对象(如策略类本身)。
+    """
+    def __init__(self, policy_factories: Sequence[Callable[[], Policy]],
+                 master_seed: int = 0, workers: Optional[int] = None,
+                 chunk_size: int = 50, labels: Sequence[str] = ()):
+        if len(policy_factories) != NUM_SEATS:
+            raise ValueError(f"Expected {NUM_SEATS} policy factories, got {len(policy_factories)}")
+        if labels and len(labels) != NUM_SEATS:
+            raise ValueError(f"Expected {NUM_SEATS} labels, got {len(labels)}")
+        self.policy_factories = list(policy_factories)
+        self.master_seed = master_seed
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.labels = tuple(labels)
+
+    def _chunks(self, n_games: int) -> List[tuple]:
+        starts = list(range(0, n_games, self.chunk_size))
+        seeds = chunk_seeds(self.master_seed, len(starts))
+        return [(self.policy_factories, seed, first, min(self.chunk_size, n_games - first),
+                 self.labels) for seed, first in zip(seeds, starts)]
+
+    def run(self, n_games: int) -> TournamentReport:
+        """运行n_games局并合并各分块结果"""
+        chunks = self._chunks(n_games)
+        start = time.perf_counter()
+        if self.workers <= 1:
+            results = [_run_chunk_args(chunk) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(_run_chunk_args, chunks))
+        elapsed = time.perf_counter() - start
+
+        merged: Dict[str, PolicyStats] = {}
+        serial_elapsed = 0.0
+        for stats, chunk_elapsed in results:
+            serial_elapsed += chunk_elapsed
+            for label, policy_stats in stats.items():
+                merged[label] = merged.get(label, PolicyStats()).merge(policy_stats)
+        return TournamentReport(n_games, merged, elapsed, serial_elapsed, self.workers)
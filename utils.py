@@ -1,15 +1,87 @@
 import random
+import sys
 import time
 import numpy as np
 from collections import defaultdict
-from typing import List, Dict, Any
-from .tiles import Tile, TileType
+from typing import List, Dict, Any, Optional, Union
+from .tiles import Tile, TileType, Hand, ALL_TILES, NUM_TILE_KINDS, tile_counts
+from .shanten import Ukeire, calculate_ukeire
+from .cache import LRUCache
+from .canonical import canonical_order
+
+# 34格牌种的静态属性表
+_HONOR_MASK = np.array([tile.is_honor for tile in ALL_TILES])
+_SUITED_MASK = ~_HONOR_MASK
+_TILE_VALUES = np.array([tile.value for tile in ALL_TILES])
+_MIDDLE_BONUS = np.where(_SUITED_MASK & (_TILE_VALUES >= 4) & (_TILE_VALUES <= 6), 1.2, 1.0)
+_POSITION_MASK = _SUITED_MASK & (_TILE_VALUES >= 3) & (_TILE_VALUES <= 7)
+
+def _build_sequence_steps() -> np.ndarray:
+    """顺子潜力查表, 与标量路径逐次累加0.2的结果一致"""
+    steps = [0.0]
+    potential = 0.0
+    for _ in range(5):
+        potential += 0.2
+        steps.append(min(potential, 1.0))
+    return np.array(steps)
+
+_SEQUENCE_STEPS = _build_sequence_steps()
+
+def _build_window_matrix() -> np.ndarray:
+    """顺子窗口卷积矩阵: 每个花色内与长度为5的全1核做卷积, 字牌列为0"""
+    matrix = np.zeros((NUM_TILE_KINDS, NUM_TILE_KINDS), dtype=np.float32)
+    for suit_start in (0, 9, 18):
+        for i in range(9):
+            for j in range(max(0, i - 2), min(9, i + 3)):
+                matrix[suit_start + j, suit_start + i] = 1
+    return matrix
+
+_WINDOW_MATRIX = _build_window_matrix()
+
+def _score_kernel(counts: np.ndarray, seen: np.ndarray,
+                  pattern_weights: Dict[str, float], cells: slice = slice(None)) -> np.ndarray:
+    """向量化计算34种牌的得分, 支持[..., 34]形状的批量输入
+
+    cells为某一组(单个花色或字牌)的切片时, counts与seen只需给出该组的格子。
+    顺子窗口不跨花色, 分组计算的结果与整体计算一致。
+    """
+    unseen = seen == 0
+    honor = _HONOR_MASK[cells]
+
+    # 基础分
+    base = np.where(honor,
+                    1.0 + np.where(unseen, 0.2, 0),
+                    _MIDDLE_BONUS[cells] * np.where(unseen, 1.1, 1.0))
+
+    # 牌型分: 对子加成, 顺子潜力由各花色9格出现情况与窗口核卷积得到
+    window = ((counts > 0).astype(np.float32) @ _WINDOW_MATRIX[cells, cells]).astype(np.intp)
+    pattern = np.where(counts >= 2, 1.0 * pattern_weights['pair'], 1.0)
+    pattern = np.where(honor, pattern,
+                       pattern * (1 + _SEQUENCE_STEPS[window] * pattern_weights['sequence']))
+
+    # 潜在价值
+    potential = 1.0 * (1 - seen * 0.1)
+    potential = np.maximum(np.where(_POSITION_MASK[cells], potential * 1.2, potential), 0.5)
+
+    return base * pattern * potential
 
 class ProbabilityEngine:
-    def __init__(self):
+    def __init__(self, vectorized: bool = True, cache_entries: int = 4096,
+                 cache_bytes: Optional[int] = 4 << 20):
+        """cache_entries为0时不缓存评估结果"""
         self.tile_stats = defaultdict(int)
         self.pattern_weights = self._initialize_weights()
-        self.seen_tiles = set()
+        self.remaining_tiles = np.full(NUM_TILE_KINDS, 4, dtype=np.uint8)
+        # 已计入已见牌、但仍在自己手中的张数(如选牌时记录的牌)
+        self.held_seen = np.zeros(NUM_TILE_KINDS, dtype=np.int16)
+        self.vectorized = vectorized
+        self.cache = LRUCache(cache_entries, cache_bytes) if cache_entries else None
+
+    def reset(self):
+        """清空已见牌信息(新的一局), 缓存的键包含已见牌信息, 可继续沿用"""
+        self.tile_stats = defaultdict(int)
+        self.remaining_tiles = np.full(NUM_TILE_KINDS, 4, dtype=np.uint8)
+        self.held_seen = np.zeros(NUM_TILE_KINDS, dtype=np.int16)
 
     def _initialize_weights(self) -> Dict[str, float]:
         return {
@@ -19,13 +91,77 @@ class ProbabilityEngine:
             'potential': 1.3
         }
 
-    def calculate_tile_scores(self, tiles: List[Tile]) -> Dict[Tile, float]:
-        """计算每张牌的得分"""
+    def calculate_tile_scores(self, tiles: Union[List[Tile], Hand]) -> Dict[Tile, float]:
+        """计算每张牌的得分
+
+        向量化路径按花色对称规范化后查缓存, 三门互换或1↔9翻转的手牌共用同一条目。
+        """
+        if self.cache is None or not self.vectorized:
+            return self._calculate_tile_scores(tiles)
+
+        # 得分只依赖手牌计数与手牌中各牌种的已见张数, update_seen_tiles改变这部分时
+        # 键随之改变, 旧结果不会再被命中, 之后由LRU自然淘汰
+        counts = tile_counts(tiles)
+        seen = np.where(counts > 0, self.seen_counts, 0)
+        key, perm, inverse = canonical_order(counts, seen)
+        values = self.cache.get(key)
+        if values is None:
+            values = _score_kernel(counts[perm], seen[perm], self.pattern_weights)
+            self.cache.put(key, values, sys.getsizeof(key) + sys.getsizeof(values))
+        indices = np.flatnonzero(counts)
+        return dict(zip([ALL_TILES[i] for i in indices], values[inverse[indices]].tolist()))
+
+    def clear_cache(self):
+        """修改pattern_weights等参数后清空缓存"""
+        if self.cache is not None:
+            self.cache.clear()
+
+    def _calculate_tile_scores(self, tiles: Union[List[Tile], Hand, np.ndarray]) -> Dict[Tile, float]:
+        if self.vectorized:
+            counts = tile_counts(tiles)
+            values = self.score_vector(counts).tolist()
+            return {ALL_TILES[i]: values[i] for i in np.flatnonzero(counts)}
+        return self._calculate_tile_scores_scalar(tiles)
+
+    def score_vector(self, tiles: Union[List[Tile], Hand, np.ndarray]) -> np.ndarray:
+        """一次性计算34种牌的得分, 手牌中没有的牌记为0"""
+        counts = tile_counts(tiles)
+        scores = _score_kernel(counts, self.seen_counts, self.pattern_weights)
+        return np.where(counts > 0, scores, 0.0)
+
+    def score_batch(self, hands: np.ndarray, seen: Optional[np.ndarray] = None) -> np.ndarray:
+        """批量计算[N, 34]手牌计数矩阵的得分, 手牌中没有的牌记为0
+
+        seen为[N, 34]的已见牌计数, 缺省时所有行使用引擎当前的已见牌信息。
+        """
+        hands = np.asarray(hands)
+        if hands.ndim != 2 or hands.shape[1] != NUM_TILE_KINDS:
+            raise ValueError(f"Expected hands of shape (N, {NUM_TILE_KINDS}), got {hands.shape}")
+        if seen is None:
+            seen = self.seen_counts
+        else:
+            seen = np.asarray(seen)
+            if seen.shape != hands.shape:
+                raise ValueError(f"Seen shape {seen.shape} does not match hands shape {hands.shape}")
+        scores = _score_kernel(hands, seen, self.pattern_weights)
+        return np.where(hands > 0, scores, 0.0)
+
+    def enhance_quality_batch(self, hands: np.ndarray, seen: Optional[np.ndarray] = None) -> np.ndarray:
+        """批量排序: 返回每行按得分从高到低排列的牌索引, 手牌中没有的牌排在最后"""
+        scores = self.score_batch(hands, seen)
+        return np.argsort(-scores, axis=1, kind='stable')
+
+    def _calculate_tile_scores_scalar(self, tiles: Union[List[Tile], Hand]) -> Dict[Tile, float]:
+        """逐张计算得分(标量参考实现)"""
+        counts = tile_counts(tiles).tolist()
         scores = {}
-        for tile in tiles:
+        for index, count in enumerate(counts):
+            if not count:
+                continue
+            tile = ALL_TILES[index]
             base_score = self._calculate_base_score(tile)
-            pattern_score = self._evaluate_patterns(tile, tiles)
-            potential_score = self._evaluate_potential(tile, tiles)
+            pattern_score = self._evaluate_patterns(tile, counts)
+            potential_score = self._evaluate_potential(tile, counts)
             
             scores[tile] = base_score * pattern_score * potential_score
             
@@ -33,71 +169,126 @@ class ProbabilityEngine:
 
     def _calculate_base_score(self, tile: Tile) -> float:
         """基础分计算"""
-        if tile.type in [TileType.WIND, TileType.DRAGON]:
-            return 1.0 + (0.2 if tile not in self.seen_tiles else 0)
+        if tile.is_honor:
+            return 1.0 + (0.2 if self.remaining_tiles[tile.index] == 4 else 0)
         
         # 数牌的基础分计算
         middle_bonus = 1.2 if 4 <= tile.value <= 6 else 1.0
-        return middle_bonus * (1.1 if tile not in self.seen_tiles else 1.0)
+        return middle_bonus * (1.1 if self.remaining_tiles[tile.index] == 4 else 1.0)
 
-    def _evaluate_patterns(self, tile: Tile, tiles: List[Tile]) -> float:
+    def _evaluate_patterns(self, tile: Tile, counts: List[int]) -> float:
         """评估牌型分"""
         score = 1.0
         
         # 检查对子
-        if sum(1 for t in tiles if t == tile) >= 2:
+        if counts[tile.index] >= 2:
             score *= self.pattern_weights['pair']
             
         # 检查顺子潜力
-        if tile.type in [TileType.WAN, TileType.TONG, TileType.SUO]:
-            sequence_potential = self._check_sequence_potential(tile, tiles)
+        if not tile.is_honor:
+            sequence_potential = self._check_sequence_potential(tile, counts)
             score *= (1 + sequence_potential * self.pattern_weights['sequence'])
             
         return score
 
-    def _evaluate_potential(self, tile: Tile, tiles: List[Tile]) -> float:
+    def _evaluate_potential(self, tile: Tile, counts: List[int]) -> float:
         """评估潜在价值"""
         potential = 1.0
         
         # 根据已见牌数调整概率
-        seen_count = sum(1 for t in self.seen_tiles if t == tile)
+        seen_count = 4 - int(self.remaining_tiles[tile.index])
         potential *= (1 - seen_count * 0.1)
         
         # 位置价值
-        if tile.type in [TileType.WAN, TileType.TONG, TileType.SUO]:
+        if not tile.is_honor:
             if 3 <= tile.value <= 7:
                 potential *= 1.2
                 
         return max(potential, 0.5)  # 确保最小值为0.5
 
-    def _check_sequence_potential(self, tile: Tile, tiles: List[Tile]) -> float:
+    def _check_sequence_potential(self, tile: Tile, counts: List[int]) -> float:
         """检查顺子潜力"""
-        if tile.type not in [TileType.WAN, TileType.TONG, TileType.SUO]:
+        if tile.is_honor:
             return 0.0
             
         potential = 0.0
         value = tile.value
+        suit_start = tile.index - value + 1
         
         # 检查前后连续性
         for v in range(max(1, value - 2), min(10, value + 3)):
-            if any(t for t in tiles if t.type == tile.type and t.value == v):
+            if counts[suit_start + v - 1]:
                 potential += 0.2
                 
         return min(potential, 1.0)
 
-    def enhance_quality(self, tiles: List[Tile]) -> List[Tile]:
+    def enhance_quality(self, tiles: Union[List[Tile], Hand]) -> List[Tile]:
         """增强牌型质量"""
         scores = self.calculate_tile_scores(tiles)
         return sorted(tiles, key=lambda t: scores[t], reverse=True)
 
-    def update_seen_tiles(self, tile: Tile):
-        """更新已见牌信息"""
-        self.seen_tiles.add(tile)
+    @property
+    def seen_counts(self) -> np.ndarray:
+        """34格已见牌张数"""
+        return 4 - self.remaining_tiles
+
+    @property
+    def seen_tiles(self) -> set:
+        """已见过的牌种"""
+        return {ALL_TILES[i] for i in np.flatnonzero(self.remaining_tiles < 4)}
+
+    def live_copies(self, tiles: Union[List[Tile], Hand, np.ndarray]) -> np.ndarray:
+        """除自己手牌外仍可能摸到的各牌张数
+
+        remaining_tiles只扣除了已见牌, 手牌需再扣除; 已计入已见牌的手牌(held_seen)不重复扣除。
+        """
+        counts = tile_counts(tiles)
+        return (self.remaining_tiles.astype(np.int16) + self.held_seen - counts).clip(0)
+
+    def calculate_ukeire(self, tiles: Union[List[Tile], Hand]) -> Dict[Tile, Ukeire]:
+        """按剩余张数计算每种打法的进张"""
+        return calculate_ukeire(tiles, self.live_copies(tiles))
+
+    def update_seen_tiles(self, tile: Tile, held: bool = False):
+        """更新已见牌信息, held为True表示这张牌仍在自己手中"""
+        if self.remaining_tiles[tile.index]:
+            self.remaining_tiles[tile.index] -= 1
+            if held:
+                self.held_seen[tile.index] += 1
         self.tile_stats[str(tile)] += 1
 
+    def update_own_revealed(self, tile: Tile):
+        """自己打出或副露亮出一张手牌: 已作为手牌计入已见牌时只转为公开, 不再重复扣除"""
+        if self.held_seen[tile.index]:
+            self.held_seen[tile.index] -= 1
+            self.tile_stats[str(tile)] += 1
+        else:
+            self.update_seen_tiles(tile)
+
+class SystemClock:
+    """系统时钟"""
+    def time(self) -> float:
+        return time.time()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+class VirtualClock:
+    """虚拟时钟: sleep只推进虚拟时间, 不会阻塞"""
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += max(seconds, 0.0)
+
 class OperationDelay:
     """操作延迟模拟器"""
-    def __init__(self):
+    def __init__(self, clock=None, rng: Optional[random.Random] = None):
+        self.clock = clock if clock is not None else SystemClock()
+        self.rng = rng if rng is not None else random.Random()
         self.last_action_time = defaultdict(float)
         self.action_patterns = self._initialize_patterns()
 
@@ -115,20 +306,20 @@ class OperationDelay:
                                          {'min': 0.5, 'max': 1.5, 'mean': 0.8})
         
         # 考虑上次操作时间
-        time_since_last = time.time() - self.last_action_time[action_type]
+        time_since_last = self.clock.time() - self.last_action_time[action_type]
         if time_since_last < pattern['min']:
             base_delay = pattern['mean']
         else:
-            base_delay = random.gauss(pattern['mean'], 0.2)
+            base_delay = self.rng.gauss(pattern['mean'], 0.2)
             
         # 添加随机波动
         delay = max(pattern['min'], 
                    min(pattern['max'], 
-                       base_delay * random.uniform(0.8, 1.2)))
+                       base_delay * self.rng.uniform(0.8, 1.2)))
                        
-        time.sleep(delay)
-        self.last_action_time[action_type] = time.time()
+        self.clock.sleep(delay)
+        self.last_action_time[action_type] = self.clock.time()
 
     def add_natural_variance(self, delay: float) -> float:
         """添加自然变化"""
-        return delay * random.uniform(0.85, 1.15)
+        return delay * self.rng.uniform(0.85, 1.15)